@@ -38,8 +38,13 @@ class Config(object):
                  ('ORIG_DATA_PATH', os.sep.join([dataDir, 'Original'])), \
                  ('PROCESSED_DATA_PATH', os.sep.join([dataDir, 'Processed'])), \
                  ('METADATA_FILES_PATH', os.sep.join([dataDir, 'Metadata'])), \
+                 ('DECOMPRESSION_NUM_THREADS', '4'), \
                  ('MAX_CONCAT_LEN_FOR_OVERLAPPING_ELS', '20'), \
                  ('OUTPUT_PRECISION', '4'), \
+                 ('OPERATION_RESULT_CACHE_PATH', os.sep.join([dataDir, 'OperationResults'])), \
+                 ('OPERATION_RESULT_CACHE_MAX_BYTES', '0'), \
+                 ('PREPROCESS_NUM_WORKERS', '1'), \
+                 ('SORT_MEMORY_BUDGET', str(512 * 1024 * 1024)), \
                  ('USE_SLOW_DEFENSIVE_ASSERTS', 'False')])
             
             configDef['Compatibility'] = OrderedDict( \
@@ -47,7 +52,12 @@ class Config(object):
             
             configDef['Memmap'] = OrderedDict( \
                 [('COMP_BIN_SIZE', '100000'), \
-                 ('MEMMAP_BIN_SIZE', str(1024 * 1024))])
+                 ('MEMMAP_BIN_SIZE', str(1024 * 1024)), \
+                 ('MEMMAP_MAX_CACHED_BINS', '4'), \
+                 ('MEMMAP_MAX_CACHED_BYTES', str(64 * 1024 * 1024)), \
+                 ('MEMMAP_POOL_MAX_FILES', '128'), \
+                 ('OUTPUT_FILE_CHUNK_SIZE', '0'), \
+                 ('SEQUENCE_STORAGE_FORMAT', 'S1')])
             
             cls._initConfig(configDef)
 
@@ -1,14 +1,16 @@
 import numpy
 
 from collections import OrderedDict
-from itertools import chain
+from itertools import groupby, islice
+from operator import attrgetter
 
 from gtrackcore.extract.fileformats.GtrackComposer import StdGtrackComposer, ExtendedGtrackComposer
 from gtrackcore.input.fileformats.GtrackGenomeElementSource import GtrackGenomeElementSource
-from gtrackcore.input.wrappers.GEDependentAttributesHolder import GEDependentAttributesHolder, iterateOverBRTuplesWithContainedGEs
+from gtrackcore.input.wrappers.ExternalGESorter import ExternalGESorter
+from gtrackcore.input.wrappers.GEDependentAttributesHolder import GEDependentAttributesHolder
 from gtrackcore.input.wrappers.GESourceWrapper import SortedListGESourceWrapper
 from gtrackcore.track.format.TrackFormat import TrackFormat
-from gtrackcore.util.CustomExceptions import ShouldNotOccurError, InvalidFormatError
+from gtrackcore.util.CustomExceptions import ShouldNotOccurError, InvalidFormatError, NotIteratedYetError
 
 class UnsortedGtrackGenomeElementSource(GtrackGenomeElementSource):
     def _checkBoundingRegionSorting(self, br, lastBoundingRegion):
@@ -23,43 +25,66 @@ class UnsortedGtrackGenomeElementSource(GtrackGenomeElementSource):
     def _checkDenseSorting(self, ge):
         pass
 
+class _SortedGtrackElements(object):
+    # The elements of a sorted GTrack file, iterated from an ExternalGESorter.
+    # The elements are grouped by the index of their bounding region in the
+    # file. The groups are iterated in the sorted order of the bounding
+    # regions, and the elements of each group by position. Elements with the
+    # same position are sorted on all attributes, unless the track is dense.
+
+    def __init__(self, sorter, sortedBrTuples, brOrder):
+        self._sorter = sorter
+        self._brOrder = brOrder
+        self._elCounts = [br.elCount for br in sortedBrTuples] if len(sortedBrTuples) > 0 else [len(sorter)]
+
+    def __iter__(self):
+        geIter = self._sorter.iterGroups(self._brOrder) if len(self._brOrder) > 0 else iter(self._sorter)
+        for elCount in self._elCounts:
+            brGeIter = islice(geIter, elCount)
+            for key, geGroup in groupby(brGeIter, key=attrgetter('genome', 'chr', 'start', 'end')):
+                geGroup = list(geGroup)
+                if len(geGroup) >= 2 and not geGroup[0].reprIsDense():
+                    geGroup.sort()
+                for ge in geGroup:
+                    yield ge
+
 def _getSortedBoundingRegionsAndGenomeElements(geSource):
+    # The source is parsed once. Each element is added to the sorter with the
+    # index of its bounding region as group. Elements are counted into a
+    # bounding region when parsed, which is before they are returned, so the
+    # counts of all previous bounding regions are final at that point.
     geSource = GEDependentAttributesHolder(geSource)
-    
-    doubleElList = [[brTuple, geList] for brTuple, geList in iterateOverBRTuplesWithContainedGEs(geSource)]
-    
-    noBoundingRegions = doubleElList[0][0] is None
-    if not noBoundingRegions:
-        doubleElList.sort(key=lambda x:x[0].region)
-    
-    for x in doubleElList:
-        if len(x[1]) >= 2:
-            if x[1][0].reprIsDense():
-                break
-            x[1].sort()
-            
-    return doubleElList, geSource
-        
+    sorter = ExternalGESorter()
+
+    brIndex, elCountBeforeBr = 0, 0
+    for i, ge in enumerate(geSource):
+        brTuplesSoFar = geSource.getBoundingRegionTuplesParsedSoFar()
+        while brIndex + 1 < len(brTuplesSoFar) and i >= elCountBeforeBr + brTuplesSoFar[brIndex].elCount:
+            elCountBeforeBr += brTuplesSoFar[brIndex].elCount
+            brIndex += 1
+        sorter.addElement(ge, group=brIndex)
+
+    brTuples = geSource.getBoundingRegionTuples()
+    brOrder = sorted(range(len(brTuples)), key=lambda i:brTuples[i].region)
+    sortedBrTuples = [brTuples[i] for i in brOrder]
+    return sortedBrTuples, _SortedGtrackElements(sorter, sortedBrTuples, brOrder), geSource
+
 def _commonSortGtrackFile(fn, genome):
     gtrackGESource = UnsortedGtrackGenomeElementSource(fn, genome, printWarnings=False)
     useExtendedGtrack = gtrackGESource.isExtendedGtrackFile()
     
-    doubleElList, geSource = _getSortedBoundingRegionsAndGenomeElements(gtrackGESource)
-    noBoundingRegions = doubleElList[0][0] is None
-    
-    sortedGESource = SortedListGESourceWrapper(geSource, list(chain(*(x[1] for x in doubleElList))), \
-                                               [x[0] for x in doubleElList] if not noBoundingRegions else [])
-    
+    sortedBrTuples, sortedElements, geSource = _getSortedBoundingRegionsAndGenomeElements(gtrackGESource)
+    sortedGESource = SortedListGESourceWrapper(geSource, sortedElements, sortedBrTuples)
     
     composerCls = ExtendedGtrackComposer if useExtendedGtrack else StdGtrackComposer
     return composerCls( sortedGESource )
 
 def sortedGeSourceHasOverlappingRegions(geSource):
-    doubleElList = _getSortedBoundingRegionsAndGenomeElements(geSource)[0]
+    sortedElements = _getSortedBoundingRegionsAndGenomeElements(geSource)[1]
     
     hasOverlaps = False
     prevSortedElement = None
-    for ge in chain(*(x[1] for x in doubleElList)):
+    for ge in sortedElements:
         if prevSortedElement is not None and ge.overlaps(prevSortedElement):
             hasOverlaps = True
             break
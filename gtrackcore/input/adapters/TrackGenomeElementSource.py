@@ -117,9 +117,16 @@ class TrackGenomeElementSource(GenomeElementSource):
             region.genome = self._genome
         return track.getTrackView(region)
 
-    def _wrappedTrackElsGenerator(self):
+    def iterTrackViews(self):
         track = self._getTrack()
-        for region,tv in ((region, self._getTrackView(track, region)) for region in self._boundingRegions):
+        for region in self._boundingRegions:
+            yield self._getTrackView(track, region)
+
+    def hasGlobalCoords(self):
+        return self._globalCoords
+
+    def _wrappedTrackElsGenerator(self):
+        for tv in self.iterTrackViews():
             for te in tv:
                 yield GenomeElement.createGeFromTrackEl(te, tv.trackFormat, globalCoords=self._globalCoords)
 
@@ -0,0 +1,193 @@
+import os
+import struct
+import zlib
+
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
+
+from gtrackcore.core.Config import Config
+from gtrackcore.util.CustomExceptions import AbstractClassError, InvalidFormatError
+
+GZIP_MAGIC = '\x1f\x8b'
+BGZF_BATCH_NUM_BLOCKS = 64
+
+def isGzipFile(fn):
+    with open(fn, 'rb') as file:
+        return file.read(2) == GZIP_MAGIC
+
+def isBgzfFile(fn):
+    # BGZF files are gzip files where each member has an extra field
+    # with the subfield 'BC', containing the size of the member.
+    with open(fn, 'rb') as file:
+        header = file.read(18)
+    return len(header) == 18 and header[:4] == GZIP_MAGIC + '\x08\x04' and header[12:16] == 'BC\x02\x00'
+
+def openInputFile(fn):
+    '''
+    Opens an input file for reading lines, with universal newlines.
+    Gzip-compressed files are decompressed transparently.
+    '''
+    if isBgzfFile(fn):
+        return BgzfInputFile(fn)
+    if isGzipFile(fn):
+        return GzipInputFile(fn)
+    return open(fn, 'U', -1)
+
+_threadPool = None
+_threadPoolKey = None
+
+def _getThreadPool(numThreads):
+    # Shared between files. A pool inherited from a parent process has no
+    # running threads, and is replaced.
+    global _threadPool, _threadPoolKey
+    if _threadPoolKey != (os.getpid(), numThreads):
+        _threadPool = ThreadPool(numThreads)
+        _threadPoolKey = (os.getpid(), numThreads)
+    return _threadPool
+
+def _inflateBgzfBlock(block):
+    headerSize = 12 + struct.unpack('<H', block[10:12])[0]
+    crc, size = struct.unpack('<Ii', block[-8:])
+    text = zlib.decompress(block[headerSize:-8], -zlib.MAX_WBITS)
+    if len(text) != size or zlib.crc32(text) & 0xffffffff != crc:
+        raise InvalidFormatError('Error: BGZF block failed the integrity check.')
+    return text
+
+class CompressedInputFile(object):
+    # Read-only file object for compressed files, with readline(), read()
+    # and line iteration. Subclasses decompress the file as a sequence of
+    # text chunks in _iterChunks(). Newlines are converted as for files
+    # opened with universal newlines. The chunks are buffered as complete
+    # lines, so that iteration over lines is done by the buffer.
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._file = open(fn, 'rb')
+        self._chunks = self._iterUniversalNewlineChunks()
+        self._buffer = StringIO('')
+        self._partialLine = ''
+        self._lines = self._iterLines()
+
+    def _iterChunks(self):
+        raise AbstractClassError
+
+    def _iterUniversalNewlineChunks(self):
+        hasPendingCr = False
+        for chunk in self._iterChunks():
+            if hasPendingCr:
+                chunk = '\r' + chunk
+            hasPendingCr = chunk.endswith('\r')
+            if hasPendingCr:
+                chunk = chunk[:-1]
+            if '\r' in chunk:
+                chunk = chunk.replace('\r\n', '\n').replace('\r', '\n')
+            yield chunk
+
+        if hasPendingCr:
+            yield '\n'
+
+    def _fillBuffer(self):
+        for chunk in self._chunks:
+            text = self._partialLine + chunk
+            end = text.rfind('\n') + 1
+            self._partialLine = text[end:]
+            if end > 0:
+                self._buffer = StringIO(text[:end])
+                return True
+
+        if self._partialLine != '':
+            self._buffer = StringIO(self._partialLine)
+            self._partialLine = ''
+            return True
+        return False
+
+    def _iterLines(self):
+        while True:
+            buffer = self._buffer
+            for line in buffer:
+                yield line
+            if buffer is self._buffer and not self._fillBuffer():
+                return
+
+    def readline(self):
+        line = self._buffer.readline()
+        if line == '' and self._fillBuffer():
+            line = self._buffer.readline()
+        return line
+
+    def read(self, size=-1):
+        parts = [self._buffer.read() if size < 0 else self._buffer.read(size)]
+        numBytes = len(parts[0])
+        while (size < 0 or numBytes < size) and self._fillBuffer():
+            parts.append(self._buffer.read() if size < 0 else self._buffer.read(size - numBytes))
+            numBytes += len(parts[-1])
+        return ''.join(parts)
+
+    def __iter__(self):
+        return self._lines
+
+    def next(self):
+        return self._lines.next()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+class GzipInputFile(CompressedInputFile):
+    CHUNK_NUM_BYTES = 1024 * 1024
+
+    def _iterChunks(self):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            data = self._file.read(self.CHUNK_NUM_BYTES)
+            if data == '':
+                break
+
+            # Concatenated gzip members are read as one file
+            while data != '':
+                yield decompressor.decompress(data)
+                data = decompressor.unused_data
+                if data != '':
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        yield decompressor.flush()
+
+class BgzfInputFile(CompressedInputFile):
+    # The blocks of BGZF files are independent, and are decompressed in
+    # batches by a pool of Config.DECOMPRESSION_NUM_THREADS threads. The
+    # next batch is decompressed while the current is read.
+
+    def _readBlocks(self, numBlocks):
+        blocks = []
+        for i in xrange(numBlocks):
+            header = self._file.read(18)
+            if header == '':
+                break
+            if len(header) < 18 or header[:2] != GZIP_MAGIC or header[12:16] != 'BC\x02\x00':
+                raise InvalidFormatError('Error: file %s is not a valid BGZF file.' % self._fn)
+
+            blockSize = struct.unpack('<H', header[16:18])[0] + 1
+            blocks.append(header + self._file.read(blockSize - 18))
+        return blocks
+
+    def _decompressBatch(self):
+        blocks = self._readBlocks(BGZF_BATCH_NUM_BLOCKS)
+        if len(blocks) == 0:
+            return None
+
+        if Config.DECOMPRESSION_NUM_THREADS > 1:
+            return _getThreadPool(Config.DECOMPRESSION_NUM_THREADS).map_async(_inflateBgzfBlock, blocks).get
+        else:
+            return lambda: map(_inflateBgzfBlock, blocks)
+
+    def _iterChunks(self):
+        getBatch = self._decompressBatch()
+        while getBatch is not None:
+            getNextBatch = self._decompressBatch()
+            yield ''.join(getBatch())
+            getBatch = getNextBatch
@@ -1,11 +1,13 @@
 import os
 import sys
+import numpy
 
 from copy import copy
 from collections import OrderedDict
 from cStringIO import StringIO
 
 from gtrackcore.core.LogSetup import logException
+from gtrackcore.input.core.CompressedInputFile import isGzipFile, openInputFile
 from gtrackcore.input.core.GenomeElement import GenomeElement
 from gtrackcore.metadata.GenomeInfo import GenomeInfo
 from gtrackcore.util.CommonFunctions import getFileSuffix
@@ -43,6 +45,8 @@ class GenomeElementSource(object):
     _hasUndirectedEdges = False
     _inputIsOneIndexed = False
     _inputIsEndInclusive = False
+    _isChrSplittable = False
+    _blockColumns = None
 
     def __new__(cls, fn, genome=None, trackName=None, suffix=None, forPreProcessor=False, *args, **kwArgs):
         geSourceCls = getGenomeElementSourceClass(fn, suffix=suffix, forPreProcessor=forPreProcessor)
@@ -113,6 +117,69 @@ class GenomeElementSource(object):
     def inputIsEndInclusive(self):
         return self._inputIsEndInclusive
 
+    def isChrSplittable(self):
+        # True if each data line is parsed independently of the others and
+        # starts with the chromosome, followed by a tab.
+        return self._isChrSplittable and self._hasOrigFile and self._strToUseInsteadOfFn == '' and \
+            not isGzipFile(self._fn)
+
+    def supportsBlockParsing(self):
+        # True if the data lines can be parsed in blocks of numeric columns by
+        # GEBlockReader. getBlockColumns() lists (prefix, column index, data
+        # type) for all columns needed to fill and validate the prefixes.
+        if self.getBlockColumns() is None or not self._hasOrigFile or self._strToUseInsteadOfFn != '':
+            return False
+
+        blockPrefixes = [prefix for prefix, colIndex, dataType in self.getBlockColumns()]
+        return all(prefix in blockPrefixes for prefix in self.getPrefixList())
+
+    def getBlockColumns(self):
+        return self._blockColumns
+
+    def getBlockChrColumn(self):
+        return 0
+
+    def _isValidBlockText(self, text):
+        return True
+
+    def _parseBlockColumn(self, prefix, texts, dataType):
+        # Raises ValueError if any of the values cannot be parsed
+        if dataType == 'int32':
+            values = numpy.array(map(int, texts), dtype='int64')
+            if len(values) > 0 and (values.min() < numpy.iinfo('int32').min or values.max() > numpy.iinfo('int32').max):
+                raise ValueError('Value does not fit in int32')
+            return values.astype('int32')
+        elif dataType == 'S':
+            return numpy.array(texts)
+        else:
+            try:
+                values = map(float, texts)
+            except ValueError:
+                values = [float(self._handleNan(text)) for text in texts]
+            return numpy.array(values, dtype=dataType)
+
+    def _isValidBlock(self, chrs, columns, numColsSet, prevElement):
+        return True
+
+    def _areValidBlockPositions(self, chrs, start, end=None):
+        # Vectorized versions of _checkValidStart and _checkValidEnd
+        if (start < 0).any() or (end is not None and (end < 0).any()):
+            return False
+
+        if end is not None and ((end <= start) & ~((start == 1) & (end == 1))).any():
+            return False
+
+        if self.genome:
+            uniqueChrs, chrIndexes = numpy.unique(chrs, return_inverse=True)
+            chrLens = numpy.array([GenomeInfo.getChrLen(self.genome, chr) for chr in uniqueChrs])[chrIndexes]
+            if (start > chrLens).any() or (end is not None and (end - 1 > chrLens).any()):
+                return False
+
+        return True
+
+    def _setLastElementOfPrevBlock(self, ge):
+        pass
+
     def anyWarnings(self):
         return self._lastWarning is not None
 
@@ -187,7 +254,7 @@ class GenomeElementSource(object):
             memFile.write(self._strToUseInsteadOfFn)
             memFile.seek(0)
             return memFile
-        return open(self._fn, 'U', -1)
+        return openInputFile(self._fn)
 
     def __iter__(self):
         geIter = copy(self)
@@ -199,6 +266,48 @@ class GenomeElementSource(object):
     def _iter(self):
         return self
 
+    def getChrByteRanges(self):
+        '''
+        Scans the data lines of the file and returns an OrderedDict from the
+        first column of each line to a list of [start, end] byte ranges of
+        consecutive lines. Returns None if the file cannot be split this way.
+        '''
+        assert self.isChrSplittable()
+
+        chrByteRanges = OrderedDict()
+        with open(self._fn, 'rb') as file:
+            for i in xrange(self._numHeaderLines):
+                file.readline()
+            pos = file.tell()
+
+            prevChr = None
+            for line in file:
+                if '\r' in line.rstrip('\r\n'):
+                    return None
+
+                chr = line.split('\t', 1)[0]
+                if chr == prevChr:
+                    chrByteRanges[chr][-1][1] += len(line)
+                else:
+                    chrByteRanges.setdefault(chr, []).append([pos, pos + len(line)])
+                    prevChr = chr
+                pos += len(line)
+
+        return chrByteRanges
+
+    def iterByteRanges(self, byteRanges):
+        geIter = copy(self)
+        geIter._file = ByteRangeFile(self._fn, byteRanges)
+        geIter._handledEof = False
+
+        # Iterating over geIter directly would call __iter__, which reopens the file
+        geIterator = geIter._iter()
+        while True:
+            try:
+                yield geIterator.next()
+            except StopIteration:
+                return
+
     def _checkValidChr(self, chr):
         if self.genome and not GenomeInfo.isValidChr(self.genome, chr):
             raise InvalidFormatWarning('Chromosome incorrectly specified: ' + chr)
@@ -317,11 +426,32 @@ class GenomeElementSource(object):
 
     genome = property(getGenome)
 
+class ByteRangeFile(object):
+    # Read-only file object that reads lines from a list of byte ranges only
+    def __init__(self, fn, byteRanges):
+        self._file = open(fn, 'rb')
+        self._byteRanges = list(byteRanges)
+        self._end = None
+
+    def readline(self):
+        while self._end is None or self._file.tell() >= self._end:
+            if len(self._byteRanges) == 0:
+                self._file.close()
+                return ''
+            start, self._end = self._byteRanges.pop(0)
+            self._file.seek(start)
+
+        return self._file.readline(self._end - self._file.tell())
+
 def getGenomeElementSourceClass(fn, suffix=None, forPreProcessor=False):
-    for geSourceCls in getAllGenomeElementSourceClasses(forPreProcessor):
-        for clsSuffix in geSourceCls.FILE_SUFFIXES:
-            if (fn.endswith('.' + clsSuffix) if suffix is None else clsSuffix == suffix):
-                return geSourceCls
+    # Compressed files, e.g. 'file.bed.gz', are matched by the suffix before
+    # '.gz', unless a class supports the full suffix, e.g. 'gtrack.gz'.
+    fnCandidates = [fn] + ([fn[:-len('.gz')]] if suffix is None and fn.endswith('.gz') else [])
+    for candidate in fnCandidates:
+        for geSourceCls in getAllGenomeElementSourceClasses(forPreProcessor):
+            for clsSuffix in geSourceCls.FILE_SUFFIXES:
+                if (candidate.endswith('.' + clsSuffix) if suffix is None else clsSuffix == suffix):
+                    return geSourceCls
     else:
         fileSuffix = os.path.splitext(fn)[1] if suffix is None else suffix
         raise NotSupportedError('File type ' + fileSuffix  + ' not supported.')
@@ -1,5 +1,6 @@
 import numpy
 
+from gtrackcore.input.core.CompressedInputFile import openInputFile
 from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
 from gtrackcore.input.core.GenomeElement import GenomeElement
 from gtrackcore.util.CustomExceptions import InvalidFormatError
@@ -9,6 +10,8 @@ class BedGenomeElementSource(GenomeElementSource):
     FILE_SUFFIXES = ['bed']
     FILE_FORMAT_NAME = 'BED'
     _numHeaderLines = 0
+    _isChrSplittable = True
+    _blockColumns = [('start', 1, 'int32'), ('end', 2, 'int32')]
 
     MIN_NUM_COLS = 3
     MAX_NUM_COLS = 12
@@ -21,7 +24,7 @@ class BedGenomeElementSource(GenomeElementSource):
 
     def __init__(self, fn, *args, **kwArgs):
         GenomeElementSource.__init__(self, fn, *args, **kwArgs)
-        f = open(fn)
+        f = openInputFile(fn)
         possibleHeader = f.readline()
         if possibleHeader.startswith('track'):
             self._numHeaderLines = 1
@@ -78,6 +81,10 @@ class BedGenomeElementSource(GenomeElementSource):
                                          "should use the file formats 'valued.bed' or 'gtrack'?")
             ge.val = val
 
+    def _isValidBlock(self, chrs, columns, numColsSet, prevElement):
+        return numColsSet == set([self.MIN_NUM_COLS]) and \
+            self._areValidBlockPositions(chrs, columns['start'], columns['end'])
+
     def getValDataType(self):
         return 'int32'
 
@@ -89,6 +96,10 @@ class PointBedGenomeElementSource(BedGenomeElementSource):
         if end != ge.start + 1:
             raise InvalidFormatError('Error: point BED files can only have segments of length 1')
 
+    def _isValidBlock(self, chrs, columns, numColsSet, prevElement):
+        return BedGenomeElementSource._isValidBlock(self, chrs, columns, numColsSet, prevElement) and \
+            (columns['end'] == columns['start'] + 1).all()
+
 class BedValuedGenomeElementSource(BedGenomeElementSource):
     _VERSION = '1.1'
     FILE_SUFFIXES = ['valued.bed', 'marked.bed']
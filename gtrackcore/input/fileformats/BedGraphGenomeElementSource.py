@@ -1,6 +1,7 @@
 import numpy
 
 from gtrackcore.input.core.GenomeElement import GenomeElement
+from gtrackcore.input.core.CompressedInputFile import openInputFile
 from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
 from gtrackcore.util.CommonConstants import BINARY_MISSING_VAL
 from gtrackcore.util.CustomExceptions import InvalidFormatError
@@ -11,6 +12,8 @@ class BedGraphGenomeElementSource(GenomeElementSource):
     FILE_FORMAT_NAME = 'bedGraph'
 
     _numHeaderLines = 0
+    _isChrSplittable = True
+    _blockColumns = [('start', 1, 'int32'), ('end', 2, 'int32'), ('val', 3, 'float64')]
         
     def __new__(cls, *args, **kwArgs):
         return object.__new__(cls)
@@ -18,7 +21,7 @@ class BedGraphGenomeElementSource(GenomeElementSource):
     def __init__(self, fn, *args, **kwArgs):
         GenomeElementSource.__init__(self, fn, *args, **kwArgs)
         
-        f = open(fn)
+        f = openInputFile(fn)
         trackDef = f.readline()
         if trackDef.startswith('track type=bedGraph'):
             numHeaderLines = 1
@@ -50,6 +53,7 @@ class BedGraphTargetControlGenomeElementSource(BedGraphGenomeElementSource):
     _VERSION = '1.6'
     FILE_SUFFIXES = ['targetcontrol.bedgraph']
     FILE_FORMAT_NAME = 'target/control bedGraph'
+    _blockColumns = None
     
     def __new__(cls, *args, **kwArgs):
         return object.__new__(cls)
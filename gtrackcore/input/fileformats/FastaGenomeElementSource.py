@@ -45,6 +45,20 @@ class FastaGenomeElementSource(GenomeElementSource):
     def _handleEndOfFile(self):
         self._appendBoundingRegionTuple()
 
+    def supportsBlockParsing(self):
+        # Parsed in blocks by FastaBlockReader
+        return self._hasOrigFile and self._strToUseInsteadOfFn == ''
+
+    def _parseSequenceBlock(self, text):
+        # Bulk version of _next() for the sequence lines following a header line
+        if self._chr is None:
+            return None
+
+        seq = np.fromstring(text, dtype='S1')
+        seq = seq[seq != '\n']
+        self._elCount += len(seq)
+        return GenomeElement(self._genome, self._chr, val=seq)
+
     #def next(self):
     #    while True:
     #        bp = self._file.read(1)
@@ -596,6 +596,122 @@ class GtrackGenomeElementSource(GenomeElementSource):
         return len(self._elementList) != 0
 
 
+    # Parsing of data lines in blocks, see GEBlockReader. Only used for files
+    # with a seqid column, numeric columns only and no bounding regions.
+
+    _BLOCK_COLUMNS = [('start', 'start', 'int32'), ('end', 'end', 'int32'), \
+                      ('val', 'value', 'float64'), ('strand', 'strand', 'int8')]
+    _BLOCK_STRANDS = {'+': 1, '-': 0, '.': BINARY_MISSING_VAL}
+    _NON_BLOCK_CHARS_RE = re.compile('[^%s]' % re.escape(''.join(sorted(ALLOWED_CHARS - set(' \r')))))
+
+    def supportsBlockParsing(self):
+        colSpec = self._columnSpec
+        if self._headerDict['fixed-size data lines'] or self._headerDict['circular elements'] or \
+                self.hasNonStandardFixedLength() or self.hasNonStandardFixedGapSize():
+            return False
+
+        if not all(x in colSpec for x in ['seqid', 'start']) or \
+                any(x not in ['seqid', 'start', 'end', 'value', 'strand'] for x in colSpec):
+            return False
+
+        if 'value' in colSpec and (self._headerDict['value type'] != 'number' or \
+                                   self._headerDict['value dimension'] != 'scalar' or \
+                                   self.getValDataType() != 'float64'):
+            return False
+
+        ge, geIter = self.parseFirstDataLine()
+        if geIter.hasBoundingRegionTuples():
+            return False
+
+        return GenomeElementSource.supportsBlockParsing(self)
+
+    def getBlockColumns(self):
+        return [(prefix, self._columnSpec[col], dataType) for prefix, col, dataType in self._BLOCK_COLUMNS \
+                if col in self._columnSpec]
+
+    def getBlockChrColumn(self):
+        return self._columnSpec['seqid']
+
+    def _isValidBlockText(self, text):
+        return self._NON_BLOCK_CHARS_RE.search(text) is None
+
+    def _parseBlockColumn(self, prefix, texts, dataType):
+        if '%' in ''.join(texts):
+            texts = [urllib.unquote(text) for text in texts]
+
+        if prefix == 'start':
+            return GenomeElementSource._parseBlockColumn(self, prefix, texts, dataType) - \
+                (1 if self._headerDict['1-indexed'] else 0)
+        elif prefix == 'end':
+            return GenomeElementSource._parseBlockColumn(self, prefix, texts, dataType) - \
+                (1 if self._headerDict['1-indexed'] else 0) + (1 if self._headerDict['end inclusive'] else 0)
+        elif prefix == 'val':
+            try:
+                values = map(float, texts)
+            except ValueError:
+                values = [numpy.nan if text == '.' else float(text) for text in texts]
+            return numpy.array(values, dtype=dataType)
+        elif prefix == 'strand':
+            try:
+                return numpy.array([self._BLOCK_STRANDS[text] for text in texts], dtype=dataType)
+            except KeyError:
+                raise ValueError('Invalid strand')
+        else:
+            return numpy.array(texts)
+
+    def _isValidBlock(self, chrs, columns, numColsSet, prevElement):
+        if numColsSet != set([len(self._origColumnSpec)]):
+            return False
+
+        start, end = columns['start'], columns.get('end')
+        if not self._areValidBlockPositions(chrs, start, end):
+            return False
+
+        if prevElement is not None:
+            chrs, start, end = [numpy.concatenate([[getattr(prevElement, prefix)], values]) \
+                                if values is not None else None \
+                                for prefix, values in zip(['chr', 'start', 'end'], [chrs, start, end])]
+        sameChr = chrs[1:] == chrs[:-1]
+
+        if self._headerDict['no overlapping elements']:
+            if end is not None:
+                overlaps = (start[1:] < end[:-1]) & (end[1:] > start[:-1])
+            else:
+                # Points at the same position overlap
+                overlaps = start[1:] == start[:-1]
+            if (sameChr & overlaps).any():
+                return False
+
+        if self._headerDict['sorted elements']:
+            # Same order as GenomeElement.__cmp__
+            val, strand = columns.get('val'), columns.get('strand')
+            if prevElement is not None:
+                val, strand = [numpy.concatenate([[getattr(prevElement, prefix)], values]) \
+                               if values is not None else None \
+                               for prefix, values in zip(['val', 'strand'], [val, strand])]
+            # NaN values are compared by the line parser in ways that are not
+            # vectorized here
+            if val is not None and numpy.isnan(val).any():
+                return False
+            keys = [x for x in [chrs, start, end, val, strand] if x is not None]
+            if self._isAnyLessThanPrevious(keys):
+                return False
+
+        return True
+
+    @staticmethod
+    def _isAnyLessThanPrevious(keys):
+        isLess = numpy.zeros(len(keys[0]) - 1, dtype=bool)
+        isEqual = numpy.ones(len(keys[0]) - 1, dtype=bool)
+        for key in keys:
+            isLess |= isEqual & (key[1:] < key[:-1])
+            isEqual &= key[1:] == key[:-1]
+        return isLess.any()
+
+    def _setLastElementOfPrevBlock(self, ge):
+        self._prevElement = ge
+
+
     # Parsing of bounding region lines
 
     def _parseBoundingRegionLine(self, line):
@@ -1321,14 +1437,6 @@ class HbGtrackGenomeElementSource(GtrackGenomeElementSource):
 class GzipGtrackGenomeElementSource(GtrackGenomeElementSource):
     FILE_SUFFIXES = ['gtrack.gz']
 
-    def _getFile(self):
-        import gzip
-        return gzip.open(self._fn, 'r')
-
 
 class HbGzipGtrackGenomeElementSource(HbGtrackGenomeElementSource):
     FILE_SUFFIXES = ['gtrack.gz']
-
-    def _getFile(self):
-        import gzip
-        return gzip.open(self._fn, 'r')
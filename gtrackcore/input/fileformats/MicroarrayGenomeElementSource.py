@@ -1,6 +1,7 @@
 import numpy
 import re
 
+from gtrackcore.input.core.CompressedInputFile import openInputFile
 from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
 from gtrackcore.util.CommonFunctions import splitOnWhitespaceWhileKeepingQuotes
 from gtrackcore.util.CustomExceptions import InvalidFormatError
@@ -17,7 +18,7 @@ class MicroarrayGenomeElementSource(GenomeElementSource):
     def __init__(self, fn, *args, **kwArgs):
         GenomeElementSource.__init__(self, fn, *args, **kwArgs)
     
-        f = open(fn)
+        f = openInputFile(fn)
         trackDef = f.readline().replace('\'','"')
         if not trackDef.startswith('track type="array"'):
             raise InvalidFormatError('Track definition line must start with: track type="array". Line: ' + trackDef)
@@ -13,6 +13,9 @@ class WigGenomeElementSource(GenomeElementSource):
 
     _inputIsOneIndexed = True
     _inputIsEndInclusive = True
+
+    _NON_NEWLINE_WHITESPACE_RE = re.compile('[^\S\n]')
+    _NAN_STRINGS_RE = re.compile('^(?:\.|na|n/a|none)$', re.MULTILINE | re.IGNORECASE)
     
     def __new__(cls, *args, **kwArgs):
         return object.__new__(cls)
@@ -209,6 +212,57 @@ class WigGenomeElementSource(GenomeElementSource):
     def getBoundingRegionTuples(self):
         return self._boundingRegionTuples
         
+    def supportsBlockParsing(self):
+        # fixedStep files are parsed in blocks by WigBlockReader
+        return self._fixedStep == True and self._hasOrigFile and self._strToUseInsteadOfFn == ''
+        
+    def _parseFixedStepBlock(self, text):
+        '''
+        Parses the data lines following a fixedStep declaration line in bulk.
+        Returns a genome element with arrays as contents, or None if the lines
+        need to be parsed one by one, e.g. because of comments or invalid values.
+        '''
+        if not self._fixedStep or text.startswith('\n') or '\n\n' in text or \
+                self._NON_NEWLINE_WHITESPACE_RE.search(text):
+            return None
+        
+        numLines = text.count('\n') + (0 if text.endswith('\n') else 1)
+        vals = self._parseFixedStepVals(text, numLines)
+        if vals is None:
+            vals = self._parseFixedStepVals(self._NAN_STRINGS_RE.sub('nan', text), numLines)
+            if vals is None:
+                return None
+        
+        ge = GenomeElement(genome=self._genome, chr=self._chr, val=vals)
+        if not self._isFunction:
+            starts = self._start + (self._curElCountInBoundingRegion + numpy.arange(numLines)) * self._step
+            try:
+                self._checkValidStart(self._chr, starts[-1])
+                if not self._isPoints:
+                    self._checkValidEnd(self._chr, self._getEnd(starts[-1]), starts[-1])
+            except InvalidFormatError:
+                return None
+            
+            if not self._isStepFunction:
+                ge.start = starts.astype('int32')
+            if not self._isPoints:
+                ge.end = self._getEnd(starts).astype('int32')
+        
+        self._curElCountInBoundingRegion += numLines
+        return ge
+        
+    def _parseFixedStepVals(self, text, numLines):
+        # Parsing stops at the first invalid value, so a trailing value is
+        # added to detect that all lines were parsed
+        vals = numpy.fromstring(text.rstrip('\n') + '\n0', dtype='float64', sep='\n')
+        if len(vals) != numLines + 1:
+            return None
+        
+        # The same NaN as when parsing line by line, so that the output is identical
+        vals = vals[:-1]
+        vals[numpy.isnan(vals)] = numpy.float('nan')
+        return vals
+        
     def getFixedLength(self):
         return self._span if self._fixedStep else 1
         
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import cPickle
+import heapq
+import numpy as np
+
+from itertools import izip
+
+from gtrackcore.core.Config import Config
+
+_KEY_DTYPE = np.dtype([('group', 'int64'), ('genome', 'int32'), ('chr', 'int32'), \
+                       ('start', 'int64'), ('end', 'int64'), ('index', 'int64'), ('numBytes', 'int32')])
+_NONE_POS = np.iinfo('int64').min
+
+class ExternalGESorter(object):
+    # Sorts genome elements on [group, genome, chr, start, end], keeping the
+    # order in which the elements were added for equal keys. None sorts
+    # before all other values, as in Python. The keys are stored in a numpy
+    # record block, and the elements are pickled. When the block reaches
+    # the memory budget, it is sorted with lexsort and spilled to a run of
+    # temporary files. Iteration merges the runs. Each iteration returns new
+    # copies of the elements. The groups can also be iterated in another
+    # order than their numbers, by iterGroups().
+
+    KEY_BYTES_PER_ELEMENT = _KEY_DTYPE.itemsize
+    MERGE_CHUNK_SIZE = 10000
+
+    def __init__(self, memoryBudget=None):
+        self._memoryBudget = memoryBudget if memoryBudget is not None else Config.SORT_MEMORY_BUDGET
+        self._genomeCodes = {}
+        self._chrCodes = {}
+        self._keys = np.empty(1024, dtype=_KEY_DTYPE)
+        self._pickledEls = []
+        self._numBlockBytes = 0
+        self._numElements = 0
+        self._runFns = []
+        self._tempDir = None
+        self._isFinished = False
+
+    @staticmethod
+    def _getCode(codes, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(codes)
+        return code
+
+    def addElement(self, ge, group=0):
+        assert not self._isFinished
+
+        blockSize = len(self._pickledEls)
+        if blockSize == len(self._keys):
+            self._keys = np.resize(self._keys, 2 * blockSize)
+
+        pickledEl = cPickle.dumps(ge.getCopy(), cPickle.HIGHEST_PROTOCOL)
+        self._keys[blockSize] = (group, self._getCode(self._genomeCodes, ge.genome), \
+                                 self._getCode(self._chrCodes, ge.chr), \
+                                 ge.start if ge.start is not None else _NONE_POS, \
+                                 ge.end if ge.end is not None else _NONE_POS, \
+                                 self._numElements, len(pickledEl))
+        self._pickledEls.append(pickledEl)
+        self._numBlockBytes += len(pickledEl) + self.KEY_BYTES_PER_ELEMENT
+        self._numElements += 1
+
+        if self._numBlockBytes >= self._memoryBudget:
+            self._spill()
+
+    def addElements(self, geIter, group=0):
+        for ge in geIter:
+            self.addElement(ge, group)
+
+    @staticmethod
+    def _getRanks(codes):
+        # Maps the codes of the names to their position in sorted order
+        ranks = np.zeros(len(codes), dtype='int32')
+        ranks[[codes[name] for name in sorted(codes)]] = np.arange(len(codes))
+        return ranks
+
+    def _sortBlock(self):
+        keys = self._keys[:len(self._pickledEls)]
+        order = np.lexsort((keys['end'], keys['start'], self._getRanks(self._chrCodes)[keys['chr']], \
+                            self._getRanks(self._genomeCodes)[keys['genome']], keys['group']))
+        return keys[order], [self._pickledEls[i] for i in order]
+
+    def _spill(self):
+        if self._tempDir is None:
+            self._tempDir = tempfile.mkdtemp(prefix='gtrackcore_sort_')
+
+        keys, pickledEls = self._sortBlock()
+        runFn = os.sep.join([self._tempDir, str(len(self._runFns))])
+        np.save(runFn + '.npy', keys)
+        with open(runFn + '.pkl', 'wb') as runFile:
+            runFile.write(''.join(pickledEls))
+
+        self._runFns.append(runFn)
+        self._keys = np.empty(1024, dtype=_KEY_DTYPE)
+        self._pickledEls = []
+        self._numBlockBytes = 0
+
+    def _finish(self):
+        if not self._isFinished:
+            if len(self._runFns) == 0:
+                self._keys, self._pickledEls = self._sortBlock()
+            elif len(self._pickledEls) > 0:
+                self._spill()
+            self._isFinished = True
+
+    @staticmethod
+    def _getGroupSlice(keys, group):
+        # The keys are sorted on group first
+        if group is None:
+            return 0, len(keys)
+        groups = keys['group']
+        return groups.searchsorted(group, 'left'), groups.searchsorted(group, 'right')
+
+    def _iterRun(self, runFn, genomeRanks, chrRanks, group=None):
+        # Yields (sort key, pickled element) pairs of a run, optionally of a single group
+        keys = np.load(runFn + '.npy', mmap_mode='r')
+        runStart, runEnd = self._getGroupSlice(keys, group)
+        with open(runFn + '.pkl', 'rb') as runFile:
+            runFile.seek(int(keys['numBytes'][:runStart].sum(dtype='int64')))
+            for chunkStart in xrange(runStart, runEnd, self.MERGE_CHUNK_SIZE):
+                chunk = np.array(keys[chunkStart:min(chunkStart + self.MERGE_CHUNK_SIZE, runEnd)])
+                sortKeys = np.column_stack([chunk['group'], genomeRanks[chunk['genome']], chrRanks[chunk['chr']], \
+                                            chunk['start'], chunk['end'], chunk['index']]).tolist()
+
+                data = runFile.read(chunk['numBytes'].sum())
+                ends = np.cumsum(chunk['numBytes']).tolist()
+                for sortKey, start, end in izip(sortKeys, [0] + ends[:-1], ends):
+                    yield sortKey, data[start:end]
+
+    def __iter__(self):
+        return self._iterElements()
+
+    def iterGroups(self, groups):
+        # Yields the elements of the groups in the order given
+        for group in groups:
+            for ge in self._iterElements(group):
+                yield ge
+
+    def _iterElements(self, group=None):
+        self._finish()
+
+        if len(self._runFns) == 0:
+            start, end = self._getGroupSlice(self._keys, group)
+            pickledEls = self._pickledEls[start:end]
+        else:
+            genomeRanks, chrRanks = self._getRanks(self._genomeCodes), self._getRanks(self._chrCodes)
+            runIters = [self._iterRun(runFn, genomeRanks, chrRanks, group) for runFn in self._runFns]
+            pickledEls = (pickledEl for sortKey, pickledEl in heapq.merge(*runIters))
+
+        for pickledEl in pickledEls:
+            yield cPickle.loads(pickledEl)
+
+    def __len__(self):
+        return self._numElements
+
+    def getNumRuns(self):
+        return len(self._runFns)
+
+    def removeFiles(self):
+        if self._tempDir is not None:
+            shutil.rmtree(self._tempDir, ignore_errors=True)
+            self._tempDir = None
+
+    def __del__(self):
+        self.removeFiles()
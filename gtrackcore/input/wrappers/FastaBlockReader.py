@@ -0,0 +1,13 @@
+import re
+
+from gtrackcore.input.wrappers.GESectionBlockReader import GESectionBlockReader
+
+class FastaBlockReader(GESectionBlockReader):
+    # Slice source that parses FASTA files in blocks. The sequence lines
+    # following each header line are read as one array, with the newlines
+    # removed.
+
+    _SECTION_LINE_RE = re.compile('^>[^\n]*\n?', re.MULTILINE)
+
+    def _parseSectionBlock(self, text):
+        return self._lineParser._parseSequenceBlock(text)
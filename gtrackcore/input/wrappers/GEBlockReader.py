@@ -0,0 +1,166 @@
+import numpy as np
+
+from collections import OrderedDict
+from copy import copy
+from cStringIO import StringIO
+from itertools import islice
+
+from gtrackcore.input.core.GenomeElement import GenomeElement
+from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
+from gtrackcore.input.wrappers.GESourceWrapper import GESourceWrapper
+from gtrackcore.metadata.GenomeInfo import GenomeInfo
+
+class GEBlockReader(GESourceWrapper):
+    # Slice source that parses the data lines of a GenomeElementSource in
+    # blocks of numeric columns, yielding one genome element per run of
+    # lines from the same chromosome, with numpy arrays as contents. Blocks
+    # that cannot be validated this way, e.g. because of comments, blank
+    # lines or invalid values, are parsed line by line by the original
+    # source, which reports warnings and errors as before.
+
+    BLOCK_SIZE = 100000
+
+    def __new__(cls, geSource=None):
+        from gtrackcore.input.fileformats.WigGenomeElementSource import WigGenomeElementSource
+        from gtrackcore.input.fileformats.FastaGenomeElementSource import FastaGenomeElementSource
+        if isinstance(geSource, WigGenomeElementSource):
+            from gtrackcore.input.wrappers.WigBlockReader import WigBlockReader
+            return WigBlockReader.__new__(WigBlockReader, geSource)
+        if isinstance(geSource, FastaGenomeElementSource):
+            from gtrackcore.input.wrappers.FastaBlockReader import FastaBlockReader
+            return FastaBlockReader.__new__(FastaBlockReader, geSource)
+        return object.__new__(cls)
+
+    @staticmethod
+    def supportsGESource(geSource):
+        return isinstance(geSource, GenomeElementSource) and geSource.supportsBlockParsing()
+
+    def __init__(self, geSource):
+        GESourceWrapper.__init__(self, geSource)
+        self._columns = geSource.getBlockColumns()
+        self._prefixList = geSource.getPrefixList()
+        self._chrColumn = geSource.getBlockChrColumn()
+        self._maxColIndex = max([self._chrColumn] + [colIndex for prefix, colIndex, dataType in self._columns])
+        self._lineParser = None
+        self._prevElement = None
+
+    def isSliceSource(self):
+        return True
+
+    def __iter__(self):
+        geIter = copy(self)
+        geIter._lineParser = geIter._getLineParser()
+        geIter._prevElement = None
+        geIter._blockIter = geIter._iterBlocks()
+        return geIter
+
+    def next(self):
+        return self._blockIter.next()
+
+    def _getLineParser(self):
+        # The line parser has parsed the first data line, in order to keep
+        # state such as the number of columns between blocks
+        ge, lineParser = self._geSource.parseFirstDataLine()
+        lineParser._file.close()
+        lineParser._printWarnings = self._geSource.getPrintWarnings()
+        lineParser._lastWarning = None
+        return lineParser
+
+    def _iterBlocks(self):
+        file = self._geSource._getFileNoHeaders()
+        try:
+            while True:
+                lines = list(islice(file, self.BLOCK_SIZE))
+                if len(lines) == 0:
+                    return
+
+                block = self._parseBlock(lines)
+                if block is None:
+                    block = self._parseBlockLineByLine(lines)
+
+                self._storeLastElement(*block)
+                for ge in self._iterChrRuns(*block):
+                    yield ge
+        finally:
+            file.close()
+
+    def _parseBlock(self, lines):
+        # Comments and blank lines are left to the line parser
+        text = ''.join(lines)
+        if text[0] in '#\n' or '\n#' in text or '\n\n' in text or \
+                not self._geSource._isValidBlockText(text):
+            return None
+
+        rows = [line.rstrip('\r\n').split('\t') for line in lines]
+
+        numColsSet = set(len(row) for row in rows)
+        if min(numColsSet) <= self._maxColIndex:
+            return None
+
+        textCols = zip(*rows)
+        try:
+            chrs = self._geSource._parseBlockColumn('chr', textCols[self._chrColumn], 'S')
+            columns = OrderedDict((prefix, self._geSource._parseBlockColumn(prefix, textCols[colIndex], dataType)) \
+                                  for prefix, colIndex, dataType in self._columns)
+        except (ValueError, OverflowError):
+            return None
+
+        uniqueChrs = np.unique(chrs)
+        if any(chr == '' for chr in uniqueChrs):
+            return None
+
+        genome = self._geSource.genome
+        if genome and not all(GenomeInfo.isValidChr(genome, chr) for chr in uniqueChrs):
+            return None
+
+        if not self._geSource._isValidBlock(chrs, columns, numColsSet, self._prevElement):
+            return None
+
+        return chrs, columns
+
+    def _parseBlockLineByLine(self, lines):
+        lineParser = self._lineParser
+        lineParser._file = StringIO(''.join(lines))
+        lineParser._handledEof = False
+        lineParser._setLastElementOfPrevBlock(self._prevElement)
+        return self._parseWithLineParser()
+
+    def _parseWithLineParser(self):
+        # The line parser is already initialized for iteration, so _iter() is not called again.
+        # The contents are copied at once, as some line parsers reuse the same genome element.
+        lineParser = self._lineParser
+        columnSpecs = [(prefix, dataType) for prefix, colIndex, dataType in self._columns if prefix in self._prefixList]
+        rows = []
+        while True:
+            try:
+                ge = lineParser.next()
+            except StopIteration:
+                break
+            rows.append([ge.chr] + [getattr(ge, prefix) for prefix, dataType in columnSpecs])
+
+        cols = zip(*rows) if len(rows) > 0 else [[]] * (len(columnSpecs) + 1)
+        chrs = np.array(cols[0], dtype='S')
+        columns = OrderedDict([(prefix, np.array(cols[i+1], dtype=dataType)) \
+                               for i, (prefix, dataType) in enumerate(columnSpecs)])
+        return chrs, columns
+
+    def _storeLastElement(self, chrs, columns):
+        if len(chrs) > 0:
+            self._prevElement = GenomeElement(self._geSource.genome, str(chrs[-1]), \
+                                              **dict((prefix, columns[prefix][-1]) for prefix in self._prefixList))
+
+    def _iterChrRuns(self, chrs, columns):
+        runEnds = list(np.flatnonzero(chrs[1:] != chrs[:-1]) + 1) + [len(chrs)]
+
+        runStart = 0
+        for runEnd in runEnds:
+            if runEnd > runStart:
+                yield GenomeElement(self._geSource.genome, str(chrs[runStart]), \
+                                    **dict((prefix, columns[prefix][runStart:runEnd]) for prefix in self._prefixList))
+            runStart = runEnd
+
+    def anyWarnings(self):
+        return (self._lineParser if self._lineParser is not None else self._geSource).anyWarnings()
+
+    def getLastWarning(self):
+        return (self._lineParser if self._lineParser is not None else self._geSource).getLastWarning()
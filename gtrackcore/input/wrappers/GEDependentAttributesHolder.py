@@ -33,6 +33,10 @@ class GEDependentAttributesHolder(GESourceWrapper):
         if self._boundingRegionTuples is None:
             raise NotIteratedYetError
         return self._boundingRegionTuples
+
+    def getBoundingRegionTuplesParsedSoFar(self):
+        #While iterating, the element counts of the last bounding region may still grow
+        return self._geIter.getBoundingRegionTuples()
     
     def _initOtherDependentAttrs(self):
         self._valDim = self._geSource.getValDim()
@@ -4,9 +4,11 @@ from copy import copy
 from bisect import insort
 
 from gtrackcore.core.Config import Config
+from gtrackcore.input.adapters.TrackGenomeElementSource import TrackGenomeElementSource
+from gtrackcore.input.core.GenomeElement import GenomeElement
 from gtrackcore.input.wrappers.GESourceWrapper import GESourceWrapper
 from gtrackcore.util.CommonConstants import BINARY_MISSING_VAL
-from gtrackcore.util.CustomExceptions import ShouldNotOccurError
+from gtrackcore.util.CustomExceptions import AbstractClassError, ShouldNotOccurError
 from gtrackcore.util.CommonFunctions import isIter
 from gtrackcore.track.format.TrackFormat import TrackFormat
 
@@ -25,57 +27,144 @@ class GEOverlapClusterer(object):
         else:
             raise ShouldNotOccurError()
 
-class GEOverlapClustererBase(GESourceWrapper):    
+class GEOverlapClustererBase(GESourceWrapper):
+    # Elements are clustered in blocks of consecutive elements on the same
+    # chromosome. The cluster boundaries are found from the numpy arrays of
+    # starts and ends of each block, while the contents of the elements are
+    # merged only for clusters of more than one element. Contents that are
+    # kept only if equal for all elements of a cluster are compared as numpy
+    # arrays, if available for the block. The last cluster of a block is
+    # kept open, as it may continue in the next block.
+
+    BLOCK_SIZE = 10000
+
     def __init__(self, sortedGeSource):
         GESourceWrapper.__init__(self, sortedGeSource)
-        self._geIter = None
+        self._clusterIter = None
         
     def __iter__(self):
         self = copy(self)
         self._curValsDict = {}
-        self._geIter = self._geSource.__iter__()
-        
-        try:
-            self._prevEl = None
-            self._prevEl = self._geIter.next()
-        except StopIteration:
-            pass
+        self._prevEl = None
+        self._clusterIter = self._iterClusters()
         return self
     
     def next(self):
-        try:
-            while True:
-                el = self._geIter.next()
-                
-                if el.genome == self._prevEl.genome and \
-                   el.chr == self._prevEl.chr and \
-                   self._overlapsPrev(el):
-                        self._extendPrev(el)
-                        self._updateContentsOfPrev(el)
-                else:
-                    self._curValsDict = {}
-                    self._prevEl, el = el, self._prevEl
-                    el = self._removeEdges(el)
-                    return el
-        
-        except StopIteration:
-            if self._prevEl != None:
-                self._curValsDict = {}
-                self._prevEl, el = None, self._prevEl
-                el = self._removeEdges(el)
-                return el
-                
-            raise StopIteration
-    
-    def _removeEdges(self, el):
-        #el = deepcopy(el)
-        el = el.getCopy()
+        return self._clusterIter.next()
+
+    def _iterClusters(self):
+        for genome, chr, starts, ends, contents, getElement in self._iterBlocks():
+            if self._prevEl is not None and (genome != self._prevEl.genome or chr != self._prevEl.chr):
+                yield self._finishPrev()
+
+            clusterStarts = numpy.flatnonzero(self._isNewCluster(starts, ends))
+            clusterEnds = numpy.append(clusterStarts[1:], len(starts)).tolist()
+            clusterStarts = clusterStarts.tolist()
+
+            if self._prevEl is not None:
+                self._extendPrev(ends, contents, 0, clusterStarts[0] if len(clusterStarts) > 0 else len(starts), \
+                                 getElement)
+                if len(clusterStarts) > 0:
+                    yield self._finishPrev()
+
+            for clusterStart, clusterEnd in zip(clusterStarts, clusterEnds):
+                if self._prevEl is not None:
+                    yield self._finishPrev()
+                self._prevEl = getElement(clusterStart)
+                self._extendPrev(ends, contents, clusterStart + 1, clusterEnd, getElement)
+
+        if self._prevEl is not None:
+            yield self._finishPrev()
+
+    def _iterBlocks(self):
+        '''
+        Yields blocks of consecutive elements with the same genome and
+        chromosome, as (genome, chr, starts, ends, contents, getElement),
+        where contents is a dict of numpy arrays of contents that are kept
+        only if equal, and getElement(i) returns a new copy of element
+        number i of the block.
+        '''
+        if isinstance(self._geSource, TrackGenomeElementSource):
+            return self._iterTrackViewBlocks()
+        else:
+            return self._iterElementBlocks()
+
+    def _iterElementBlocks(self):
+        els = []
+        for el in self._geSource:
+            if len(els) > 0 and (len(els) == self.BLOCK_SIZE or el.genome != els[0].genome or el.chr != els[0].chr):
+                yield self._createElementBlock(els)
+                els = []
+            els.append(el)
+
+        if len(els) > 0:
+            yield self._createElementBlock(els)
+
+    def _createElementBlock(self, els):
+        starts = numpy.array([el.start for el in els])
+        ends = numpy.array([el.end for el in els]) if self._usesEnds() else None
+        return els[0].genome, els[0].chr, starts, ends, {}, lambda i: els[i].getCopy()
+
+    def _iterTrackViewBlocks(self):
+        globalCoords = self._geSource.hasGlobalCoords()
+        prefixList = self._geSource.getPrefixList()
+        valDataType = self._geSource.getValDataType()
+        hasEqualityVals = 'val' in prefixList and self._geSource.getValDim() == 1 and \
+                          (valDataType[0] != 'S' or valDataType == 'S1')
+
+        for tv in self._geSource.iterTrackViews():
+            anchor = tv.genomeAnchor
+            offset = anchor.start if globalCoords else 0
+            starts = tv.startsAsNumpyArray() + offset
+            ends = tv.endsAsNumpyArray() + offset if self._usesEnds() else None
+            contents = {}
+            if hasEqualityVals:
+                contents['val'] = tv.valsAsNumpyArray()
+            if 'strand' in prefixList:
+                contents['strand'] = tv.strandsAsNumpyArray()
+            getElement = self._getTrackViewElementGetter(tv, globalCoords)
+            yield anchor.genome, anchor.chr if globalCoords else str(anchor), starts, ends, contents, getElement
+
+    @staticmethod
+    def _getTrackViewElementGetter(tv, globalCoords):
+        indexes = tv.elementIndexesAsNumpyArray()
+        return lambda i: GenomeElement.createGeFromTrackEl(tv.getTrackElement(indexes[i]), tv.trackFormat, \
+                                                            globalCoords=globalCoords)
+
+    def _usesEnds(self):
+        return False
+
+    def _isNewCluster(self, starts, ends):
+        '''
+        Returns a boolean array that is True for the elements of the block
+        that do not overlap the preceding elements, including self._prevEl.
+        '''
+        raise AbstractClassError
+
+    def _extendPrev(self, ends, contents, fromIndex, toIndex, getElement):
+        if toIndex == fromIndex:
+            return
+
+        for prefix, vals in contents.iteritems():
+            if (vals[fromIndex:toIndex] != getattr(self._prevEl, prefix)).any():
+                setattr(self._prevEl, prefix, self._getMissingValue(prefix))
+
+        # Contents that are None for self._prevEl are not changed
+        prefixes = [prefix for prefix in ['val', 'strand', 'id'] + self._prevEl.orderedExtraKeys \
+                    if prefix not in contents and getattr(self._prevEl, prefix) is not None]
+        if len(prefixes) > 0:
+            for i in xrange(fromIndex, toIndex):
+                self._updateContentsOfPrev(getElement(i), prefixes)
+
+    def _finishPrev(self):
+        self._curValsDict = {}
+        self._prevEl, el = None, self._prevEl
         el.edges = []
         el.weights = []
         return el
-        
-    def _updateContentsOfPrev(self, el):
-        for prefix in ['val', 'strand', 'id'] + self._prevEl.orderedExtraKeys:
+    
+    def _updateContentsOfPrev(self, el, prefixes):
+        for prefix in prefixes:
             newVal = self._getNewContentsOfPrev(getattr(self._prevEl, prefix), getattr(el, prefix), prefix)
             if newVal is not None:
                 setattr(self._prevEl, prefix, newVal)
@@ -142,21 +231,34 @@ class GEOverlapClustererBase(GESourceWrapper):
             return ''
         
 class GEOverlapClusterer_Segment(GEOverlapClustererBase):
-    def _overlapsPrev(self, el):
-        return el.start < self._prevEl.end
+    def _usesEnds(self):
+        return True
 
-    def _extendPrev(self, el):
-        #self._prevEl = deepcopy(self._prevEl)
-        self._prevEl = self._prevEl.getCopy()
-        self._prevEl.end = max(self._prevEl.end, el.end)
+    def _isNewCluster(self, starts, ends):
+        # As the starts are sorted, an element overlaps a preceding element
+        # if its start is less than the running maximum of preceding ends
+        prevMaxEnds = numpy.empty(len(ends), dtype='int64')
+        if len(ends) > 0:
+            prevMaxEnds[0] = self._prevEl.end if self._prevEl is not None else starts[0]
+            numpy.maximum.accumulate(numpy.maximum(ends[:-1], prevMaxEnds[0]), out=prevMaxEnds[1:])
 
-class GEOverlapClusterer_Point(GEOverlapClustererBase):
-    def _overlapsPrev(self, el):
-        return el.start == self._prevEl.start
+        isNew = starts >= prevMaxEnds
+        if self._prevEl is None and len(isNew) > 0:
+            isNew[0] = True
+        return isNew
 
-    def _extendPrev(self, el):
-        #self._prevEl = deepcopy(self._prevEl)
-        self._prevEl = self._prevEl.getCopy()
+    def _extendPrev(self, ends, contents, fromIndex, toIndex, getElement):
+        if toIndex > fromIndex:
+            self._prevEl.end = max(self._prevEl.end, int(ends[fromIndex:toIndex].max()))
+        GEOverlapClustererBase._extendPrev(self, ends, contents, fromIndex, toIndex, getElement)
+
+class GEOverlapClusterer_Point(GEOverlapClustererBase):
+    def _isNewCluster(self, starts, ends):
+        isNew = numpy.ones(len(starts), dtype='bool')
+        isNew[1:] = starts[1:] != starts[:-1]
+        if self._prevEl is not None and len(isNew) > 0:
+            isNew[0] = starts[0] != self._prevEl.start
+        return isNew
 
 class GEOverlapClusterer_Partition(GEOverlapClustererBase):
     def __iter__(self):
@@ -0,0 +1,84 @@
+from cStringIO import StringIO
+
+from gtrackcore.input.wrappers.GEBlockReader import GEBlockReader
+from gtrackcore.input.wrappers.GESourceWrapper import GESourceWrapper
+
+class GESectionBlockReader(GEBlockReader):
+    # Base class for block readers of files where the data lines are grouped
+    # in sections, each started by a declaration or header line matching
+    # _SECTION_LINE_RE. These lines are parsed line by line by the original
+    # source, while the data lines between them are parsed in bulk by
+    # _parseSectionBlock(). Data lines that cannot be parsed in bulk are
+    # parsed line by line.
+
+    BLOCK_NUM_BYTES = 16 * 1024 * 1024
+    _SECTION_LINE_RE = None
+
+    def __new__(cls, *args, **kwArgs):
+        return object.__new__(cls)
+
+    def __init__(self, geSource):
+        GESourceWrapper.__init__(self, geSource)
+        self._prefixList = geSource.getPrefixList()
+        self._columns = [(prefix, None, 'int32' if prefix in ['start', 'end'] else geSource.getValDataType()) \
+                         for prefix in self._prefixList]
+        self._lineParser = None
+        self._prevElement = None
+
+    def _getLineParser(self):
+        lineParser = iter(self._geSource)
+        lineParser._file.close()
+
+        # The end of the file is handled after the last block
+        lineParser._handledEof = True
+        return lineParser
+
+    def _iterBlocks(self):
+        file = self._geSource._getFileNoHeaders()
+        try:
+            while True:
+                text = file.read(self.BLOCK_NUM_BYTES)
+                if text == '':
+                    break
+
+                # Completes the last line of the block
+                text += file.readline()
+
+                pos = 0
+                for match in self._SECTION_LINE_RE.finditer(text):
+                    for ge in self._parseSection(text[pos:match.start()]):
+                        yield ge
+                    for ge in self._parseLineByLine(match.group()):
+                        yield ge
+                    pos = match.end()
+
+                for ge in self._parseSection(text[pos:]):
+                    yield ge
+        finally:
+            file.close()
+
+        self._lineParser._handleEndOfFile()
+        self._lineParser._checkBoundingRegionOverlap()
+
+    def _parseSection(self, text):
+        if text == '':
+            return []
+
+        ge = self._parseSectionBlock(text)
+        if ge is None:
+            return self._parseLineByLine(text)
+        return [ge] if len(getattr(ge, self._prefixList[0])) > 0 else []
+
+    def _parseSectionBlock(self, text):
+        '''
+        Returns a genome element with the contents of the data lines as
+        arrays, or None if the lines need to be parsed line by line.
+        '''
+        return None
+
+    def _parseLineByLine(self, text):
+        self._lineParser._file = StringIO(text)
+        return self._iterChrRuns(*self._parseWithLineParser())
+
+    def getBoundingRegionTuples(self):
+        return (self._lineParser if self._lineParser is not None else self._geSource).getBoundingRegionTuples()
@@ -1,5 +1,6 @@
 from copy import copy
 
+from gtrackcore.input.wrappers.ExternalGESorter import ExternalGESorter
 from gtrackcore.input.wrappers.GESourceWrapper import GESourceWrapper
 
 class GESorter(GESourceWrapper):
@@ -11,9 +12,8 @@ class GESorter(GESourceWrapper):
     def __iter__(self):
         if True in [attrs in self._geSource.getPrefixList() for attrs in ['start', 'end']]:
             if self._sortedElements is None:
-                #self._sortedElements = [deepcopy(el) for el in self._geSource]
-                self._sortedElements = [el.getCopy() for el in self._geSource]
-                self._sortedElements.sort(key=lambda el: [el.genome, el.chr, el.start, el.end])
+                self._sortedElements = ExternalGESorter()
+                self._sortedElements.addElements(self._geSource)
                 
             self._geIter = self._sortedElements.__iter__()
             return copy(self)
@@ -0,0 +1,12 @@
+import re
+
+from gtrackcore.input.wrappers.GESectionBlockReader import GESectionBlockReader
+
+class WigBlockReader(GESectionBlockReader):
+    # Slice source that parses fixedStep WIG files in blocks. The value lines
+    # following each declaration line are converted to a float array in bulk.
+
+    _SECTION_LINE_RE = re.compile('^(?:fixedStep|variableStep)[^\n]*\n?', re.MULTILINE)
+
+    def _parseSectionBlock(self, text):
+        return self._lineParser._parseFixedStepBlock(text)
@@ -8,7 +8,7 @@ import gtrackcore.third_party.safeshelve as safeshelve
 
 from gtrackcore.core.Config import Config
 from gtrackcore.track.format.TrackFormat import TrackFormatReq
-from gtrackcore.util.CommonFunctions import strWithStdFormatting, ensurePathExists
+from gtrackcore.util.CommonFunctions import strWithStdFormatting, ensurePathExists, computeFileFingerprint
 from gtrackcore.util.CustomExceptions import ShouldNotOccurError
 from gtrackcore.util.HtmlCore import HtmlCore
 from gtrackcore.util.TextCore import TextCore
@@ -115,6 +115,7 @@ class TrackInfo(object):
         self.numEdgeWeightCategories = None
         self.timeOfPreProcessing = None
         self.preProcVersion = ''
+        self.origFileManifest = None
 
         self.__dict__.update(existingAttrs)
         
@@ -254,7 +255,30 @@ class TrackInfo(object):
         self.timeOfLastUpdate = datetime.datetime.now()
         
     @staticmethod
-    def constructIdFromPath(genome, origPath, geSourceVersion, preProcVersion):
+    def constructIdFromPath(genome, origPath, geSourceVersion, preProcVersion, fileManifest=None):
+        # The id depends on the sizes and content hashes of the files, so
+        # that files that are touched without being changed keep the id.
+        # Fingerprints in fileManifest are reused for files with unchanged
+        # size and modification time.
+        origPath, fileList = TrackInfo._getOrigFileList(origPath)
+        
+        if fileManifest is None:
+            fileManifest = {}
+        fileInfo = tuple([ (fn,) + computeFileFingerprint(os.sep.join([origPath, fn]), fileManifest.get(fn))[0::2] \
+                           for fn in fileList ])
+        return hash( (hash(fileInfo), geSourceVersion, preProcVersion) )
+
+    @staticmethod
+    def constructLegacyIdFromPath(genome, origPath, geSourceVersion, preProcVersion):
+        # The id of tracks preprocessed before the original file manifest was
+        # stored, which depends on the modification times of the files
+        origPath, fileList = TrackInfo._getOrigFileList(origPath)
+        
+        fileInfo = tuple([ (fn, os.stat(os.sep.join([origPath, fn])).st_mtime ) for fn in fileList ])
+        return hash( (hash(fileInfo), geSourceVersion, preProcVersion) )
+
+    @staticmethod
+    def _getOrigFileList(origPath):
         if os.path.isdir(origPath):
             fileList = sorted([fn for fn in os.listdir(origPath) if os.path.isfile(origPath+os.sep+fn) and fn[0]!='.'])
         elif os.path.isfile(origPath):
@@ -262,9 +286,7 @@ class TrackInfo(object):
             origPath = os.path.dirname(origPath)
         else:
             raise ShouldNotOccurError
-        
-        fileInfo = tuple([ (fn, os.stat(os.sep.join([origPath, fn])).st_mtime ) for fn in fileList ])
-        return hash( (hash(fileInfo), geSourceVersion, preProcVersion) )
+        return origPath, fileList
 
     @staticmethod
     def constructIdByTimeStamp():
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from collections import OrderedDict
+from itertools import izip
+from operator import attrgetter
+
+from gtrackcore.preprocess.memmap.GEParseFunctions import GetExtra
+
+class GEColumnBuffers(object):
+    # Per-chromosome buffers of the parsed contents of a GenomeElementSource.
+    # Elements are buffered as rows, and full buffers are spilled to
+    # temporary .npy files per column. The elements can then be written to
+    # the output files without parsing the source a second time.
+
+    CHUNK_SIZE = 100000
+
+    def __init__(self, prefixList, valDataType):
+        self._prefixList = list(prefixList)
+        self._dataTypes = [self._getDataType(prefix, valDataType) for prefix in self._prefixList]
+
+        if 'extra' in self._prefixList:
+            parseFuncs = [GetExtra(prefix).parse for prefix in self._prefixList]
+            self._getRow = lambda ge: tuple(parseFunc(ge) for parseFunc in parseFuncs)
+        else:
+            getAttrs = attrgetter(*self._prefixList)
+            self._getRow = getAttrs if len(self._prefixList) > 1 else lambda ge: (getAttrs(ge),)
+
+        self._rows = OrderedDict()
+        self._spilledFns = OrderedDict()
+        self._tempDir = None
+        self._numSpilledFiles = 0
+
+    @staticmethod
+    def _getDataType(prefix, valDataType):
+        if prefix in ['start', 'end']:
+            return 'int32'
+        elif prefix == 'strand':
+            return 'int8'
+        elif prefix == 'val':
+            return valDataType
+        else:
+            return 'S'
+
+    @staticmethod
+    def supportsPrefixList(prefixList):
+        return len(prefixList) > 0 and not any(prefix in ['edges', 'weights'] for prefix in prefixList)
+
+    def addElement(self, ge):
+        rows = self._rows.get(ge.chr)
+        if rows is None:
+            rows = self._rows[ge.chr] = []
+            self._spilledFns[ge.chr] = []
+
+        rows.append(self._getRow(ge))
+        if len(rows) == self.CHUNK_SIZE:
+            self._spill(ge.chr)
+
+    def _iterColumnArrays(self, rows):
+        for prefix, dataType, column in izip(self._prefixList, self._dataTypes, izip(*rows)):
+            yield prefix, np.array(column, dtype=dataType)
+
+    def _spill(self, chr):
+        if self._tempDir is None:
+            self._tempDir = tempfile.mkdtemp(prefix='gtrackcore_columns_')
+
+        chunkFns = OrderedDict()
+        for prefix, array in self._iterColumnArrays(self._rows[chr]):
+            fn = os.sep.join([self._tempDir, '%s.npy' % self._numSpilledFiles])
+            np.save(fn, array)
+            chunkFns[prefix] = fn
+            self._numSpilledFiles += 1
+
+        self._spilledFns[chr].append(chunkFns)
+        del self._rows[chr][:]
+
+    def getChrs(self):
+        return self._rows.keys()
+
+    def iterColumnChunks(self, chr):
+        '''
+        Yields (prefix, array) pairs for all chunks of the chromosome, in
+        the order the elements were added.
+        '''
+        for chunkFns in self._spilledFns[chr]:
+            for prefix, fn in chunkFns.iteritems():
+                yield prefix, np.load(fn)
+
+        if len(self._rows[chr]) > 0:
+            for prefix, array in self._iterColumnArrays(self._rows[chr]):
+                yield prefix, array
+
+    def removeFiles(self):
+        if self._tempDir is not None:
+            shutil.rmtree(self._tempDir, ignore_errors=True)
+            self._tempDir = None
+
+    def __del__(self):
+        self.removeFiles()
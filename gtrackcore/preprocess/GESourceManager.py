@@ -7,6 +7,7 @@ from gtrackcore.input.wrappers.GESourceWrapper import BrTuplesGESourceWrapper
 from gtrackcore.input.wrappers.GEOverlapClusterer import GEOverlapClusterer
 from gtrackcore.input.wrappers.GEBoundingRegionElementCounter import GEBoundingRegionElementCounter
 from gtrackcore.input.wrappers.GEDependentAttributesHolder import GEDependentAttributesHolder
+from gtrackcore.preprocess.GEColumnBuffers import GEColumnBuffers
 from gtrackcore.track.format.TrackFormat import TrackFormat
 from gtrackcore.util.CommonFunctions import flatten
 from gtrackcore.util.CommonConstants import RESERVED_PREFIXES
@@ -14,7 +15,7 @@ from gtrackcore.util.CommonClasses import OrderedDefaultDict
 from gtrackcore.util.CustomExceptions import NotSupportedError
 
 class GESourceManager(object):
-    def __init__(self, geSource):
+    def __init__(self, geSource, singlePass=False):
         self._geSource = self._decorateGESource(geSource)
         self._boundingRegionsAndGEsCorrespond = None
 
@@ -28,6 +29,8 @@ class GESourceManager(object):
         self._maxNumEdges = OrderedDefaultDict(int)
 
         self._hasCalculatedStats = False
+        self._singlePass = singlePass
+        self._columnBuffers = None
 #        self._calcStatisticsInExtraPass()
 
     def _decorateGESource(self, geSource):
@@ -48,8 +51,14 @@ class GESourceManager(object):
 
     def _calcStatisticsInExtraPass(self):
         if not self._hasCalculatedStats:
+            if self._singlePass and not self._geSource.isSliceSource() and \
+                    GEColumnBuffers.supportsPrefixList(self._geSource.getPrefixList()):
+                self._columnBuffers = GEColumnBuffers(self._geSource.getPrefixList(), \
+                                                      self._geSource.getValDataType())
+
+            # Warnings are printed in the pass that writes the output
             prevPrintWarnings = self._geSource.getPrintWarnings()
-            self._geSource.setPrintWarnings(False)
+            self._geSource.setPrintWarnings(self._columnBuffers is not None and prevPrintWarnings)
 
             if self._geSource.isSliceSource():
                 if len(self._getMaxStrLensKeys()):
@@ -64,6 +73,9 @@ class GESourceManager(object):
                     chr = el.chr
                     self._numElements[chr] += 1
 
+                    if self._columnBuffers is not None:
+                        self._columnBuffers.addElement(el)
+
                     if el.isBlankElement:
                         continue
 
@@ -91,6 +103,10 @@ class GESourceManager(object):
     def getGESource(self):
         return self._geSource
 
+    def getColumnBuffers(self):
+        # Only available in single-pass mode, after the statistics have been calculated
+        return self._columnBuffers
+
     def getBoundingRegionTuples(self):
         boundingRegionTuples = [x for x in self._getBoundingRegionTuples() \
                                 if x.region.chr is not None]
@@ -179,13 +195,13 @@ class GESourceManager(object):
 
 
 class OverlapClusteringGESourceManager(GESourceManager):
-    def __init__(self, genome, trackName, origBrTuples):
+    def __init__(self, genome, trackName, origBrTuples, singlePass=False):
         self._origBrTuples = origBrTuples
         trackGESource = TrackGenomeElementSource(genome, trackName, \
                                                  [br.region for br in self._origBrTuples],
                                                  allowOverlaps=True)
 
-        GESourceManager.__init__(self, trackGESource)
+        GESourceManager.__init__(self, trackGESource, singlePass=singlePass)
         self._brTuplesForClusteredElements = None
 
     def _decorateGESource(self, geSource):
@@ -39,6 +39,7 @@ class PreProcMetaDataCollector(object):
         self._undirectedEdges = None
         self._preProcVersion = ''
         self._id = None
+        self._origFileManifest = None
         
         self._numElements = defaultdict(int)
         self._boundingRegionTuples = defaultdict(list)
@@ -86,6 +87,16 @@ class PreProcMetaDataCollector(object):
         self._valCategories[allowOverlaps] |= valCategories
         self._edgeWeightCategories[allowOverlaps] |= edgeWeightCategories
         
+    def updateMetaDataFromMergedTrack(self, allowOverlaps, numElements, valCategories, edgeWeightCategories):
+        # After an incremental update, the counts of the new elements are
+        # replaced by the counts of the full track
+        self._numElements[allowOverlaps] = numElements
+        self._valCategories[allowOverlaps] = valCategories
+        self._edgeWeightCategories[allowOverlaps] = edgeWeightCategories
+        
+    def updateOrigFileManifest(self, origFileManifest):
+        self._origFileManifest = origFileManifest
+        
     def flagChrsAsPreProcessed(self, allowOverlaps, chrList):
         for chr in chrList:
             self._preProcChrs[allowOverlaps][chr] = None
@@ -186,6 +197,7 @@ class PreProcMetaDataCollector(object):
             ti.numEdgeWeightCategories = len(self._edgeWeightCategories[True])
         
         ti.id = self._id
+        ti.origFileManifest = self._origFileManifest
         ti.timeOfPreProcessing = datetime.datetime.now()
     
         ti.lastUpdatedBy = username
@@ -1,16 +1,33 @@
+from multiprocessing import Pool
+
+from gtrackcore.core.Config import Config
+from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
+from gtrackcore.input.wrappers.GEBlockReader import GEBlockReader
+from gtrackcore.input.wrappers.GEDependentAttributesHolder import GEDependentAttributesHolder
+from gtrackcore.metadata.TrackInfo import TrackInfo
 from gtrackcore.preprocess.PreProcMetaDataCollector import PreProcMetaDataCollector
 from gtrackcore.preprocess.PreProcessUtils import PreProcessUtils
 from gtrackcore.preprocess.memmap.OutputManager import OutputManager
 
+# The job being run in parallel. Set before the worker processes are forked,
+# so that the workers inherit it instead of having it pickled.
+_parallelJob = None
+
+def _writeChrInWorker(chr):
+    _parallelJob._writeChr(chr)
+
 class PreProcessGeSourceJob(object):
     VERSION = '0.95'
         
-    def __init__(self, trackName, geSourceManager, allowOverlaps, mode='Real'):
+    def __init__(self, trackName, geSourceManager, allowOverlaps, mode='Real', numWorkers=None, origFileManifest=None):
         self._trackName = trackName
+        self._origFileManifest = origFileManifest
         self._allowOverlaps = allowOverlaps
         self._geSourceManager = geSourceManager
         self._mode = mode
+        self._numWorkers = numWorkers if numWorkers is not None else Config.PREPROCESS_NUM_WORKERS
         self._dirty = False
+        self._chrByteRanges = None
         
     def process(self):
         self._createPreProcFiles()
@@ -23,12 +40,15 @@ class PreProcessGeSourceJob(object):
         genome = geSource.genome
         
         collector = PreProcMetaDataCollector(genome, self._trackName)
+        origFileManifest = self._origFileManifest if self._origFileManifest is not None \
+            else TrackInfo(genome, self._trackName).origFileManifest
         
         collector.updateMetaDataForFinalization(geSource.getFileSuffix(), geSource.getPrefixList(), \
                                                 geSource.getValDataType(), geSource.getValDim(), \
                                                 geSource.getEdgeWeightDataType(), geSource.getEdgeWeightDim(), \
                                                 geSource.hasUndirectedEdges(),
-                                                geSource.getVersion(), PreProcessUtils.constructId(geSource), \
+                                                geSource.getVersion(), \
+                                                PreProcessUtils.constructId(geSource, origFileManifest), \
                                                 self._geSourceManager.getNumElements(), \
                                                 self._geSourceManager.getBoundingRegionTuples(), \
                                                 self._geSourceManager.getValCategories(), \
@@ -39,10 +59,25 @@ class PreProcessGeSourceJob(object):
             return
         
         if self._mode != 'Real':
+            if self._geSourceManager.getColumnBuffers() is not None:
+                self._geSourceManager.getColumnBuffers().removeFiles()
+                return
+            
             for ge in geSource:
                 pass
             return
         
+        columnBuffers = self._geSourceManager.getColumnBuffers()
+        if columnBuffers is not None:
+            self._writeColumnBuffers(columnBuffers)
+            collector.flagChrsAsPreProcessed(self._allowOverlaps, self._geSourceManager.getAllChrs())
+            return
+        
+        if self._shouldWriteChrsInParallel():
+            self._writeChrsInParallel()
+            collector.flagChrsAsPreProcessed(self._allowOverlaps, self._geSourceManager.getAllChrs())
+            return
+        
         output = OutputManager(genome, self._trackName, self._allowOverlaps, self._geSourceManager)
         
         writeFunc = output.writeRawSlice if geSource.isSliceSource() else output.writeElement
@@ -54,5 +89,69 @@ class PreProcessGeSourceJob(object):
         
         output.close()
 
+    def _writeColumnBuffers(self, columnBuffers):
+        # The source has already been parsed into column buffers, in the
+        # single-pass mode of the GESourceManager
+        output = OutputManager(self._geSourceManager.getGESource().genome, self._trackName, \
+                               self._allowOverlaps, self._geSourceManager)
+        try:
+            for chr in columnBuffers.getChrs():
+                for prefix, array in columnBuffers.iterColumnChunks(chr):
+                    output.writeColumn(chr, prefix, array)
+        finally:
+            columnBuffers.removeFiles()
+        
+        output.close()
+
+    def _getOrigGESource(self):
+        geSource = self._geSourceManager.getGESource()
+        if isinstance(geSource, GEDependentAttributesHolder):
+            geSource = geSource._geSource
+        if isinstance(geSource, GEBlockReader):
+            geSource = geSource._geSource
+        return geSource
+
+    def _shouldWriteChrsInParallel(self):
+        if self._numWorkers <= 1 or len(self._geSourceManager.getAllChrs()) <= 1:
+            return False
+        
+        origGeSource = self._getOrigGESource()
+        if not isinstance(origGeSource, GenomeElementSource) or not origGeSource.isChrSplittable():
+            return False
+        
+        self._chrByteRanges = origGeSource.getChrByteRanges()
+        return self._chrByteRanges is not None
+
+    def _writeChrsInParallel(self):
+        # Each chromosome is parsed from its own byte ranges of the file and
+        # written to its own output directory in a separate process. The
+        # largest chromosomes are started first.
+        global _parallelJob
+        
+        chrList = sorted(self._geSourceManager.getAllChrs(), \
+                         key=self._geSourceManager.getNumElementsForChr, reverse=True)
+        
+        _parallelJob = self
+        pool = Pool(min(self._numWorkers, len(chrList)))
+        try:
+            pool.map(_writeChrInWorker, chrList, chunksize=1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _parallelJob = None
+
+    def _writeChr(self, chr):
+        origGeSource = self._getOrigGESource()
+        output = OutputManager(origGeSource.genome, self._trackName, self._allowOverlaps, \
+                               self._geSourceManager, chrList=[chr])
+        
+        for ge in origGeSource.iterByteRanges(self._chrByteRanges[chr]):
+            output.writeElement(ge)
+        
+        output.close()
+
     def hasModifiedData(self):
         return self._dirty
@@ -3,20 +3,24 @@
 import os
 import sys
 import traceback
+import numpy
 #import pyximport; pyximport.install()
 
-from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
+from gtrackcore.input.core.GenomeElementSource import BoundingRegionTuple, GenomeElementSource
+from gtrackcore.input.wrappers.GEBlockReader import GEBlockReader
 from gtrackcore.metadata.TrackInfo import TrackInfo
 from gtrackcore.preprocess.memmap.ChrMemmapFolderMerger import ChrMemmapFolderMerger
 from gtrackcore.preprocess.GESourceManager import GESourceManager, OverlapClusteringGESourceManager, RegionBasedGESourceManager
 from gtrackcore.preprocess.PreProcessGeSourceJob import PreProcessGeSourceJob
 from gtrackcore.preprocess.PreProcMetaDataCollector import PreProcMetaDataCollector
 from gtrackcore.preprocess.PreProcessUtils import PreProcessUtils
-from gtrackcore.track.format.TrackFormat import TrackFormat
+from gtrackcore.track.format.TrackFormat import TrackFormat, TrackFormatReq
 from gtrackcore.track.hierarchy.ExternalTrackManager import ExternalTrackManager
 from gtrackcore.track.hierarchy.ProcTrackOptions import ProcTrackOptions
 from gtrackcore.track.hierarchy.RenameTrack import renameTrack
 from gtrackcore.track.hierarchy.OrigTrackFnSource import OrigTrackNameSource
+from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve
+from gtrackcore.track.memmap.TrackLayout import TrackLayout
 from gtrackcore.util.CommonFunctions import createOrigPath, createDirPath, prettyPrintTrackName, \
                                         reorderTrackNameListFromTopDownToBottomUp, \
                                         replaceIllegalElementsInTrackNames
@@ -26,14 +30,20 @@ class PreProcessTracksJob(object):
     VERSION = '1.0'
 
     PASS_ON_EXCEPTIONS = False
+    PARSE_IN_BLOCKS = True
 
-    def __init__(self, genome, username='', mode='Real', raiseIfAnyWarnings=False):
+    def __init__(self, genome, username='', mode='Real', raiseIfAnyWarnings=False, numWorkers=None, singlePass=False):
         self._genome = genome
         self._username = username
         self._mode = mode
+        self._numWorkers = numWorkers
+        self._singlePass = singlePass
+        self._isIncremental = False
         self._status = ''
         self._raiseIfAnyWarnings = raiseIfAnyWarnings
         self._warningTrackNames = []
+        self._skippedGESources = []
+        self._origFileManifests = {}
 
     def process(self):
         assert self._genome is not None, 'Error: genome must be specified when preprocessing tracks.'
@@ -47,6 +57,11 @@ class PreProcessTracksJob(object):
             try:
                 trackName = self._renameTrackNameIfIllegal(trackName)
 
+                self._isIncremental = self._shouldPreProcessIncrementally(trackName)
+                if self._isIncremental:
+                    self._printIncrementalMessage(trackName)
+                    TrackInfo(self._genome, trackName).resetTimeOfPreProcessing()
+
                 for allowOverlaps in [True, False]:
                     anyGeSourceManagers = False
 
@@ -55,14 +70,16 @@ class PreProcessTracksJob(object):
 
                         # PreProcess if needed
                         if self._shouldPreProcess():
-                            PreProcessUtils.removeOutdatedPreProcessedFiles(self._genome, trackName, allowOverlaps, self._mode)
+                            if not self._isIncremental:
+                                PreProcessUtils.removeOutdatedPreProcessedFiles(self._genome, trackName, allowOverlaps, self._mode)
 
                             if self._shouldPrintProcessMessages() and allowOverlaps not in overlapRulesProcessedForTrackName:
                                 self._printProcessTrackMessage(trackName, allowOverlaps)
                                 overlapRulesProcessedForTrackName.append(allowOverlaps)
 
                             self._status = 'Trying to preprocess geSource...'
-                            geSourceJob = PreProcessGeSourceJob(trackName, geSourceManager, allowOverlaps, self._mode)
+                            geSourceJob = PreProcessGeSourceJob(trackName, geSourceManager, allowOverlaps, self._mode, self._numWorkers, \
+                                                                self._getOrigFileManifest(trackName))
                             anyWarnings = geSourceJob.process()
 
                             if self._raiseIfAnyWarnings and anyWarnings and trackName not in self._warningTrackNames:
@@ -72,7 +89,15 @@ class PreProcessTracksJob(object):
 
                     # Finalize overlapRule output if needed
                     if anyGeSourceManagers and self._shouldFinalize() and collector.preProcIsDirty():
-                        if self._mode == 'Real' and self._shouldMergeChrFolders():
+                        if self._isIncremental:
+                            self._status = 'Trying to update the preprocessed files with the new chromosome vectors.'
+                            replaceChrs = not allowOverlaps and collector.overlapRuleHasBeenFinalized(True)
+                            PreProcessUtils.updatePreProcessedFilesIncrementally(self._genome, trackName, allowOverlaps, replaceChrs)
+
+                            self._status = 'Trying to remove chromosome folders'
+                            PreProcessUtils.removeChrMemmapFolders(self._genome, trackName, allowOverlaps)
+
+                        elif self._mode == 'Real' and self._shouldMergeChrFolders():
                             self._status = 'Trying to combine chromosome vectors into combined vectors.'
                             PreProcessUtils.createBoundingRegionShelve(self._genome, trackName, allowOverlaps)
                             ChrMemmapFolderMerger.merge(self._genome, trackName, allowOverlaps)
@@ -80,20 +105,24 @@ class PreProcessTracksJob(object):
                             self._status = 'Trying to remove chromosome folders'
                             PreProcessUtils.removeChrMemmapFolders(self._genome, trackName, allowOverlaps)
 
+                            self._status = 'Trying to pack sequence files'
+                            PreProcessUtils.packSequenceFiles(self._genome, trackName, allowOverlaps)
+
                         self._status = 'Trying to check whether 3D data is correct'
                         PreProcessUtils.checkIfEdgeIdsExist(self._genome, trackName, allowOverlaps)
                         PreProcessUtils.checkUndirectedEdges(self._genome, trackName, allowOverlaps)
-                        PreProcessUtils.checkUndirectedEdges(self._genome, trackName, allowOverlaps)
                         collector.markOverlapRuleAsFinalized(allowOverlaps)
 
                 # Finalize track if needed
                 if self._shouldFinalize():
                     if collector.preProcIsDirty():
                         self._status = 'Trying to finalize.'
+                        collector.updateOrigFileManifest(self._getOrigFileManifest(trackName))
                         collector.finalize(self._username, self._shouldPrintProcessMessages())
                         if not atLeastOneFinalized:
                             atLeastOneFinalized = True
                     else:
+                        self._updateStoredOrigFileManifest(trackName)
                         collector.removeEntry()
 
             except NotSupportedError, e:
@@ -136,19 +165,69 @@ class PreProcessTracksJob(object):
                 self._status = 'Trying to prepare preprocessing for track "%s"' % ':'.join(trackName) + \
                                 (' (filename: "%s")' % geSource.getFileName() if geSource.hasOrigFile() else '') + \
                                 (' (allowOverlaps: %s)' % allowOverlaps)
-                if PreProcessUtils.shouldPreProcessGESource(trackName, geSource, allowOverlaps):
+                skipReason = PreProcessUtils.getReasonForSkippingGESource(trackName, geSource, allowOverlaps, \
+                                                                          self._getOrigFileManifest(trackName))
+                if skipReason is None:
                     yield self._getGESourceManagerFromGESource(geSource)
+                else:
+                    self._reportSkippedGESource(trackName, geSource, allowOverlaps, skipReason)
 
     def _allGESources(self, trackName):
         raise AbstractClassError
 
+    def _shouldPreProcessIncrementally(self, trackName):
+        return False
+
+    def _getOrigFileManifest(self, trackName):
+        # The original files are fingerprinted once per track and run, and
+        # the manifest is shared by all checks of the files
+        key = tuple(trackName)
+        if key not in self._origFileManifests:
+            self._origFileManifests[key] = self._constructOrigFileManifest(trackName)
+        return self._origFileManifests[key]
+
+    def _constructOrigFileManifest(self, trackName):
+        return None
+
+    def _updateStoredOrigFileManifest(self, trackName):
+        # Stores the modification times of touched, but unchanged files, so
+        # that they are not hashed again in later runs
+        if self._mode != 'Real':
+            return
+
+        ti = TrackInfo(self._genome, trackName)
+        origFileManifest = self._getOrigFileManifest(trackName)
+        if ti.isValid() and origFileManifest is not None and ti.origFileManifest is not None and \
+                origFileManifest != ti.origFileManifest and \
+                all(PreProcessUtils.origFileIsUnchanged(origFileManifest.get(relFn), fingerprint) \
+                    for relFn, fingerprint in ti.origFileManifest.iteritems()):
+            ti.origFileManifest = origFileManifest
+            ti.store()
+
+    def getSkippedGESources(self):
+        '''
+        Returns a list of (trackName, fileName, allowOverlaps, reason) for
+        the geSources that were not preprocessed.
+        '''
+        return self._skippedGESources
+
     def _getGESourceManagerFromGESource(self, geSource):
-        return GESourceManager(geSource)
+        if self.PARSE_IN_BLOCKS and GEBlockReader.supportsGESource(geSource):
+            geSource = GEBlockReader(geSource)
+        return GESourceManager(geSource, singlePass=self._singlePass)
 
     def _getGESourceManagerFromTrack(self, trackName):
         origBrTuples = PreProcMetaDataCollector(self._genome, trackName).\
                         getBoundingRegionTuples(allowOverlaps=True)
-        return OverlapClusteringGESourceManager(self._genome, trackName, origBrTuples)
+
+        if self._isIncremental:
+            # Only the chromosomes with new elements are clustered, from all
+            # their bounding regions in the updated track
+            brShelve = BoundingRegionShelve(self._genome, trackName, allowOverlaps=True)
+            origBrTuples = [BoundingRegionTuple(region, 0) for chr in sorted(set(br.region.chr for br in origBrTuples)) \
+                            for region in brShelve.getAllBoundingRegionsForChr(chr)]
+
+        return OverlapClusteringGESourceManager(self._genome, trackName, origBrTuples, singlePass=self._singlePass)
 
     def _shouldPreProcess(self):
         return True
@@ -183,6 +262,18 @@ class PreProcessTracksJob(object):
             ti.subTrackCount = 1
             ti.store()
 
+    def _reportSkippedGESource(self, trackName, geSource, allowOverlaps, reason):
+        fileName = geSource.getFileName() if geSource.hasOrigFile() else None
+        self._skippedGESources.append((trackName, fileName, allowOverlaps, reason))
+        if self._shouldPrintProcessMessages():
+            print "Skipping %s of track '%s' with allowOverlaps: %s (%s)" % \
+                  ("file '%s'" % os.path.basename(fileName) if fileName else 'source', ':'.join(trackName), \
+                   allowOverlaps, reason)
+
+    def _printIncrementalMessage(self, trackName):
+        if self._shouldPrintProcessMessages():
+            print "Adding new data incrementally to track: '%s'" % ':'.join(trackName)
+
     def _printProcessTrackMessage(self, trackName, allowOverlaps):
         if self._mode == 'Simulated':
             print "Would now have processed track: '%s' with allowOverlaps: %s in a real run." % (':'.join(trackName), allowOverlaps)
@@ -201,19 +292,21 @@ class PreProcessTracksJob(object):
             print os.linesep + '--- END ERROR ---' + os.linesep
 
 class PreProcessAllTracksJob(PreProcessTracksJob):
-    def __init__(self, genome, trackNameFilter=[], username='', mergeChrFolders=True, **kwArgs):
+    def __init__(self, genome, trackNameFilter=[], username='', mergeChrFolders=True, incremental=False, **kwArgs):
         PreProcessTracksJob.__init__(self, genome, username=username, **kwArgs)
         if trackNameFilter == ['']:
             trackNameFilter = []
         self._trackNameFilter = trackNameFilter
         self._mergeChrFolders = mergeChrFolders
+        self._incremental = incremental
+        self._newOrigFns = None
 
     def _allTrackNames(self):
         #avoidLiterature = len(self._trackNameFilter) == 0 or (self._trackNameFilter != GenomeInfo.getLiteratureTrackName(self._genome))
         trackSource = OrigTrackNameSource(self._genome, self._trackNameFilter, avoidLiterature=False)
         return reorderTrackNameListFromTopDownToBottomUp(trackSource)
 
-    def _allGESources(self, trackName):
+    def _allOrigFns(self, trackName):
         baseDir = createOrigPath(self._genome, trackName)
 
         self._status = 'Trying os.listdir on: ' + baseDir
@@ -228,9 +321,84 @@ class PreProcessAllTracksJob(PreProcessTracksJob):
             if fnPart[0] in ['.','_','#'] or fnPart[-1] in ['~','#']: #to avoid hidden files..
                 continue
 
+            yield fn
+
+    def _allGESources(self, trackName):
+        for fn in (self._newOrigFns if self._isIncremental else self._allOrigFns(trackName)):
             self._status = 'Trying to create geSource from fn: ' + fn
             yield GenomeElementSource(fn, self._genome, forPreProcessor=True)
 
+    def _shouldPreProcessIncrementally(self, trackName):
+        # New files can be added to a preprocessed track without reprocessing
+        # the existing files, if these are unchanged and the track is sparse.
+        # The new files must agree with the track on having overlapping
+        # elements or not.
+        self._newOrigFns = None
+        if not self._incremental or self._mode != 'Real':
+            return False
+
+        ti = TrackInfo(self._genome, trackName)
+        if not ti.isValid() or ti.origFileManifest is None or \
+                TrackFormatReq(name=ti.trackFormatName).isDense():
+            return False
+
+        origFns = list(self._allOrigFns(trackName))
+        origFileManifest = self._getOrigFileManifest(trackName)
+        if not all(PreProcessUtils.origFileIsUnchanged(origFileManifest.get(relFn), fingerprint) \
+                   for relFn, fingerprint in ti.origFileManifest.iteritems()):
+            return False
+
+        newOrigFns = [fn for fn in origFns if os.path.basename(fn) not in ti.origFileManifest]
+        if len(newOrigFns) == 0:
+            return False
+
+        hasOverlapsTrack = BoundingRegionShelve(self._genome, trackName, allowOverlaps=True).fileExists()
+        if not BoundingRegionShelve(self._genome, trackName, allowOverlaps=False).fileExists():
+            return False
+
+        layout = TrackLayout.getLayout(trackName, self._genome, None, allowOverlaps=False)
+        for fn in newOrigFns:
+            geSource = GenomeElementSource(fn, self._genome, forPreProcessor=True)
+            if geSource.getVersion() != ti.preProcVersion or \
+                    TrackFormat.createInstanceFromGeSource(geSource).isDense() or \
+                    geSource.hasNoOverlappingElements() == hasOverlapsTrack or \
+                    not self._geSourceMatchesTrack(geSource, ti, layout):
+                return False
+
+        self._newOrigFns = newOrigFns
+        return True
+
+    @staticmethod
+    def _geSourceMatchesTrack(geSource, ti, layout):
+        # The elements of the new files are combined with the merged memmaps
+        # of the track, which requires the same track format, the same
+        # prefixes and the same data types of values and edge weights.
+        trackFormat = TrackFormat.createInstanceFromGeSource(geSource)
+        if trackFormat.getFormatName() != ti.trackFormatName or \
+                trackFormat.getValTypeName() != ti.markType or \
+                trackFormat.getWeightTypeName() != ti.weightType:
+            return False
+
+        trackPrefixes = set(prefix for prefix in layout.fileInfos if prefix not in ['leftIndex', 'rightIndex'])
+        if set(geSource.getPrefixList()) != trackPrefixes:
+            return False
+
+        for prefix, dataType, dim in [('val', geSource.getValDataType(), geSource.getValDim()), \
+                                      ('weights', geSource.getEdgeWeightDataType(), geSource.getEdgeWeightDim())]:
+            if prefix in layout.fileInfos:
+                fileInfo = layout.fileInfos[prefix]
+                # The lengths of strings may differ, as the merged files are
+                # rewritten with the longest string
+                if numpy.dtype(dataType).kind != numpy.dtype(fileInfo.dtype).kind or \
+                        (numpy.dtype(dataType).kind != 'S' and numpy.dtype(dataType) != numpy.dtype(fileInfo.dtype)) or \
+                        dim != fileInfo.dtypeDim:
+                    return False
+        return True
+
+    def _constructOrigFileManifest(self, trackName):
+        return PreProcessUtils.constructOrigFileManifest(self._allOrigFns(trackName), \
+                                                         TrackInfo(self._genome, trackName).origFileManifest)
+
     def _calcAndStoreSubTrackCount(self, trackName):
         ti = TrackInfo(self._genome, trackName)
         trackCount = 0
@@ -8,17 +8,31 @@ from gtrackcore.metadata.GenomeInfo import GenomeInfo
 from gtrackcore.metadata.TrackInfo import TrackInfo
 from gtrackcore.preprocess.PreProcMetaDataCollector import PreProcMetaDataCollector
 from gtrackcore.input.core.GenomeElement import GenomeElement
+from gtrackcore.preprocess.memmap.ChrMemmapFolderMerger import ChrMemmapFolderMerger
 from gtrackcore.track.format.TrackFormat import TrackFormat
 from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve
-from gtrackcore.track.memmap.CommonMemmapFunctions import findEmptyVal
+from gtrackcore.track.memmap.CommonMemmapFunctions import createMemmapFileFn, findEmptyVal
+from gtrackcore.track.memmap.PackedSequenceArray import packSequenceFile
+from gtrackcore.track.memmap.SmartMemmapPool import SmartMemmapPool
 from gtrackcore.track.memmap.TrackSource import TrackSource
 from gtrackcore.util.CommonConstants import RESERVED_PREFIXES
-from gtrackcore.util.CommonFunctions import createDirPath
+from gtrackcore.util.CommonFunctions import createDirPath, computeFileFingerprint
 from gtrackcore.util.CustomExceptions import InvalidFormatError, ShouldNotOccurError
 
 class PreProcessUtils(object):
     @staticmethod
-    def shouldPreProcessGESource(trackName, geSource, allowOverlaps):
+    def shouldPreProcessGESource(trackName, geSource, allowOverlaps, origFileManifest=None):
+        return PreProcessUtils.getReasonForSkippingGESource(trackName, geSource, allowOverlaps, origFileManifest) is None
+    
+    @staticmethod
+    def getReasonForSkippingGESource(trackName, geSource, allowOverlaps, origFileManifest=None):
+        '''
+        Returns None if the geSource should be preprocessed, and otherwise
+        a short explanation of why it is skipped. origFileManifest holds the
+        current fingerprints of the original files of the track, if already
+        computed. Otherwise the fingerprint of the file of the geSource is
+        computed here.
+        '''
         genome = geSource.getGenome()
         storedInfo = TrackInfo(genome, trackName)
         
@@ -26,11 +40,29 @@ class PreProcessUtils(object):
             storedInfo.isValid()
         
         if not geSource.hasOrigFile():
-            return False if validFilesExist or geSource.isExternal() else True
+            if validFilesExist:
+                return 'preprocessed files exist'
+            elif geSource.isExternal():
+                return 'external source without original file'
+            else:
+                return None
+        
+        if not validFilesExist:
+            return None
         
-        storedAsAccordingToGeSource = \
-            (PreProcessUtils.constructId(geSource) == storedInfo.id and \
-             geSource.getVersion() == storedInfo.preProcVersion)
+        relFn = os.path.basename(geSource.getFileName())
+        prevFingerprint = (storedInfo.origFileManifest or {}).get(relFn)
+        
+        if storedInfo.origFileManifest is None and PreProcessUtils.constructLegacyId(geSource) == storedInfo.id:
+            # Preprocessed before the manifest was stored
+            storedId = True
+        else:
+            fileManifest = dict(storedInfo.origFileManifest or {})
+            fileManifest.update(origFileManifest or {})
+            if relFn not in (origFileManifest or {}):
+                fileManifest[relFn] = computeFileFingerprint(geSource.getFileName(), prevFingerprint)
+            storedId = PreProcessUtils.constructId(geSource, fileManifest) == storedInfo.id
+        storedAsAccordingToGeSource = storedId and geSource.getVersion() == storedInfo.preProcVersion
         
         #from gtrackcore.application.LogSetup import logMessage
         #logMessage(geSource.getGenome())
@@ -41,7 +73,12 @@ class PreProcessUtils(object):
         #                               PreProcessUtils.constructId(geSource) == storedInfo.id, \
         #                               geSource.getVersion() == storedInfo.preProcVersion))
         
-        return not (validFilesExist and storedAsAccordingToGeSource)
+        if not storedAsAccordingToGeSource:
+            return None
+        
+        if prevFingerprint is not None and fileManifest[relFn] != prevFingerprint:
+            return 'content unchanged since last preprocessing, only the modification time differs'
+        return 'unchanged since last preprocessing'
     
     @staticmethod
     def preProcFilesExist(genome, trackName, allowOverlaps):
@@ -79,12 +116,35 @@ class PreProcessUtils(object):
             not any(os.path.isdir(os.path.join(dirPath, subFn)) for subFn in os.listdir(dirPath))
     
     @staticmethod
-    def constructId(geSource):
+    def constructOrigFileManifest(fns, prevManifest=None):
+        if prevManifest is None:
+            prevManifest = {}
+        return dict((os.path.basename(fn), computeFileFingerprint(fn, prevManifest.get(os.path.basename(fn)))) \
+                    for fn in fns)
+    
+    @staticmethod
+    def origFileIsUnchanged(fingerprint, prevFingerprint):
+        # Touched files with unchanged content count as unchanged
+        return None not in [fingerprint, prevFingerprint] and \
+            tuple(fingerprint)[0::2] == tuple(prevFingerprint)[0::2]
+    
+    @staticmethod
+    def constructId(geSource, fileManifest=None):
         from gtrackcore.preprocess.PreProcessTracksJob import PreProcessTracksJob
         if geSource.hasOrigFile():
             origPath = os.path.dirname(geSource.getFileName()) if not geSource.isExternal() else geSource.getFileName()
             return TrackInfo.constructIdFromPath(geSource.getGenome(), origPath, \
-                                                 geSource.getVersion(), PreProcessTracksJob.VERSION)
+                                                 geSource.getVersion(), PreProcessTracksJob.VERSION, fileManifest)
+        else:
+            return geSource.getId()
+        
+    @staticmethod
+    def constructLegacyId(geSource):
+        from gtrackcore.preprocess.PreProcessTracksJob import PreProcessTracksJob
+        if geSource.hasOrigFile():
+            origPath = os.path.dirname(geSource.getFileName()) if not geSource.isExternal() else geSource.getFileName()
+            return TrackInfo.constructLegacyIdFromPath(geSource.getGenome(), origPath, \
+                                                       geSource.getVersion(), PreProcessTracksJob.VERSION)
         else:
             return geSource.getId()
         
@@ -100,6 +160,7 @@ class PreProcessUtils(object):
                     (dirPath, Config.PROCESSED_DATA_PATH)
                 if mode == 'Real':
                     print 'Removing outdated preprocessed data: ', dirPath
+                    SmartMemmapPool.invalidate(dirPath)
                     for fn in os.listdir(dirPath):
                         fullFn = os.path.join(dirPath, fn)
                         if os.path.isfile(fullFn):
@@ -132,6 +193,22 @@ class PreProcessUtils(object):
             raise ShouldNotOccurError("Error: The total element count for all bounding regions is not equal to the total number of genome elements. %s != %s" % \
                                       (brShelve.getTotalElementCount(), collector.getNumElements(allowOverlaps)) )
     
+    @staticmethod
+    def updatePreProcessedFilesIncrementally(genome, trackName, allowOverlaps, replaceChrs):
+        ChrMemmapFolderMerger.mergeIncrementally(genome, trackName, allowOverlaps, replaceChrs)
+        
+        collector = PreProcMetaDataCollector(genome, trackName)
+        trackFormat = collector.getTrackFormat()
+        trackData = TrackSource().getTrackData(trackName, genome, None, allowOverlaps)
+        
+        valCategories = set(numpy.unique(trackData['val'][:])) \
+                        if trackFormat.getValTypeName() == 'Category' else set()
+        edgeWeightCategories = set(numpy.unique(trackData['weights'][:][trackData['edges'][:] != ''])) \
+                               if trackFormat.getWeightTypeName() == 'Category' else set()
+        
+        numElements = BoundingRegionShelve(genome, trackName, allowOverlaps).getTotalElementCount()
+        collector.updateMetaDataFromMergedTrack(allowOverlaps, numElements, valCategories, edgeWeightCategories)
+    
     @staticmethod
     def removeChrMemmapFolders(genome, trackName, allowOverlaps):
         chrList = PreProcMetaDataCollector(genome, trackName).getPreProcessedChrs(allowOverlaps)
@@ -139,90 +216,131 @@ class PreProcessUtils(object):
             path = createDirPath(trackName, genome, chr, allowOverlaps)
             assert os.path.exists(path), 'Path does not exist: ' + path
             assert os.path.isdir(path), 'Path is not a directory: ' + path
+            SmartMemmapPool.invalidate(path)
             shutil.rmtree(path)
 
+    @staticmethod
+    def packSequenceFiles(genome, trackName, allowOverlaps):
+        collector = PreProcMetaDataCollector(genome, trackName)
+        if Config.SEQUENCE_STORAGE_FORMAT != '2bit' or not collector.getTrackFormat().reprIsDense() or \
+                collector.getValDataType() != 'S1' or collector.getValDim() != 1:
+            return
+
+        dirPath = createDirPath(trackName, genome, allowOverlaps=allowOverlaps)
+        valFn = createMemmapFileFn(dirPath, 'val', None, 1, 'S1')
+        if os.path.exists(valFn):
+            SmartMemmapPool.invalidate(valFn)
+            packSequenceFile(valFn, onlyIfSmaller=True)
+
+    @staticmethod
+    def _getEdgeArrays(genome, trackName, allowOverlaps):
+        # Returns the ids of all elements and the flattened (from, to, weight)
+        # arrays of all edges of the track. Weights are None if the track has
+        # no weights.
+        collector = PreProcMetaDataCollector(genome, trackName)
+        trackSource = TrackSource()
+        if BoundingRegionShelve(genome, trackName, allowOverlaps).fileExists():
+            trackDataList = [trackSource.getTrackData(trackName, genome, None, allowOverlaps)]
+        else:
+            trackDataList = [trackSource.getTrackData(trackName, genome, chr, allowOverlaps) \
+                             for chr in collector.getPreProcessedChrs(allowOverlaps)]
+        
+        idsList, fromIdsList, toIdsList, weightsList = [], [], [], []
+        for trackData in trackDataList:
+            ids = trackData['id'][:]
+            edges = trackData['edges'][:]
+            hasEdge = edges != ''
+            
+            idsList.append(ids)
+            fromIdsList.append(numpy.repeat(ids, hasEdge.sum(axis=1)))
+            toIdsList.append(edges[hasEdge])
+            if trackData.get('weights') is not None:
+                weightsList.append(trackData['weights'][:][hasEdge])
+        
+        if len(idsList) == 0:
+            return [numpy.array([], dtype='S')] * 3 + [None]
+        
+        return numpy.concatenate(idsList), numpy.concatenate(fromIdsList), numpy.concatenate(toIdsList), \
+               numpy.concatenate(weightsList) if len(weightsList) > 0 else None
+    
     @staticmethod
     def checkIfEdgeIdsExist(genome, trackName, allowOverlaps):
         collector = PreProcMetaDataCollector(genome, trackName)
         if not collector.getTrackFormat().isLinked():
             return
         
-        uniqueIds = numpy.array([], dtype='S')
-        uniqueEdgeIds = numpy.array([], dtype='S')
-        
-        for chr in collector.getPreProcessedChrs(allowOverlaps):
-            trackSource = TrackSource()
-            trackData = trackSource.getTrackData(trackName, genome, chr, allowOverlaps)
-            uniqueIds = numpy.unique(numpy.concatenate((uniqueIds, trackData['id'][:])))
-            uniqueEdgeIds = numpy.unique(numpy.concatenate((uniqueEdgeIds, trackData['edges'][:].flatten())))
+        ids, fromIds, toIds, weights = PreProcessUtils._getEdgeArrays(genome, trackName, allowOverlaps)
+        uniqueIds = numpy.unique(ids[ids != ''])
         
-        uniqueIds = uniqueIds[uniqueIds != '']
-        uniqueEdgeIds = uniqueEdgeIds[uniqueEdgeIds != '']
+        if len(uniqueIds) == 0:
+            unmatched = numpy.ones(len(toIds), dtype=bool)
+        else:
+            toIdIndexes = numpy.minimum(numpy.searchsorted(uniqueIds, toIds), len(uniqueIds) - 1)
+            unmatched = uniqueIds[toIdIndexes] != toIds
         
-        unmatchedIds = set(uniqueEdgeIds) - set(uniqueIds)
+        unmatchedIds = set(toIds[unmatched])
         if len(unmatchedIds) > 0:
             raise InvalidFormatError("Error: the following ids specified in the 'edges' column do not exist in the dataset: " + ', '.join(sorted(unmatchedIds)))
     
     @staticmethod
     def checkUndirectedEdges(genome, trackName, allowOverlaps):
+        # Each edge is given a canonical (lower id, higher id) key. After
+        # sorting on the key and the direction, an edge matches the next
+        # edge if it has the same key and the opposite direction. Errors are
+        # reported as if the edges were processed in the order of the file.
         collector = PreProcMetaDataCollector(genome, trackName)
         if not (collector.getTrackFormat().isLinked() and collector.hasUndirectedEdges()):
             return
         
-        complementEdgeWeightDict = {}
+        ids, fromIds, toIds, weights = PreProcessUtils._getEdgeArrays(genome, trackName, allowOverlaps)
         
-        for chr in collector.getPreProcessedChrs(allowOverlaps):
-            trackSource = TrackSource()
-            trackData = trackSource.getTrackData(trackName, genome, chr, allowOverlaps)
-            
-            ids = trackData['id']
-            edges = trackData['edges']
-            weights = trackData.get('weights')
-            
-            for i, id in enumerate(ids):
-                edgesAttr = edges[i][edges[i] != '']
-                weightsAttr = weights[i][edges[i] != ''] if weights is not None else None
-                PreProcessUtils._adjustComplementaryEdgeWeightDict(complementEdgeWeightDict, id, edgesAttr, weightsAttr)
-        
-        if len(complementEdgeWeightDict) != 0:
-                unmatchedPairs = []
-                for toId in complementEdgeWeightDict:
-                    for fromId in complementEdgeWeightDict[toId]:
-                        unmatchedPairs.append((fromId, toId, complementEdgeWeightDict[toId][fromId]))
-                raise InvalidFormatError("Error: All edges are not undirected. The following edges specifications " +\
-                                         "are not matched by an opposite edge with equal weight:" + os.linesep +\
-                                         os.linesep.join(["from '%s' to '%s'" % (fromId, toId) + \
-                                                          (" with weight '%s'" % weight  if weight != '' else '') \
-                                                          for fromId, toId, weight in unmatchedPairs]))
-        
-    @staticmethod
-    def _adjustComplementaryEdgeWeightDict(complementEdgeWeightDict, id, edges, weights):
-        for index, edgeId in enumerate(edges):
-            weight = weights[index] if weights is not None else ''
-                
-            if id in complementEdgeWeightDict and edgeId in complementEdgeWeightDict[id]:
-                complWeight = complementEdgeWeightDict[id][edgeId]
-                try:
-                    equal = numpy.all(complWeight == weight | numpy.isnan(complWeight) & numpy.isnan(weight))
-                except TypeError:
-                    try:
-                        equal = (complWeight == weight) or (numpy.isnan(complWeight) and numpy.isnan(weight))
-                    except (TypeError, ValueError):
-                        equal = numpy.all(complWeight == weight)
-                if not equal:
-                    raise InvalidFormatError("Error: edge ('%s' <-> '%s') is not undirected. The weight must be equal in both directions (%s != %s)" % (edgeId, id, complementEdgeWeightDict[id][edgeId], weights[index]))
-                
-                del complementEdgeWeightDict[id][edgeId]
-                if len(complementEdgeWeightDict[id]) == 0:
-                    del complementEdgeWeightDict[id]
-                        
-            elif id == edgeId:
-                continue
-                
-            elif edgeId in complementEdgeWeightDict:
-                if id in complementEdgeWeightDict[edgeId]:
-                    raise ShouldNotOccurError('Error: the complementary edge(%s) has already been added to complementEdgeWeightDict["%s"] ... ' % (id, edgeId))
-                complementEdgeWeightDict[edgeId][id] = weight
-            else:
-                complementEdgeWeightDict[edgeId] = {id: weight}
+        uniqueIds, codes = numpy.unique(numpy.concatenate((fromIds, toIds)), return_inverse=True)
+        fromCodes, toCodes = codes[:len(fromIds)], codes[len(fromIds):]
+        
+        edgeIndexes = numpy.flatnonzero(fromCodes != toCodes)
+        fromCodes, toCodes = fromCodes[edgeIndexes], toCodes[edgeIndexes]
+        isReversed = fromCodes > toCodes
+        lowCodes = numpy.minimum(fromCodes, toCodes)
+        highCodes = numpy.maximum(fromCodes, toCodes)
+        
+        order = numpy.lexsort((isReversed, highCodes, lowCodes))
+        lowCodes, highCodes, isReversed, edgeIndexes = \
+            lowCodes[order], highCodes[order], isReversed[order], edgeIndexes[order]
+        
+        isPairStart = (lowCodes[:-1] == lowCodes[1:]) & (highCodes[:-1] == highCodes[1:]) & \
+                      ~isReversed[:-1] & isReversed[1:]
+        firstIndexes = edgeIndexes[:-1][isPairStart]
+        secondIndexes = edgeIndexes[1:][isPairStart]
+        
+        if weights is not None and len(firstIndexes) > 0:
+            PreProcessUtils._checkEqualEdgeWeights(fromIds, toIds, weights, firstIndexes, secondIndexes)
+        
+        isMatched = numpy.zeros(len(edgeIndexes), dtype=bool)
+        isMatched[:-1] |= isPairStart
+        isMatched[1:] |= isPairStart
+        unmatchedIndexes = numpy.sort(edgeIndexes[~isMatched])
+        
+        if len(unmatchedIndexes) != 0:
+            raise InvalidFormatError("Error: All edges are not undirected. The following edges specifications " +\
+                                     "are not matched by an opposite edge with equal weight:" + os.linesep +\
+                                     os.linesep.join(["from '%s' to '%s'" % (fromIds[i], toIds[i]) + \
+                                                      (" with weight '%s'" % weights[i] if weights is not None else '') \
+                                                      for i in unmatchedIndexes]))
+    
+    @staticmethod
+    def _checkEqualEdgeWeights(fromIds, toIds, weights, firstIndexes, secondIndexes):
+        firstWeights, secondWeights = weights[firstIndexes], weights[secondIndexes]
+        isEqual = firstWeights == secondWeights
+        if weights.dtype.kind == 'f':
+            isEqual |= numpy.isnan(firstWeights) & numpy.isnan(secondWeights)
+        if isEqual.ndim > 1:
+            isEqual = isEqual.reshape(len(isEqual), -1).all(axis=1)
+        
+        if not isEqual.all():
+            # The first error is found when the last edge of the pair is read
+            lastIndexes = numpy.maximum(firstIndexes, secondIndexes)
+            pairIndex = numpy.flatnonzero(~isEqual)[numpy.argmin(lastIndexes[~isEqual])]
+            complIndex, index = sorted([firstIndexes[pairIndex], secondIndexes[pairIndex]])
+            raise InvalidFormatError("Error: edge ('%s' <-> '%s') is not undirected. The weight must be equal in both directions (%s != %s)" % \
+                                     (toIds[index], fromIds[index], weights[complIndex], weights[index]))
     
\ No newline at end of file
@@ -3,13 +3,23 @@ import numpy as np
 import shutil
 import sys
 
+from collections import OrderedDict
+
+from gtrackcore.input.core.GenomeElementSource import BoundingRegionTuple
+from gtrackcore.metadata.GenomeInfo import GenomeInfo
 from gtrackcore.preprocess.PreProcMetaDataCollector import PreProcMetaDataCollector
+from gtrackcore.preprocess.memmap.OutputIndexFilePair import OutputIndexFilePair
+from gtrackcore.track.core.GenomeRegion import GenomeRegion
+from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve
 from gtrackcore.track.memmap.CommonMemmapFunctions import createMemmapFileFn, parseMemmapFileFn, findEmptyVal
-from gtrackcore.track.memmap.TrackSource import TrackSource
-from gtrackcore.util.CommonFunctions import createDirPath
-from gtrackcore.util.CustomExceptions import EmptyGESourceError
+from gtrackcore.track.memmap.SmartMemmapPool import SmartMemmapPool
+from gtrackcore.track.memmap.TrackLayout import TrackLayout, MemmapFileInfo
+from gtrackcore.util.CommonFunctions import createDirPath, product
+from gtrackcore.util.CustomExceptions import EmptyGESourceError, InvalidFormatError
 
 class ChrMemmapFolderMerger(object):
+    COPY_CHUNK_SIZE = 1024 * 1024
+    
     @staticmethod
     def _commonAppendDimension(origArray, delta, val, allowedDims, dimIdx, stackMethod):
         origShape = list(origArray.shape)
@@ -76,30 +86,235 @@ class ChrMemmapFolderMerger(object):
         if len(existingChrList) == 0:
             raise EmptyGESourceError('No data lines has been read from source file (probably because it is empty).')
             
-        firstChrTrackData = TrackSource().getTrackData(trackName, genome, existingChrList[0], allowOverlaps, forceChrFolders=True)
-        arrayList = firstChrTrackData.keys()
-        for arrayName in arrayList:
-            mergedArray = firstChrTrackData[arrayName][:]
-            elementDim, dtypeDim = parseMemmapFileFn(firstChrTrackData[arrayName].filename)[1:3]
-            del firstChrTrackData[arrayName]
+        TrackLayout.clearCache()
+        layouts = [TrackLayout.getLayout(trackName, genome, chr, allowOverlaps, forceChrFolders=True) \
+                   for chr in existingChrList]
+        
+        for arrayName in layouts[0].fileInfos:
+            fileInfos = [layout.fileInfos[arrayName] for layout in layouts]
+            ChrMemmapFolderMerger._mergeFiles(path, arrayName, fileInfos)
+        TrackLayout.clearCache()
+    
+    @staticmethod
+    def _getMergedFileInfo(path, arrayName, fileInfos, numRows):
+        # The shape and data type of the merged array, from the file names
+        # and sizes only
+        assert len(set(len(fileInfo.shape) for fileInfo in fileInfos)) == 1
+        assert len(set(np.dtype(fileInfo.dtype).type for fileInfo in fileInfos)) == 1
+        
+        trailingShape = tuple(max(dims) for dims in zip(*[fileInfo.shape[1:] for fileInfo in fileInfos]))
+        dtype = reduce(np.promote_types, [np.dtype(fileInfo.dtype) for fileInfo in fileInfos])
+        elementDim = max(fileInfo.elementDim for fileInfo in fileInfos)
+        dtypeDim = max(fileInfo.dtypeDim for fileInfo in fileInfos)
+        
+        mergedFn = createMemmapFileFn(path, arrayName, elementDim, dtypeDim, str(dtype))
+        return MemmapFileInfo(mergedFn, elementDim, dtypeDim, str(dtype), (numRows,) + trailingShape)
+    
+    @staticmethod
+    def _copyRows(target, array):
+        # Trailing dimensions are padded with the empty value
+        if array.shape[1:] != target.shape[1:]:
+            target[:] = findEmptyVal(str(target.dtype))
+            target = target[(slice(None),) + tuple(slice(0, dim) for dim in array.shape[1:])]
+        target[:] = array
+    
+    @staticmethod
+    def _openFile(fileInfo, mode='r'):
+        return np.memmap(fileInfo.fn, dtype=fileInfo.dtype, mode=mode, shape=fileInfo.shape)
+    
+    @staticmethod
+    def _copyFiles(mergedArray, offset, fileInfos):
+        # Each file is copied into its slice of the merged array
+        for fileInfo in fileInfos:
+            numChrRows = fileInfo.shape[0]
+            if numChrRows == 0:
+                continue
             
-            for chr in existingChrList[1:]:
-                chrTrackData = TrackSource().getTrackData(trackName, genome, chr, allowOverlaps, forceChrFolders=True)
+            chrArray = ChrMemmapFolderMerger._openFile(fileInfo)
+            ChrMemmapFolderMerger._copyRows(mergedArray[offset:offset+numChrRows], chrArray)
+            offset += numChrRows
+            del chrArray
+        return offset
+    
+    @staticmethod
+    def _mergeFiles(path, arrayName, fileInfos):
+        mergedInfo = ChrMemmapFolderMerger._getMergedFileInfo\
+            (path, arrayName, fileInfos, sum(fileInfo.shape[0] for fileInfo in fileInfos))
+        if mergedInfo.shape[0] == 0:
+            open(mergedInfo.fn, 'wb').close()
+            return
+        
+        mergedArray = ChrMemmapFolderMerger._openFile(mergedInfo, mode='w+')
+        ChrMemmapFolderMerger._copyFiles(mergedArray, 0, fileInfos)
+        mergedArray.flush()
+        del mergedArray
+    
+    @staticmethod
+    def mergeIncrementally(genome, trackName, allowOverlaps, replaceChrs):
+        '''
+        Updates the merged files of a preprocessed track with the chromosome
+        folders of new data. The rows and index bins of the chromosomes that
+        are not affected are kept in place, but moved to fill the space of
+        the affected chromosomes, which are written after them. If
+        replaceChrs is False, the existing elements of the affected
+        chromosomes are combined with the new elements.
+        '''
+        path = createDirPath(trackName, genome, allowOverlaps=allowOverlaps)
+        collector = PreProcMetaDataCollector(genome, trackName)
+        assert not collector.getTrackFormat().reprIsDense()
+        
+        SmartMemmapPool.invalidate(path)
+        TrackLayout.clearCache()
+        
+        brShelve = BoundingRegionShelve(genome, trackName, allowOverlaps)
+        brInfosPerChr = brShelve.getBoundingRegionInfosPerChr()
+        mergedLayout = TrackLayout.getLayout(trackName, genome, None, allowOverlaps)
+        
+        chrList = sorted(ChrMemmapFolderMerger._existingChrIter(path, collector.getPreProcessedChrs(allowOverlaps)))
+        keptChrs = sorted([chr for chr in brInfosPerChr if chr not in chrList], \
+                          key=lambda chr: (brInfosPerChr[chr][0].startIdx, brInfosPerChr[chr][0].startBinIdx))
+        keptDataChrs = [chr for chr in keptChrs if brInfosPerChr[chr][0].endBinIdx > brInfosPerChr[chr][0].startBinIdx]
+        
+        for chr in chrList:
+            if not replaceChrs and chr in brInfosPerChr:
+                ChrMemmapFolderMerger._combineWithExistingElements\
+                    (TrackLayout.getLayout(trackName, genome, chr, allowOverlaps, forceChrFolders=True), \
+                     mergedLayout, brInfosPerChr[chr][0], GenomeInfo.getChrLen(genome, chr), allowOverlaps)
+        
+        TrackLayout.clearCache()
+        chrLayouts = [TrackLayout.getLayout(trackName, genome, chr, allowOverlaps, forceChrFolders=True) \
+                      for chr in chrList]
+        
+        for arrayName, mergedFileInfo in mergedLayout.fileInfos.iteritems():
+            isIndex = arrayName in ['leftIndex', 'rightIndex']
+            keptRanges = [(brInfosPerChr[chr][0].startBinIdx, brInfosPerChr[chr][0].endBinIdx) if isIndex else \
+                          (brInfosPerChr[chr][0].startIdx, brInfosPerChr[chr][0].endIdx) for chr in keptDataChrs]
+            ChrMemmapFolderMerger._updateMergedFile(path, arrayName, mergedFileInfo, keptRanges, \
+                                                    [layout.fileInfos[arrayName] for layout in chrLayouts])
+        
+        # The bounding regions are stored in the same order as the rows
+        numElsPerChr = dict((chr, brInfosPerChr[chr][0].endIdx - brInfosPerChr[chr][0].startIdx) for chr in keptDataChrs)
+        numElsPerChr.update((chr, ChrMemmapFolderMerger._getNumRows(layout)) for chr, layout in zip(chrList, chrLayouts))
+        
+        regionsPerChr = OrderedDict()
+        for chr in keptChrs + chrList:
+            regionsPerChr[chr] = [GenomeRegion(genome, chr, brInfo.start, brInfo.end) for brInfo in brInfosPerChr.get(chr, [])] \
+                                 if not (replaceChrs and chr in chrList) else []
+        for br in collector.getBoundingRegionTuples(allowOverlaps):
+            regions = regionsPerChr.setdefault(br.region.chr, [])
+            if br.region not in regions:
+                regions.append(br.region)
+        
+        brTuples = []
+        for chr, regions in regionsPerChr.iteritems():
+            for i, region in enumerate(sorted(regions)):
+                brTuples.append(BoundingRegionTuple(region, numElsPerChr.get(chr, 0) if i == 0 else 0))
+        
+        brShelve.storeBoundingRegions(brTuples, keptDataChrs + chrList, sparse=True)
+        TrackLayout.clearCache()
+    
+    @staticmethod
+    def _getNumRows(layout):
+        return [fileInfo.shape[0] for arrayName, fileInfo in layout.fileInfos.iteritems() \
+                if arrayName not in ['leftIndex', 'rightIndex']][0]
+    
+    @staticmethod
+    def _combineWithExistingElements(chrLayout, mergedLayout, brInfo, chrLen, allowOverlaps):
+        # Rewrites the chromosome folder with both the existing and the new
+        # elements of the chromosome, sorted as in the preprocessing
+        arrays = OrderedDict()
+        for arrayName, fileInfo in chrLayout.fileInfos.iteritems():
+            if arrayName in ['leftIndex', 'rightIndex']:
+                continue
             
-                mergedArray = ChrMemmapFolderMerger.mergeArrays(mergedArray, np.array(chrTrackData[arrayName][:]))
-                elementDimNew, dtypeDimNew = parseMemmapFileFn(chrTrackData[arrayName].filename)[1:3]
-                elementDim = max(elementDim, elementDimNew)
-                dtypeDim = max(dtypeDim, dtypeDimNew)
-                
-                del chrTrackData[arrayName]
+            mergedFileInfo = mergedLayout.fileInfos[arrayName]
+            oldArray = np.array(ChrMemmapFolderMerger._openFile(mergedFileInfo)[brInfo.startIdx:brInfo.endIdx]) \
+                       if mergedFileInfo.shape[0] > 0 else np.zeros((0,) + mergedFileInfo.shape[1:], dtype=mergedFileInfo.dtype)
+            newArray = np.array(ChrMemmapFolderMerger._openFile(fileInfo))
+            arrays[arrayName] = ChrMemmapFolderMerger.mergeArrays(oldArray, newArray)
+        
+        starts, ends = arrays.get('start'), arrays.get('end')
+        if starts is not None and ends is not None:
+            sortOrder = np.lexsort((ends, starts))
+        else:
+            sortOrder = (starts if starts is not None else ends).argsort(kind='mergesort')
+        
+        for arrayName in arrays:
+            arrays[arrayName] = arrays[arrayName][sortOrder]
+        starts, ends = arrays.get('start'), arrays.get('end')
+        
+        if not allowOverlaps and ChrMemmapFolderMerger._hasOverlappingElements(starts, ends):
+            raise InvalidFormatError('Error: the new elements of chromosome %s overlap the existing elements ' % \
+                                     chrLayout.chr + 'of a track without overlapping elements.')
+        
+        for fileInfo in chrLayout.fileInfos.values():
+            os.unlink(fileInfo.fn)
+        
+        for arrayName, array in arrays.iteritems():
+            fileInfo = chrLayout.fileInfos[arrayName]
+            elementDim = array.shape[1] if fileInfo.elementDim is not None else None
+            array.tofile(createMemmapFileFn(chrLayout.dirPath, arrayName, elementDim, fileInfo.dtypeDim, str(array.dtype)))
+        
+        for arrayName, indexes in zip(['leftIndex', 'rightIndex'], OutputIndexFilePair.calcIndexes(chrLen, starts, ends)):
+            indexes.astype('int32').tofile(createMemmapFileFn(chrLayout.dirPath, arrayName, None, 1, 'int32'))
+    
+    @staticmethod
+    def _hasOverlappingElements(starts, ends):
+        # The elements are sorted, so any overlap includes two consecutive elements
+        if starts is None or len(starts) < 2:
+            return False
+        if ends is None:
+            return (starts[1:] == starts[:-1]).any()
+        return (starts[1:] < ends[:-1]).any()
+    
+    @staticmethod
+    def _updateMergedFile(path, arrayName, mergedFileInfo, keptRanges, fileInfos):
+        numKeptRows = sum(end - start for start, end in keptRanges)
+        newInfo = ChrMemmapFolderMerger._getMergedFileInfo\
+            (path, arrayName, [mergedFileInfo] + fileInfos, numKeptRows + sum(fileInfo.shape[0] for fileInfo in fileInfos))
+        
+        if newInfo.fn == mergedFileInfo.fn:
+            # The kept rows are moved towards the start of the file in chunks,
+            # each read before it is written to
+            if numKeptRows > 0:
+                mergedArray = ChrMemmapFolderMerger._openFile(mergedFileInfo, mode='r+')
+                offset = 0
+                for start, end in keptRanges:
+                    if start != offset:
+                        for chunkStart in xrange(start, end, ChrMemmapFolderMerger.COPY_CHUNK_SIZE):
+                            chunkEnd = min(end, chunkStart + ChrMemmapFolderMerger.COPY_CHUNK_SIZE)
+                            mergedArray[offset + chunkStart - start:offset + chunkEnd - start] = \
+                                np.array(mergedArray[chunkStart:chunkEnd])
+                    offset += end - start
+                mergedArray.flush()
+                del mergedArray
             
-            mergedFn = createMemmapFileFn(path, arrayName, elementDim, dtypeDim, str(mergedArray.dtype))
+            with open(newInfo.fn, 'r+b') as f:
+                f.truncate(product(newInfo.shape) * np.dtype(newInfo.dtype).itemsize)
             
-            f = np.memmap(mergedFn, dtype=mergedArray.dtype, mode='w+', shape=mergedArray.shape)
-            f[:] = mergedArray
-            f.flush()
-            del f
-            del mergedArray
+            if newInfo.shape[0] > numKeptRows:
+                mergedArray = ChrMemmapFolderMerger._openFile(newInfo, mode='r+')
+                ChrMemmapFolderMerger._copyFiles(mergedArray, numKeptRows, fileInfos)
+                mergedArray.flush()
+                del mergedArray
+        else:
+            # The data type or trailing dimensions have grown, and all rows
+            # are copied to a new file
+            if newInfo.shape[0] == 0:
+                open(newInfo.fn, 'wb').close()
+            else:
+                mergedArray = ChrMemmapFolderMerger._openFile(newInfo, mode='w+')
+                if numKeptRows > 0:
+                    oldArray = ChrMemmapFolderMerger._openFile(mergedFileInfo)
+                    offset = 0
+                    for start, end in keptRanges:
+                        ChrMemmapFolderMerger._copyRows(mergedArray[offset:offset + end - start], oldArray[start:end])
+                        offset += end - start
+                    del oldArray
+                ChrMemmapFolderMerger._copyFiles(mergedArray, numKeptRows, fileInfos)
+                mergedArray.flush()
+                del mergedArray
+            os.unlink(mergedFileInfo.fn)
                     
 if __name__ == "__main__":
     if not len(sys.argv) == 4:
@@ -31,6 +31,9 @@ class OutputDirectory(object):
         for f in self._files.values():
             f.writeRawSlice(genomeElement)
     
+    def writeColumn(self, prefix, array):
+        self._files[prefix].writeArray(array)
+    
     def _sortFiles(self):
         startFile = self._files.get('start')
         endFile = self._files.get('end')
@@ -6,10 +6,13 @@ from stat import S_IRWXU, S_IRWXG, S_IROTH
 from gtrackcore.preprocess.memmap.GEParseFunctions import getStart, getEnd, getStrand, getVal, getId, getEdges, \
                                                       getWeights, getNone, GetExtra, \
                                                       writeNoSlice, writeSliceFromFront
+from gtrackcore.core.Config import Config
 from gtrackcore.track.memmap.CommonMemmapFunctions import createMemmapFileFn, findEmptyVal, calcShapeFromMemmapFileFn
 from gtrackcore.util.CommonFunctions import product
 from gtrackcore.util.CustomExceptions import ShouldNotOccurError, InvalidFormatError
 
+OUTPUT_FILE_CHUNK_SIZE = Config.OUTPUT_FILE_CHUNK_SIZE
+
 class OutputFile(object):
     def _setup(self, prefix, thisPrefix, parseFunc, writeFunc, elementDim, dataType, dataTypeDim, setEmptyVal):
         if prefix == thisPrefix:
@@ -20,7 +23,7 @@ class OutputFile(object):
             self._dataTypeDim = dataTypeDim
             self._setEmptyVal = setEmptyVal
     
-    def __init__(self, path, prefix, size, valDataType='float64', valDim=1, weightDataType='float64', weightDim=1, maxNumEdges=0, maxStrLens={}, allowAppend=True):
+    def __init__(self, path, prefix, size, valDataType='float64', valDim=1, weightDataType='float64', weightDim=1, maxNumEdges=0, maxStrLens={}, allowAppend=True, chunkSize=None):
         assert valDim >= 1 and weightDim >= 1
 
         if valDataType == 'S':
@@ -68,41 +71,96 @@ class OutputFile(object):
                 raise InvalidFormatError('Error: different genome element sources (e.g. different input files) tries to write to index file for the same chromosome (%s). This is probably caused by different files in the same folder containing elements from the same chromosome.' % self._fn)
             
             try:
-                f = np.memmap( self._fn, dtype=self._dataType, mode='r+' )
-                self._index = len(f) / product(shape[1:])
-                del f
-
                 existingShape = calcShapeFromMemmapFileFn(self._fn)
-                self._contents = np.array( np.memmap(self._fn, dtype=self._dataType, mode='r+', shape=tuple(existingShape)) )
-                self._contents = np.r_[self._contents, np.zeros( dtype=self._dataType, shape=tuple(shape) )]
+                self._index = existingShape[0]
+                shape[0] += self._index
+                
+                # Grows the file in place. Only the new tail is written to.
+                with open(self._fn, 'r+b') as f:
+                    f.truncate(self._calcNumBytes(shape))
             except Exception:
                 print 'Error when opening file: ', self._fn
                 raise
+        
+        if product(shape) > 0:
+            self._contents = np.memmap(self._fn, dtype=self._dataType, mode='r+' if append else 'w+', shape=tuple(shape))
         else:
-            self._contents = np.zeros( dtype=self._dataType, shape=tuple(shape) )
-            
-        if not append and self._setEmptyVal:
-            self._contents[:] = findEmptyVal(self._dataType)
+            # Empty files cannot be memory-mapped
+            open(self._fn, 'ab').close()
+            self._contents = np.zeros(dtype=self._dataType, shape=tuple(shape))
+        
+        self._fillVal = findEmptyVal(self._dataType) if not append and self._setEmptyVal else None
         
+        if self._fillVal is not None:
+            self._contents[:] = self._fillVal
+        
+        self._chunkSize = chunkSize if chunkSize is not None else OUTPUT_FILE_CHUNK_SIZE
+        if self._chunkSize > 0:
+            self._chunk = self._createChunk()
+            self._chunkStart = self._index
+        else:
+            self._chunk = None
+        
+    def _calcNumBytes(self, shape):
+        return product(shape) * np.dtype(self._dataType).itemsize
+    
+    def _createChunk(self):
+        chunk = np.zeros(dtype=self._dataType, shape=(self._chunkSize,) + self._contents.shape[1:])
+        if self._fillVal is not None:
+            chunk[:] = self._fillVal
+        return chunk
+    
+    def _flushChunk(self):
+        # Writes the buffered elements to the file through a file handle, so
+        # that the pages of the memmap are not touched while streaming.
+        if self._chunk is None or self._index == self._chunkStart:
+            return
+        
+        numElements = self._index - self._chunkStart
+        with open(self._fn, 'r+b') as f:
+            f.seek(self._calcNumBytes((self._chunkStart,) + self._contents.shape[1:]))
+            self._chunk[:numElements].tofile(f)
+        
+        self._chunk[:numElements] = self._fillVal if self._fillVal is not None else 0
+        self._chunkStart = self._index
+    
+    def _getWriteTarget(self):
+        # Returns the array to write the next element to, and its index there
+        if self._chunk is None:
+            return self._contents, self._index
+        
+        if self._index - self._chunkStart == self._chunkSize:
+            self._flushChunk()
+        return self._chunk, self._index - self._chunkStart
+    
     def __len__(self):
         return len(self._contents)
     
     def close(self):
-        memmapFile = np.memmap(self._fn, dtype=self._dataType, mode='w+', shape=self._contents.shape)
-        memmapFile[:] = self._contents
-        memmapFile.flush()
+        self._flushChunk()
+        if isinstance(self._contents, np.memmap):
+            self._contents.flush()
         os.chmod(self._fn, S_IRWXU|S_IRWXG|S_IROTH)
         
         self._contents = None
+        self._chunk = None
 
     def writeElement(self, genomeElement):
-        self._writeFunc(self._contents, self._index, genomeElement, self._parseFunc)
+        target, index = self._getWriteTarget()
+        self._writeFunc(target, index, genomeElement, self._parseFunc)
         self._index += 1
 
     def write(self, value):
-        self._contents[self._index] = value
+        target, index = self._getWriteTarget()
+        target[index] = value
         self._index += 1
         
+    def writeArray(self, array):
+        self._flushChunk()
+        self._contents[self._index:self._index+len(array)] = array
+        self._index += len(array)
+        self._chunkStart = self._index
+        
     def writeRawSlice(self, genomeElement):
         "Only works correctly for some files"
         assert self._writeFunc == writeNoSlice
@@ -111,16 +169,15 @@ class OutputFile(object):
         assert slice.dtype == np.dtype(self._dataType), \
             'Datatypes do not match: %s != %s' % (str(slice.dtype), self._dataType)
         
-        self._contents[self._index:self._index+len(slice)] = slice
-        self._index += len(slice)
+        self.writeArray(slice)
         
     def sort(self, sortOrder=None):
+        self._flushChunk()
         if sortOrder is None:
             sortOrder = self._contents.argsort()
-            self._contents = self._contents[sortOrder]
-            return sortOrder
-        else:
-            self._contents = self._contents[sortOrder]
+        self._contents[:] = self._contents[sortOrder]
+        return sortOrder
         
     def getContents(self):
+        self._flushChunk()
         return self._contents
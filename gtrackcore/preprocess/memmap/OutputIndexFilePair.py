@@ -16,38 +16,47 @@ class OutputIndexFilePair(object):
         self._leftIndexFile = OutputFile(self._path, 'leftIndex', numIndexElements, allowAppend=False)
         self._rightIndexFile = OutputFile(self._path, 'rightIndex', numIndexElements, allowAppend=False)
         
-        if self._startFile:
-            lefts = self._startFile.getContents()
+        leftIndexes, rightIndexes = OutputIndexFilePair.calcIndexes\
+            (self._chrSize, self._startFile.getContents() if self._startFile is not None else None, \
+             self._endFile.getContents() if self._endFile is not None else None)
+        
+        self._leftIndexFile.writeArray(leftIndexes)
+        self._rightIndexFile.writeArray(rightIndexes)
+        
+    @staticmethod
+    def calcIndexes(chrSize, starts, ends):
+        numIndexElements = int(math.ceil(1.0 * chrSize / CompBinManager.getIndexBinSize()))
+        
+        if starts is not None:
+            lefts = starts
         else:
-            lefts = np.r_[0, self._endFile.getContents()[:-1]]
+            lefts = np.r_[0, ends[:-1]]
         
-        if self._endFile:
-            rights = self._endFile.getContents()
-            if not self._startFile:
+        if ends is not None:
+            rights = ends
+            if starts is None:
                 rights = rights[1:]
         else:
-            rights = self._startFile.getContents() + 1
+            rights = starts + 1
             
-        bin_i = 0
-        i = 0
-        for i, right in enumerate(rights):
-            while right > (bin_i) * CompBinManager.getIndexBinSize():
-                self._leftIndexFile.write(i)
-                bin_i += 1
-
-        bin_j = 0
-        j = 0
-        for j, left in enumerate(lefts):
-            while left >= (bin_j+1) * CompBinManager.getIndexBinSize():
-                self._rightIndexFile.write(j)
-                bin_j += 1
-                
-        self._fillRestOfIndexFile(bin_i, i+1, self._leftIndexFile)
-        self._fillRestOfIndexFile(bin_j, j+1, self._rightIndexFile)
-        
-    def _fillRestOfIndexFile(self, numFilled, fillValue, indexFile):
-        for i in xrange( len(indexFile) - numFilled ):
-            indexFile.write(fillValue)
+        indexBinSize = CompBinManager.getIndexBinSize()
+        
+        # Number of index bins that start before each right position and that
+        # end before (or at) each left position. As the leftIndex/rightIndex
+        # for a bin is the first element that covers/passes the bin, running
+        # maxima of these counts can be searched directly for each bin.
+        numBinsBeforeRights = np.maximum(0, -(-np.asarray(rights, dtype='int64') // indexBinSize))
+        numBinsBeforeLefts = np.maximum(0, np.asarray(lefts, dtype='int64') // indexBinSize)
+        
+        return OutputIndexFilePair._calcIndexes(numBinsBeforeRights, numIndexElements), \
+               OutputIndexFilePair._calcIndexes(numBinsBeforeLefts, numIndexElements)
+        
+    @staticmethod
+    def _calcIndexes(numBinsPerElement, numIndexElements):
+        if len(numBinsPerElement) == 0:
+            return np.ones(numIndexElements, dtype='int32')
+        
+        return np.maximum.accumulate(numBinsPerElement).searchsorted(np.arange(numIndexElements), side='right')
     
     def close(self):
         self._leftIndexFile.close()
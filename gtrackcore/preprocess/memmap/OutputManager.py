@@ -5,13 +5,16 @@ from gtrackcore.util.CustomExceptions import AbstractClassError
 from gtrackcore.util.CommonFunctions import createDirPath
 
 class OutputManager(object):
-    def __new__(cls, genome, trackName, allowOverlaps, geSourceManager):
-        if len(geSourceManager.getAllChrs()) == 1:
+    def __new__(cls, genome, trackName, allowOverlaps, geSourceManager, chrList=None):
+        if chrList is None:
+            chrList = geSourceManager.getAllChrs()
+        
+        if len(chrList) == 1:
             return OutputManagerSingleChr.__new__(OutputManagerSingleChr, genome, trackName, \
-                                                  allowOverlaps, geSourceManager)
+                                                  allowOverlaps, geSourceManager, chrList)
         else:
             return OutputManagerSeveralChrs.__new__(OutputManagerSeveralChrs, genome, trackName, \
-                                                    allowOverlaps, geSourceManager)
+                                                    allowOverlaps, geSourceManager, chrList)
 
     def _createOutputDirectory(self, genome, chr, trackName, allowOverlaps, geSourceManager):
         dirPath = createDirPath(trackName, genome, chr, allowOverlaps)
@@ -33,6 +36,9 @@ class OutputManager(object):
     def writeRawSlice(self, genomeElement):
         raise AbstractClassError()
         
+    def writeColumn(self, chr, prefix, array):
+        raise AbstractClassError()
+        
     def close(self):
         raise AbstractClassError()
 
@@ -41,8 +47,8 @@ class OutputManagerSingleChr(OutputManager):
     def __new__(cls, *args, **kwArgs):
         return object.__new__(cls)
     
-    def __init__(self, genome, trackName, allowOverlaps, geSourceManager):
-        allChrs = geSourceManager.getAllChrs()
+    def __init__(self, genome, trackName, allowOverlaps, geSourceManager, chrList=None):
+        allChrs = chrList if chrList is not None else geSourceManager.getAllChrs()
         assert len(allChrs) == 1
         
         self._outputDir = self._createOutputDirectory\
@@ -53,6 +59,9 @@ class OutputManagerSingleChr(OutputManager):
         
     def writeRawSlice(self, genomeElement):
         self._outputDir.writeRawSlice(genomeElement)
+        
+    def writeColumn(self, chr, prefix, array):
+        self._outputDir.writeColumn(prefix, array)
             
     def close(self):
         self._outputDir.close()
@@ -62,8 +71,8 @@ class OutputManagerSeveralChrs(OutputManager):
     def __new__(cls, *args, **kwArgs):
         return object.__new__(cls)
     
-    def __init__(self, genome, trackName, allowOverlaps, geSourceManager):
-        allChrs = geSourceManager.getAllChrs()
+    def __init__(self, genome, trackName, allowOverlaps, geSourceManager, chrList=None):
+        allChrs = chrList if chrList is not None else geSourceManager.getAllChrs()
 
         self._outputDirs = OrderedDict()
         for chr in allChrs:
@@ -75,6 +84,9 @@ class OutputManagerSeveralChrs(OutputManager):
         
     def writeRawSlice(self, genomeElement):
         self._outputDirs[genomeElement.chr].writeRawSlice(genomeElement)
+        
+    def writeColumn(self, chr, prefix, array):
+        self._outputDirs[chr].writeColumn(prefix, array)
             
     def close(self):
         for dir in self._outputDirs.values():
@@ -61,6 +61,42 @@ class TestGtrackSorter(TestWithGeSourceData, TestCaseWithImprovedAsserts):
             
             self.assertEquals(sorted(case.boundingRegionsAssertList), [br for br in sortedGeSource.getBoundingRegionTuples()])
             
+    def _getSortedDataLines(self, lines):
+        with NamedTemporaryFile(suffix='.gtrack') as testFile:
+            testFile.write('\n'.join(lines) + '\n')
+            testFile.flush()
+            sortedContents = sortGtrackFileAndReturnContents(testFile.name, self.GENOME)
+        return [line for line in sortedContents.splitlines() if line and not line.startswith('#')]
+    
+    def testDenseTrackOrdering(self):
+        # As before the external sorter: step functions are sorted by end,
+        # while the values of functions keep their order
+        self.assertEquals(['40\t1.0', '100\t2.0'], self._getSortedDataLines( \
+            ['##track type: step function', '###end\tvalue', \
+             '####genome=TestGenome; seqid=chrM; start=0; end=100', '100\t2', '40\t1']))
+        self.assertEquals(['3.0', '1.0', '2.0'], self._getSortedDataLines( \
+            ['##track type: function', '###value', \
+             '####genome=TestGenome; seqid=chrM; start=0; end=3', '3', '1', '2']))
+
+    def testSortingParsesOnce(self):
+        parsedLines = []
+        origNext = UnsortedGtrackGenomeElementSource._next
+        def countingNext(geSource, line):
+            parsedLines.append(line)
+            return origNext(geSource, line)
+
+        lines = ['##track type: segments', '###seqid\tstart\tend', \
+                 '####genome=TestGenome; seqid=chrM; start=50; end=100', 'chrM\t70\t80', 'chrM\t60\t65', \
+                 '####genome=TestGenome; seqid=chrM; start=0; end=50', 'chrM\t20\t30', 'chrM\t10\t15']
+        UnsortedGtrackGenomeElementSource._next = countingNext
+        try:
+            sortedLines = self._getSortedDataLines(lines)
+        finally:
+            UnsortedGtrackGenomeElementSource._next = origNext
+
+        self.assertEquals(['10\t15', '20\t30', '60\t65', '70\t80'], sortedLines)
+        self.assertEquals(1, parsedLines.count('chrM\t10\t15'))
+            
     def runTest(self):
         pass
     
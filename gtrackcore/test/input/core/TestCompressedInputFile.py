@@ -0,0 +1,144 @@
+import unittest
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+
+import gtrackcore.input.core.CompressedInputFile
+from gtrackcore.core.Config import Config
+from gtrackcore.input.core.CompressedInputFile import openInputFile, isGzipFile, isBgzfFile, \
+                                                     GzipInputFile, BgzfInputFile
+from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
+from gtrackcore.input.fileformats.BedGenomeElementSource import BedGenomeElementSource
+from gtrackcore.util.CommonFunctions import getFileSuffix
+from gtrackcore.util.CustomExceptions import InvalidFormatError
+
+def writeBgzfFile(fn, text, blockNumBytes):
+    with open(fn, 'wb') as file:
+        for i in range(0, len(text), blockNumBytes) + [len(text)]:
+            blockText = text[i:i+blockNumBytes]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            data = compressor.compress(blockText) + compressor.flush()
+            file.write(struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, ord('B'), ord('C'), 2, \
+                                   len(data) + 25))
+            file.write(data)
+            file.write(struct.pack('<Ii', zlib.crc32(blockText) & 0xffffffff, len(blockText)))
+
+class TestCompressedInputFile(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._prevBatchNumBlocks = gtrackcore.input.core.CompressedInputFile.BGZF_BATCH_NUM_BLOCKS
+        gtrackcore.input.core.CompressedInputFile.BGZF_BATCH_NUM_BLOCKS = 3
+        self._prevNumThreads = Config.DECOMPRESSION_NUM_THREADS
+        self._text = ''.join('chr21\t%d\t%d\n' % (i, i+5) for i in range(0, 5000, 10))
+
+    def tearDown(self):
+        gtrackcore.input.core.CompressedInputFile.BGZF_BATCH_NUM_BLOCKS = self._prevBatchNumBlocks
+        Config.DECOMPRESSION_NUM_THREADS = self._prevNumThreads
+        shutil.rmtree(self._dir)
+
+    def _writeGzipFile(self, text, relFn='test.bed.gz'):
+        fn = os.path.join(self._dir, relFn)
+        with gzip.open(fn, 'wb') as file:
+            file.write(text)
+        return fn
+
+    def _writeBgzfFile(self, text, relFn='test.bed.gz'):
+        fn = os.path.join(self._dir, relFn)
+        writeBgzfFile(fn, text, 100)
+        return fn
+
+    def _assertReadsAs(self, text, fn, cls):
+        file = openInputFile(fn)
+        self.assertTrue(isinstance(file, cls))
+        self.assertEqual(text.splitlines(True), list(file))
+
+        file = openInputFile(fn)
+        self.assertEqual(text[:7], file.read(7))
+        self.assertEqual(text[7:].splitlines(True)[0], file.readline())
+        file.close()
+
+        file = openInputFile(fn)
+        parts = []
+        while True:
+            part = file.read(123) + file.readline()
+            if part == '':
+                break
+            parts.append(part)
+        self.assertEqual(text, ''.join(parts))
+        self.assertEqual('', file.read())
+        file.close()
+
+    def testGzip(self):
+        fn = self._writeGzipFile(self._text)
+        self.assertTrue(isGzipFile(fn))
+        self.assertFalse(isBgzfFile(fn))
+        self._assertReadsAs(self._text, fn, GzipInputFile)
+
+        fn = self._writeGzipFile('')
+        self.assertEqual('', openInputFile(fn).read())
+
+    def testConcatenatedGzipMembers(self):
+        fn = self._writeGzipFile(self._text[:1000])
+        with open(fn, 'ab') as file:
+            file.write(open(self._writeGzipFile(self._text[1000:], 'second.gz'), 'rb').read())
+        self._assertReadsAs(self._text, fn, GzipInputFile)
+
+    def testBgzf(self):
+        for numThreads in [1, 3]:
+            Config.DECOMPRESSION_NUM_THREADS = numThreads
+            fn = self._writeBgzfFile(self._text)
+            self.assertTrue(isGzipFile(fn))
+            self.assertTrue(isBgzfFile(fn))
+            self._assertReadsAs(self._text, fn, BgzfInputFile)
+
+            # BGZF files are valid gzip files
+            self.assertEqual(self._text, gzip.open(fn).read())
+
+    def testBgzfErrors(self):
+        fn = self._writeBgzfFile(self._text)
+        data = open(fn, 'rb').read()
+        open(fn, 'wb').write(data[:-40] + chr(ord(data[-40]) ^ 1) + data[-39:])
+        self.assertRaises((InvalidFormatError, zlib.error), openInputFile(fn).read)
+
+        open(fn, 'wb').write(data + 'garbage')
+        self.assertRaises(InvalidFormatError, openInputFile(fn).read)
+
+    def testUniversalNewlines(self):
+        text = 'a\r\nb\rc\n\r\nd'
+        fn = self._writeGzipFile(text)
+        self.assertEqual(['a\n', 'b\n', 'c\n', '\n', 'd'], list(openInputFile(fn)))
+
+        # Splits '\r\n' between blocks
+        gtrackcore.input.core.CompressedInputFile.BGZF_BATCH_NUM_BLOCKS = 1
+        fn = os.path.join(self._dir, 'test.gz')
+        writeBgzfFile(fn, text, 2)
+        self.assertEqual(['a\n', 'b\n', 'c\n', '\n', 'd'], list(openInputFile(fn)))
+
+    def testGenomeElementSource(self):
+        text = 'track name=test\n' + self._text
+        plainFn = os.path.join(self._dir, 'plain.bed')
+        open(plainFn, 'w').write(text)
+        expected = [(ge.chr, ge.start, ge.end) for ge in GenomeElementSource(plainFn, 'TestGenome')]
+
+        for fn in [self._writeGzipFile(text), self._writeBgzfFile(text)]:
+            geSource = GenomeElementSource(fn, 'TestGenome')
+            self.assertTrue(isinstance(geSource, BedGenomeElementSource))
+            self.assertEqual('bed', geSource.getFileSuffix())
+            self.assertFalse(geSource.isChrSplittable())
+            self.assertEqual(expected, [(ge.chr, ge.start, ge.end) for ge in geSource])
+
+    def testFileSuffix(self):
+        self.assertEqual('gtrack.gz', getFileSuffix('x.gtrack.gz'))
+        self.assertEqual('bed', getFileSuffix('x.bed.gz'))
+        self.assertEqual('category.bed', getFileSuffix('x.category.bed.gz'))
+        self.assertEqual('gz', getFileSuffix('x.gz'))
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestCompressedInputFile().debug()
+    unittest.main()
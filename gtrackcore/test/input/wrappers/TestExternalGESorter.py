@@ -0,0 +1,72 @@
+import unittest
+import os
+import random
+
+from gtrackcore.input.core.GenomeElement import GenomeElement
+from gtrackcore.input.wrappers.ExternalGESorter import ExternalGESorter
+
+class TestExternalGESorter(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+
+    def _createElements(self, num):
+        return [GenomeElement(random.choice(['A', 'B', None]), random.choice(['chr1', 'chr2', 'chr10']), \
+                              random.choice([None, random.randint(0, 20)]), random.choice([None, random.randint(0, 20)]), \
+                              val=i, strand=random.choice([True, False])) for i in xrange(num)]
+
+    def _assertSorted(self, geList, memoryBudget, groups=None):
+        sorter = ExternalGESorter(memoryBudget)
+        for i, ge in enumerate(geList):
+            sorter.addElement(ge, groups[i] if groups is not None else 0)
+
+        keys = groups if groups is not None else [0] * len(geList)
+        expected = [ge for key, ge in sorted(zip(keys, geList), \
+                                            key=lambda x: [x[0], x[1].genome, x[1].chr, x[1].start, x[1].end])]
+
+        self.assertEqual(len(geList), len(sorter))
+        self.assertEqual(expected, list(sorter))
+        self.assertEqual(expected, list(sorter))
+        return sorter
+
+    def testSortInMemory(self):
+        sorter = self._assertSorted(self._createElements(500), memoryBudget=10 ** 9)
+        self.assertEqual(0, sorter.getNumRuns())
+
+    def testSortWithSpilledRuns(self):
+        prevMergeChunkSize = ExternalGESorter.MERGE_CHUNK_SIZE
+        ExternalGESorter.MERGE_CHUNK_SIZE = 7
+        try:
+            sorter = self._assertSorted(self._createElements(500), memoryBudget=3000)
+            self.assertTrue(sorter.getNumRuns() > 10)
+
+            tempDir = sorter._tempDir
+            self.assertTrue(os.path.exists(tempDir))
+            sorter.removeFiles()
+            self.assertFalse(os.path.exists(tempDir))
+        finally:
+            ExternalGESorter.MERGE_CHUNK_SIZE = prevMergeChunkSize
+
+    def testSortWithGroups(self):
+        geList = self._createElements(300)
+        self._assertSorted(geList, memoryBudget=2000, groups=[random.randint(0, 3) for ge in geList])
+
+    def testEmpty(self):
+        self._assertSorted([], memoryBudget=1)
+
+    def testIterGroups(self):
+        geList = self._createElements(300)
+        groups = [random.randint(0, 3) for ge in geList]
+        groupOrder = [2, 0, 3, 1]
+        for memoryBudget in [10 ** 9, 2000]:
+            sorter = self._assertSorted(geList, memoryBudget, groups=groups)
+            expected = [ge for key, ge in sorted(zip(groups, geList), \
+                                                key=lambda x: [groupOrder.index(x[0]), x[1].genome, x[1].chr, x[1].start, x[1].end])]
+            self.assertEqual(expected, list(sorter.iterGroups(groupOrder)))
+            self.assertEqual([], list(sorter.iterGroups([4])))
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestExternalGESorter().debug()
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import tempfile
+import numpy as np
+
+from gtrackcore.input.core.GenomeElementSource import GenomeElementSource
+from gtrackcore.input.wrappers.GEBlockReader import GEBlockReader
+from gtrackcore.input.wrappers.GESectionBlockReader import GESectionBlockReader
+from gtrackcore.util.CustomExceptions import InvalidFormatError
+
+class TestGEBlockReader(unittest.TestCase):
+    def setUp(self):
+        self._prevBlockSize = GEBlockReader.BLOCK_SIZE
+        self._prevBlockNumBytes = GESectionBlockReader.BLOCK_NUM_BYTES
+        GEBlockReader.BLOCK_SIZE = 3
+        GESectionBlockReader.BLOCK_NUM_BYTES = 5
+
+    def tearDown(self):
+        GEBlockReader.BLOCK_SIZE = self._prevBlockSize
+        GESectionBlockReader.BLOCK_NUM_BYTES = self._prevBlockNumBytes
+
+    def _getGESource(self, suffix, lines, genome='TestGenome', forPreProcessor=False):
+        self._tf = tempfile.NamedTemporaryFile(suffix='.' + suffix)
+        self._tf.write('\n'.join(lines) + '\n')
+        self._tf.flush()
+        geSource = GenomeElementSource(self._tf.name, genome, suffix=suffix, forPreProcessor=forPreProcessor)
+        geSource.setPrintWarnings(False)
+        return geSource
+
+    def _getSliceRows(self, ge, prefixList):
+        return zip(*([[ge.chr] * len(getattr(ge, prefixList[0]))] + [getattr(ge, prefix).tolist() for prefix in prefixList]))
+
+    def _assertSameElements(self, geSource):
+        self.assertTrue(GEBlockReader.supportsGESource(geSource))
+        prefixList = geSource.getPrefixList()
+
+        # Strands are parsed as booleans line by line
+        if geSource.isSliceSource():
+            lineByLine = []
+            for ge in geSource:
+                lineByLine += self._getSliceRows(ge, prefixList)
+        else:
+            lineByLine = [tuple([ge.chr] + [int(x) if isinstance(x, bool) else x for x in \
+                                            [getattr(ge, prefix) for prefix in prefixList]]) for ge in geSource]
+
+        blockReader = GEBlockReader(geSource)
+        self.assertTrue(blockReader.isSliceSource())
+
+        blocks = []
+        blockIter = iter(blockReader)
+        for ge in iter(blockIter.next, None):
+            self.assertTrue(all(isinstance(getattr(ge, prefix), np.ndarray) for prefix in prefixList))
+            blocks += self._getSliceRows(ge, prefixList)
+
+        self.assertEqual(repr(lineByLine), repr(blocks))
+        return blockIter
+
+    def _assertSameBoundingRegions(self, geSource):
+        geIter = iter(geSource)
+        for ge in iter(geIter.next, None):
+            pass
+
+        blockIter = self._assertSameElements(geSource)
+        self.assertEqual([str(brt) for brt in geIter.getBoundingRegionTuples()], \
+                         [str(brt) for brt in blockIter.getBoundingRegionTuples()])
+
+    def testBed(self):
+        self._assertSameElements(self._getGESource('bed', \
+            ['chr21\t10\t20', 'chr21\t5\t6', 'chr21\t1\t1', 'chrM\t0\t100', 'chr21\t3\t4', 'chrM\t1\t2']))
+
+    def testBedWithInvalidLines(self):
+        blockIter = self._assertSameElements(self._getGESource('bed', \
+            ['chr21\t10\t20', 'chr21\t5\t6', '# comment', 'chrM\t0\t100', 'chrUnknown\t3\t4', '', 'chrM\t1\t2']))
+        self.assertTrue(blockIter.anyWarnings())
+
+    def testBedErrors(self):
+        for lines in [['chr21\t10\t20', 'chr21\t5\t6', 'chr21\t1\t2', 'chrM\t20\t10'], \
+                      ['chr21\t10\t20', 'chr21\t5\t6', 'chr21\t1\t2', 'chrM\t1\t2\t3'], \
+                      ['chr21\t10\t20', 'chr21\t5\t6', 'chr21\t1\t2', 'chrM\t100000000\t100000001']]:
+            self.assertRaises(InvalidFormatError, list, GEBlockReader(self._getGESource('bed', lines)))
+
+    def testPointBed(self):
+        self._assertSameElements(self._getGESource('point.bed', \
+            ['chr21\t10\t11', 'chr21\t5\t6', 'chrM\t0\t1', 'chrM\t3\t4']))
+        self.assertRaises(InvalidFormatError, list, GEBlockReader(self._getGESource('point.bed', \
+            ['chr21\t10\t11', 'chr21\t5\t6', 'chrM\t0\t1', 'chrM\t3\t5'])))
+
+    def testBedGraph(self):
+        self._assertSameElements(self._getGESource('bedgraph', \
+            ['track type=bedGraph', 'chr21\t10\t20\t1.5', 'chr21\t20\t30\tnan', 'chrM\t0\t100\t-2', \
+             'chrM\t100\t200\t.\textra', 'chr21\t30\t40\t3']))
+
+    def testGtrack(self):
+        for forPreProcessor in [False, True]:
+            self._assertSameElements(self._getGESource('gtrack', \
+                ['##track type: valued segments', '##sorted elements: true', '##no overlapping elements: true', \
+                 '###seqid\tstart\tend\tvalue\tstrand', 'chr21\t10\t20\t1.5\t+', 'chr21\t20\t30\t.\t-', \
+                 'chr21\t30\t40\tnan\t.', 'chr%4D\t0\t100\t-2\t+', 'chrM\t100\t200\t3\t+'], \
+                forPreProcessor=forPreProcessor))
+
+        self._assertSameElements(self._getGESource('gtrack', \
+            ['##track type: points', '##1-indexed: true', '###start\tseqid', '10\tchrM', '5\tchr21', \
+             '# comment', '', '6\tchr21', '1\tchr21']))
+
+        self._assertSameElements(self._getGESource('gtrack', \
+            ['##track type: segments', '##end inclusive: true', '###seqid\tstart\tend', \
+             'chr21\t5\t5', 'chr21\t10\t20', 'chr21\t21\t30', 'chrM\t0\t100']))
+
+    def testGtrackErrors(self):
+        for headers, lines in [(['##sorted elements: true'], ['chr21\t10\t20', 'chr21\t20\t30', 'chr21\t30\t40', 'chr21\t0\t5']), \
+                               (['##sorted elements: true'], ['chr21\t10\t20', 'chr21\t20\t30', 'chr21\t30\t40', 'chr21\t30\t35']), \
+                               (['##no overlapping elements: true'], ['chr21\t10\t20', 'chr21\t20\t30', 'chr21\t30\t40', 'chr21\t39\t45']), \
+                               (['##uninterrupted data lines: true'], ['chr21\t10\t20', 'chr21\t20\t30', '', 'chr21\t30\t40']), \
+                               ([], ['chr21\t10\t20', 'chr21\t20\t30', 'chr21\t30\t40', 'chr21\t 30\t40']), \
+                               ([], ['chr21\t10\t20', 'chr21\t20\t30', 'chr21\t30\t40', 'chr21\t50\t40'])]:
+            geSource = self._getGESource('gtrack', ['##track type: segments'] + headers + ['###seqid\tstart\tend'] + lines)
+            self.assertTrue(GEBlockReader.supportsGESource(geSource))
+            self.assertRaises(InvalidFormatError, list, GEBlockReader(geSource))
+
+    def testGtrackElementOrderErrors(self):
+        # Duplicate points, and equal segments with decreasing values, within a block and across blocks
+        for headers, lines in [(['##track type: points', '##no overlapping elements: true'], \
+                                ['###seqid\tstart', 'chr21\t10', 'chr21\t10', 'chr21\t30']), \
+                               (['##track type: points', '##no overlapping elements: true'], \
+                                ['###seqid\tstart', 'chr21\t10', 'chr21\t20', 'chr21\t30', 'chr21\t30']), \
+                               (['##track type: valued segments', '##sorted elements: true'], \
+                                ['###seqid\tstart\tend\tvalue', 'chr21\t10\t20\t2', 'chr21\t10\t20\t1', 'chr21\t30\t40\t1']), \
+                               (['##track type: valued segments', '##sorted elements: true'], \
+                                ['###seqid\tstart\tend\tvalue', 'chr21\t10\t20\t1', 'chr21\t20\t30\t1', 'chr21\t30\t40\t2', \
+                                 'chr21\t30\t40\t1'])]:
+            for forPreProcessor in [False, True]:
+                geSource = self._getGESource('gtrack', headers + lines, forPreProcessor=forPreProcessor)
+                self.assertTrue(GEBlockReader.supportsGESource(geSource))
+                self.assertRaises(InvalidFormatError, list, GEBlockReader(geSource))
+
+        self._assertSameElements(self._getGESource('gtrack', \
+            ['##track type: valued segments', '##sorted elements: true', '###seqid\tstart\tend\tvalue', \
+             'chr21\t10\t20\t1', 'chr21\t10\t20\t2', 'chr21\t30\t40\t1', 'chr21\t30\t40\t3']))
+
+    def testWig(self):
+        self._assertSameBoundingRegions(self._getGESource('wig', \
+            ['track type=wiggle_0', 'fixedStep chrom=chr21 start=11 step=1', '1', '2.5', 'nan', 'NA', '-4', \
+             'fixedStep chrom=chr21 start=16 step=1', '5', '# comment', '6', 'fixedStep chrom=chrM start=1', '7']))
+
+        for declArgs in ['step=10', 'step=10 span=5', 'step=5 span=5']:
+            self._assertSameBoundingRegions(self._getGESource('wig', \
+                ['fixedStep chrom=chr21 start=11 %s' % declArgs, '1', '2.5', '', '4', \
+                 'fixedStep chrom=chr21 start=101 %s' % declArgs, '5', '6', '7', '8', \
+                 'fixedStep chrom=chrM start=20 %s' % declArgs, '9'], forPreProcessor=True))
+
+    def testWigErrors(self):
+        for lines in [['fixedStep chrom=chrM start=16561 step=10 span=5', '1', '2', '3'], \
+                      ['fixedStep chrom=chrM start=1 step=1', '1', '2', '3 4'], \
+                      ['fixedStep chrom=chrM start=1 step=1', '1', '2', '3x'], \
+                      ['fixedStep chrom=chrM start=1 step=1', '1', '2', 'variableStep chrom=chrM', '1\t2']]:
+            self.assertRaises((InvalidFormatError, ValueError), list, GEBlockReader(self._getGESource('wig', lines)))
+
+    def testFasta(self):
+        self._assertSameBoundingRegions(self._getGESource('fa', \
+            ['>chrM Description', 'acgtn', 'NNN', '', 'gt', '>chr21', 'gca', 'tt']))
+        self.assertRaises(InvalidFormatError, list, GEBlockReader(self._getGESource('fa', ['acgt', '>chrM', 'acgt'])))
+
+    def testUnsupportedSources(self):
+        self.assertFalse(GEBlockReader.supportsGESource(self._getGESource('bed', ['chr21\t10\t20\tname'])))
+        self.assertFalse(GEBlockReader.supportsGESource(self._getGESource('targetcontrol.bedgraph', ['chr21\t10\t20\t1'])))
+        self.assertFalse(GEBlockReader.supportsGESource(self._getGESource('gtrack', \
+            ['##track type: segments', '###seqid\tstart\tend\tname', 'chr21\t10\t20\ta'])))
+        self.assertFalse(GEBlockReader.supportsGESource(self._getGESource('gtrack', \
+            ['##track type: segments', '###start\tend', '####seqid=chr21', '10\t20'])))
+        self.assertFalse(GEBlockReader.supportsGESource(self._getGESource('wig', ['variableStep chrom=chr21', '10\t1'])))
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestGEBlockReader().debug()
+    unittest.main()
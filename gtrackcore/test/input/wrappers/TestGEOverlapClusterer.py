@@ -5,7 +5,7 @@ import numpy as np
 from numpy import nan
 
 from gtrackcore.core.Config import Config
-from gtrackcore.input.wrappers.GEOverlapClusterer import GEOverlapClusterer
+from gtrackcore.input.wrappers.GEOverlapClusterer import GEOverlapClusterer, GEOverlapClustererBase
 from gtrackcore.test.common.Asserts import assertDecorator, TestCaseWithImprovedAsserts
 from gtrackcore.util.CommonConstants import BINARY_MISSING_VAL
 
@@ -152,6 +152,20 @@ class TestGEOverlapClusterer(TestCaseWithImprovedAsserts):
                                [['A','chr1',0,10,{'name':'a1'}]] * MAX_CONCAT_LEN_FOR_OVERLAPPING_ELS)
         self._assertClustering([['A','chr1',0,10,{'name':'a1|...'}]], \
                                [['A','chr1',0,10,{'name':'a1'}]] + [['A','chr1',0,10,{'name':'a2'}]] * MAX_CONCAT_LEN_FOR_OVERLAPPING_ELS)
+
+    def testClusteringInSmallBlocks(self):
+        prevBlockSize = GEOverlapClustererBase.BLOCK_SIZE
+        try:
+            for blockSize in [1, 2]:
+                GEOverlapClustererBase.BLOCK_SIZE = blockSize
+                self.testClustering()
+                self._assertClustering([['A','chr1',0,40,{'val':nan}],['A','chr1',40,45,{'val':5}]], \
+                                       [['A','chr1',0,30,{'val':1}],['A','chr1',5,10,{'val':2}],\
+                                        ['A','chr1',20,25,{'val':3}],['A','chr1',29,40,{'val':4}],\
+                                        ['A','chr1',40,45,{'val':5}]])
+        finally:
+            GEOverlapClustererBase.BLOCK_SIZE = prevBlockSize
+
     def runTest(self):
         #pass
         self.testClustering()
@@ -1,10 +1,15 @@
 import unittest
 import numpy as np
+import os
+import shutil
+import tempfile
 
 from numpy import nan
 
 from gtrackcore.preprocess.memmap.ChrMemmapFolderMerger import ChrMemmapFolderMerger
 from gtrackcore.test.common.Asserts import TestCaseWithImprovedAsserts
+from gtrackcore.track.memmap.CommonMemmapFunctions import createMemmapFileFn, calcShapeFromMemmapFileFn
+from gtrackcore.track.memmap.TrackLayout import MemmapFileInfo
 from gtrackcore.util.CommonConstants import BINARY_MISSING_VAL
 
 class TestChrMemmapFolderMerger(TestCaseWithImprovedAsserts):
@@ -99,6 +104,44 @@ class TestChrMemmapFolderMerger(TestCaseWithImprovedAsserts):
         self.assertRaises(AssertionError, ChrMemmapFolderMerger.mergeArrays, np.array([[[[1,2]]]]), np.array([[[[3,4]]]]))
         self.assertRaises(AssertionError, ChrMemmapFolderMerger.mergeArrays, np.array([1,2], dtype='int'), np.array([3,4], dtype='float'))
     
+    def _writeChrFile(self, path, array, elementDim, dtypeDim):
+        os.mkdir(path)
+        fn = createMemmapFileFn(path, 'weights', elementDim, dtypeDim, str(array.dtype))
+        if array.size > 0:
+            f = np.memmap(fn, dtype=array.dtype, mode='w+', shape=array.shape)
+            f[:] = array
+            f.flush()
+            del f
+        else:
+            open(fn, 'wb').close()
+        return MemmapFileInfo(fn, elementDim, dtypeDim, str(array.dtype), array.shape)
+    
+    def _assertMergeFiles(self, arrays, elementDims, dtypeDims):
+        path = tempfile.mkdtemp()
+        try:
+            fileInfos = [self._writeChrFile(path + os.sep + 'chr%s' % i, array, elementDim, dtypeDim) \
+                         for i, (array, elementDim, dtypeDim) in enumerate(zip(arrays, elementDims, dtypeDims))]
+            ChrMemmapFolderMerger._mergeFiles(path, 'weights', fileInfos)
+            
+            target = reduce(ChrMemmapFolderMerger.mergeArrays, arrays)
+            mergedFn = createMemmapFileFn(path, 'weights', max(elementDims), max(dtypeDims), str(target.dtype))
+            merged = np.memmap(mergedFn, dtype=target.dtype, mode='r', shape=tuple(calcShapeFromMemmapFileFn(mergedFn)))
+            self.assertListsOrDicts(target, merged)
+            del merged
+        finally:
+            shutil.rmtree(path)
+    
+    def testMergeFiles(self):
+        self._assertMergeFiles([np.array([1,2]), np.array([], dtype='int'), np.array([3,4,5])], \
+                               [None, None, None], [1, 1, 1])
+        
+        self._assertMergeFiles([np.array([['a','b']], dtype='S1'), np.array([['aa'], ['bb']], dtype='S2')], \
+                               [2, 1], [1, 1])
+        
+        self._assertMergeFiles([np.array([[[1.0,2.0], [3.0,4.0]]]), np.array([[[5.0,6.0,7.0]]]), \
+                                np.array([[[8.0,9.0], [1.0,2.0]], [[3.0,4.0], [5.0,6.0]]])], \
+                               [2, 1, 2], [2, 3, 2])
+    
     def runTest(self):
         pass
     
@@ -9,6 +9,7 @@ from collections import OrderedDict
 
 from gtrackcore.input.core.GenomeElement import GenomeElement
 from gtrackcore.preprocess.memmap.OutputFile import OutputFile
+import gtrackcore.preprocess.memmap.OutputFile
 from gtrackcore.util.CommonFunctions import isIter
 
 from gtrackcore.test.common.Asserts import TestCaseWithImprovedAsserts
@@ -188,6 +189,27 @@ class TestOutputFile(TestCaseWithImprovedAsserts):
                                  [ [['aa','ab'],['ab','ac']], [['aa','ac'],['','']], [['ab','c'],['ac','c']] ], 'S2', 2, 2)
         del setup
     
+    def testWriteElementChunked(self):
+        prevChunkSize = gtrackcore.preprocess.memmap.OutputFile.OUTPUT_FILE_CHUNK_SIZE
+        gtrackcore.preprocess.memmap.OutputFile.OUTPUT_FILE_CHUNK_SIZE = 3
+        try:
+            self.testWriteElement()
+            self.testWriteElementPartial()
+            self.testWrite()
+        finally:
+            gtrackcore.preprocess.memmap.OutputFile.OUTPUT_FILE_CHUNK_SIZE = prevChunkSize
+    
+    def testSortChunked(self):
+        s = Setup('start', 5, 'int32', 1, None)
+        
+        of = OutputFile(s.path, s.filePrefix, 5, chunkSize=2)
+        for i in [4, 2, 5, 1, 3]:
+            of.write(i)
+        self.assertListsOrDicts([3, 1, 0, 4, 2], list(of.sort()))
+        of.close()
+        
+        self.assertListsOrDicts([1, 2, 3, 4, 5], list(memmap(s.fn, 'int32', mode='r')))
+    
     def _assertWrite(self, filePrefix, dataType, contents):
         s = Setup(filePrefix, len(contents), dataType, 1, None)
 
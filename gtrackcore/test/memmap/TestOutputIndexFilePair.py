@@ -2,7 +2,7 @@ import os
 import unittest
 import sys
 
-from numpy import memmap, array
+from numpy import memmap, array, random
 
 import gtrackcore.util.CompBinManager
 import gtrackcore.preprocess.memmap.OutputIndexFilePair
@@ -87,8 +87,38 @@ class TestOutputIndexFilePair(unittest.TestCase):
         self._assertWriteIndexes([0, 0, 0, 0, 1, 1, 1], [2, 2, 2, 3, 3, 3, 4], [], [0, 350, 650, 700], 700)
         self._assertWriteIndexes([0, 0, 0, 0, 1, 1, 1], [1, 1, 2, 3, 3, 3, 4], [], [200, 350, 650, 700], 700)
     
+    def _calcIndexesByLoop(self, lefts, rights, endIndex):
+        binSize = gtrackcore.util.CompBinManager.CompBinManager.getIndexBinSize()
+        numBins = (endIndex - 1) / binSize + 1
+        
+        leftIndex, rightIndex = [], []
+        for i, right in enumerate(rights):
+            while right > len(leftIndex) * binSize:
+                leftIndex.append(i)
+        for j, left in enumerate(lefts):
+            while left >= (len(rightIndex) + 1) * binSize:
+                rightIndex.append(j)
+        
+        return (leftIndex + [len(rights)] * numBins)[:numBins], \
+               (rightIndex + [len(lefts)] * numBins)[:numBins]
+        
+    def testWriteIndexesRandom(self):
+        random.seed(0)
+        for endIndex in [100, 450, 1000]:
+            for numElements in [1, 5, 50]:
+                starts = sorted(random.randint(0, endIndex, numElements))
+                ends = [start + random.randint(0, 300) for start in starts]
+                ends = [min(end, endIndex) for end in ends]
+                
+                leftContents, rightContents = self._calcIndexesByLoop(starts, ends, endIndex)
+                self._assertWriteIndexes(leftContents, rightContents, starts, ends, endIndex)
+                
+                leftContents, rightContents = self._calcIndexesByLoop(starts, [start+1 for start in starts], endIndex)
+                self._assertWriteIndexes(leftContents, rightContents, starts, [], endIndex)
+    
     def runTest(self):
         self.testWriteIndexes()
+        self.testWriteIndexesRandom()
     
 if __name__ == "__main__":
     #TestOutputIndexFilePair().debug()
@@ -8,9 +8,13 @@ from copy import deepcopy
 
 import gtrackcore.test
 
+from gtrackcore.core.Config import Config
 from gtrackcore.input.core.GenomeElementSource import BoundingRegionTuple
 from gtrackcore.input.adapters.TrackGenomeElementSource import FullTrackGenomeElementSource
+from gtrackcore.input.wrappers.GEBlockReader import GEBlockReader
 from gtrackcore.metadata.GenomeInfo import GenomeInfo
+from gtrackcore.metadata.TrackInfo import TrackInfo
+from gtrackcore.preprocess.GEColumnBuffers import GEColumnBuffers
 from gtrackcore.preprocess.PreProcessTracksJob import PreProcessAllTracksJob, PreProcessTrackGESourceJob
 from gtrackcore.test.common.TestWithGeSourceData import TestWithGeSourceData
 from gtrackcore.test.preprocess.ProfiledIntegrationTest import ProfiledIntegrationTest
@@ -18,7 +22,8 @@ from gtrackcore.track.core.GenomeRegion import GenomeRegion
 from gtrackcore.track.core.Track import Track
 from gtrackcore.track.core.TrackView import AutonomousTrackElement
 from gtrackcore.track.format.TrackFormat import TrackFormatReq
-from gtrackcore.util.CommonFunctions import createDirPath
+from gtrackcore.util.CommonFunctions import createDirPath, createOrigPath, ensurePathExists
+from gtrackcore.util import CommonFunctions
 
 PreProcessAllTracksJob.PASS_ON_EXCEPTIONS = True
 
@@ -26,14 +31,16 @@ class TestTrackPreProcessor(ProfiledIntegrationTest, TestWithGeSourceData):
     GENOME = 'TestGenome'
 
     def _preProcess(self, trackName, noOverlapsFileCount=None, withOverlapsFileCount=None, \
-                    noOverlapsChrElCount=None, withOverlapsChrElCount=None, customBins={}):
+                    noOverlapsChrElCount=None, withOverlapsChrElCount=None, customBins={}, numWorkers=None, singlePass=False):
         trackName = self.TRACK_NAME_PREFIX + trackName
         noOverlapsPath = createDirPath(trackName, self.GENOME, allowOverlaps=False)
         withOverlapsPath = createDirPath(trackName, self.GENOME, allowOverlaps=True)
         self._removeDir(noOverlapsPath, trackName)
         self._removeDir(withOverlapsPath, trackName)
 
-        self._runWithProfiling('PreProcessAllTracksJob(' + repr(self.GENOME) + ',' + repr(trackName) + ', username="Test").process()',\
+        self._runWithProfiling('PreProcessAllTracksJob(' + repr(self.GENOME) + ',' + repr(trackName) + \
+                               ', username="Test", numWorkers=' + repr(numWorkers) + \
+                               ', singlePass=' + repr(singlePass) + ').process()',\
                                    globals(), locals())
 
         if noOverlapsFileCount is not None:
@@ -50,6 +57,16 @@ class TestTrackPreProcessor(ProfiledIntegrationTest, TestWithGeSourceData):
 
         #self._storeProfile()
 
+    def _readPreProcessedFiles(self, trackName):
+        trackName = self.TRACK_NAME_PREFIX + trackName
+        contents = {}
+        for allowOverlaps in [False, True]:
+            path = createDirPath(trackName, self.GENOME, allowOverlaps=allowOverlaps)
+            for fn in os.listdir(path):
+                with open(os.sep.join([path, fn]), 'rb') as f:
+                    contents[(allowOverlaps, fn)] = f.read()
+        return contents
+
     def _preProcessTrackToTrack(self, fromTrackName, toTrackName, allowOverlaps):
         fromTrackName = self.TRACK_NAME_PREFIX + fromTrackName
         toTrackName = self.TRACK_NAME_PREFIX + toTrackName
@@ -250,6 +267,24 @@ class TestGESourceTracksPreprocessing(TestTrackPreProcessor):
         withOverlapsChrElCount=None, \
         customBins={'chr21':GenomeRegion(self.GENOME, 'chr21', 0, 9804)})
 
+    def testPreProcessFastaPacked(self):
+        trackName = ['FastaGenomeElementSource']
+        regions = [GenomeRegion(self.GENOME, 'chr21', start, end) for start, end in [(0, 9804), (3, 17), (5000, 5003)]]
+
+        self._preProcess(trackName)
+        seqs = [self._getTrackView(self.TRACK_NAME_PREFIX + trackName, region, False).valsAsNumpyArray().tostring() \
+                for region in regions]
+
+        Config.SEQUENCE_STORAGE_FORMAT = '2bit'
+        try:
+            self._preProcess(trackName)
+            fns = os.listdir(createDirPath(self.TRACK_NAME_PREFIX + trackName, self.GENOME, allowOverlaps=False))
+            self.assertTrue('val.2bit' in fns and 'val.S1' not in fns)
+            self.assertEqual(seqs, [self._getTrackView(self.TRACK_NAME_PREFIX + trackName, region, False).valsAsNumpyArray().tostring() \
+                                    for region in regions])
+        finally:
+            Config.SEQUENCE_STORAGE_FORMAT = 'S1'
+
     def testPreProcessGff(self):
         self._preProcess(['GffGenomeElementSource'], \
         noOverlapsFileCount=12, \
@@ -278,6 +313,48 @@ class TestGESourceTracksPreprocessing(TestTrackPreProcessor):
         noOverlapsChrElCount={'chr21':2, 'chrM':1}, \
         withOverlapsChrElCount={'chr21':2, 'chrM':1})
 
+    def testPreProcessBedGraphTargetControlParallel(self):
+        trackName = ['BedGraphTargetControlGenomeElementSource']
+        self._preProcess(trackName, numWorkers=1)
+        serialContents = self._readPreProcessedFiles(trackName)
+
+        self._preProcess(trackName, \
+        noOverlapsChrElCount={'chr21':2, 'chrM':1}, \
+        withOverlapsChrElCount={'chr21':2, 'chrM':1}, \
+        numWorkers=2)
+        self.assertEqual(serialContents, self._readPreProcessedFiles(trackName))
+
+    def testPreProcessSinglePass(self):
+        prevChunkSize = GEColumnBuffers.CHUNK_SIZE
+        GEColumnBuffers.CHUNK_SIZE = 100
+        try:
+            for trackName in [['BedGenomeElementSource'], ['BedCategoryGenomeElementSource'], \
+                              ['BedGraphGenomeElementSource'], ['GffGenomeElementSource'], \
+                              ['MicroarrayGenomeElementSource']]:
+                self._preProcess(trackName)
+                twoPassContents = self._readPreProcessedFiles(trackName)
+
+                self._preProcess(trackName, singlePass=True)
+                self.assertEqual(twoPassContents, self._readPreProcessedFiles(trackName))
+        finally:
+            GEColumnBuffers.CHUNK_SIZE = prevChunkSize
+
+    def testPreProcessInBlocks(self):
+        prevBlockSize = GEBlockReader.BLOCK_SIZE
+        GEBlockReader.BLOCK_SIZE = 7
+        try:
+            trackName = ['BedGraphGenomeElementSource']
+            PreProcessAllTracksJob.PARSE_IN_BLOCKS = False
+            self._preProcess(trackName)
+            lineByLineContents = self._readPreProcessedFiles(trackName)
+
+            PreProcessAllTracksJob.PARSE_IN_BLOCKS = True
+            self._preProcess(trackName)
+            self.assertEqual(lineByLineContents, self._readPreProcessedFiles(trackName))
+        finally:
+            GEBlockReader.BLOCK_SIZE = prevBlockSize
+            PreProcessAllTracksJob.PARSE_IN_BLOCKS = True
+
     def testPreProcessHBFunction(self):
         self._preProcess(['HBFunctionGenomeElementSource'], \
         noOverlapsFileCount=2, \
@@ -285,6 +362,187 @@ class TestGESourceTracksPreprocessing(TestTrackPreProcessor):
         noOverlapsChrElCount=None, \
         withOverlapsChrElCount=None)
 
+    def _writeOrigFile(self, trackName, relFn, lines):
+        fn = createOrigPath(self.GENOME, self.TRACK_NAME_PREFIX + trackName, relFn)
+        ensurePathExists(fn)
+        with open(fn, 'w') as origFile:
+            origFile.write(''.join('\t'.join(str(x) for x in line) + '\n' for line in lines))
+
+    def _getAllElements(self, trackName, allowOverlaps):
+        return [[(te.start(), te.end(), te.val()) for te in self._getTrackView(self.TRACK_NAME_PREFIX + trackName, \
+                 GenomeRegion(self.GENOME, chr, 0, GenomeInfo.getChrLen(self.GENOME, chr)), allowOverlaps)] \
+                for chr in ['chr21', 'chrM']]
+
+    def testPreProcessIncrementally(self):
+        oldLines = [('chr21', 10, 20, 'a'), ('chr21', 15, 30, 'b'), ('chr21', 100, 120, 'a')]
+        newLines = [('chrM', 5, 10, 'c'), ('chr21', 25, 50, 'c'), ('chr21', 200, 210, 'b')]
+        trackName, refTrackName = ['Incremental'], ['IncrementalReference']
+        try:
+            self._writeOrigFile(trackName, 'old.category.bed', oldLines)
+            self._preProcess(trackName)
+
+            self._writeOrigFile(trackName, 'new.category.bed', newLines)
+            job = PreProcessAllTracksJob(self.GENOME, self.TRACK_NAME_PREFIX + trackName, username='Test', incremental=True)
+            self.assertTrue(job._shouldPreProcessIncrementally(self.TRACK_NAME_PREFIX + trackName))
+            job.process()
+
+            self._writeOrigFile(refTrackName, 'all.category.bed', oldLines + newLines)
+            self._preProcess(refTrackName)
+
+            for allowOverlaps in [False, True]:
+                self.assertEqual(self._getAllElements(refTrackName, allowOverlaps), \
+                                 self._getAllElements(trackName, allowOverlaps))
+
+            ti = TrackInfo(self.GENOME, self.TRACK_NAME_PREFIX + trackName)
+            refTi = TrackInfo(self.GENOME, self.TRACK_NAME_PREFIX + refTrackName)
+            for attr in ['origElCount', 'clusteredElCount', 'numValCategories', 'numClusteredValCategories']:
+                self.assertEqual(getattr(refTi, attr), getattr(ti, attr))
+            self.assertEqual(['new.category.bed', 'old.category.bed'], sorted(ti.origFileManifest.keys()))
+
+            # Nothing new to add
+            self.assertFalse(job._shouldPreProcessIncrementally(self.TRACK_NAME_PREFIX + trackName))
+        finally:
+            for tn in [trackName, refTrackName]:
+                self._removeAllTrackData(self.TRACK_NAME_PREFIX + tn)
+
+    def testSkipUnchangedOrigFiles(self):
+        trackName = ['Fingerprinted']
+        fullTrackName = self.TRACK_NAME_PREFIX + trackName
+        lines = [('chr21', 10, 20, 'a'), ('chr21', 15, 30, 'b')]
+        fn = createOrigPath(self.GENOME, fullTrackName, 'test.category.bed')
+        try:
+            self._writeOrigFile(trackName, 'test.category.bed', lines)
+            self._preProcess(trackName)
+            timeOfPreProcessing = TrackInfo(self.GENOME, fullTrackName).timeOfPreProcessing
+
+            def rerun():
+                job = PreProcessAllTracksJob(self.GENOME, fullTrackName, username='Test')
+                job.process()
+                return set(reason for tn, skippedFn, allowOverlaps, reason in job.getSkippedGESources())
+
+            self.assertEqual(set(['unchanged since last preprocessing']), rerun())
+
+            mtime = int(os.path.getmtime(fn)) + 10
+            os.utime(fn, (mtime, mtime))
+            self.assertEqual(set(['content unchanged since last preprocessing, only the modification time differs']), \
+                             rerun())
+            ti = TrackInfo(self.GENOME, fullTrackName)
+            self.assertEqual(timeOfPreProcessing, ti.timeOfPreProcessing)
+            self.assertEqual(mtime, ti.origFileManifest['test.category.bed'][1])
+            self.assertEqual(set(['unchanged since last preprocessing']), rerun())
+
+            self._writeOrigFile(trackName, 'test.category.bed', lines + [('chrM', 5, 10, 'c')])
+            os.utime(fn, (mtime + 10, mtime + 10))
+            self.assertEqual(set(), rerun())
+            self.assertNotEqual(timeOfPreProcessing, TrackInfo(self.GENOME, fullTrackName).timeOfPreProcessing)
+            self.assertEqual(3, TrackInfo(self.GENOME, fullTrackName).origElCount)
+        finally:
+            self._removeAllTrackData(fullTrackName)
+
+    def testChangedLargeOrigFile(self):
+        trackName = ['FingerprintedLarge']
+        fullTrackName = self.TRACK_NAME_PREFIX + trackName
+        # More than 1 MiB, with all lines of the same length
+        lines = [('chr21', 1000000 + i * 10, 1000005 + i * 10) for i in xrange(60000)]
+        fn = createOrigPath(self.GENOME, fullTrackName, 'test.bed')
+        try:
+            self._writeOrigFile(trackName, 'test.bed', lines)
+            self.assertTrue(os.path.getsize(fn) > 1024 * 1024)
+            self._preProcess(trackName)
+            timeOfPreProcessing = TrackInfo(self.GENOME, fullTrackName).timeOfPreProcessing
+
+            # A digit in the middle of the file is changed, keeping the size
+            middle = len(lines) // 2
+            lines[middle] = (lines[middle][0], lines[middle][1], lines[middle][2] + 1)
+            self._writeOrigFile(trackName, 'test.bed', lines)
+            mtime = int(os.path.getmtime(fn)) + 10
+            os.utime(fn, (mtime, mtime))
+
+            job = PreProcessAllTracksJob(self.GENOME, fullTrackName, username='Test')
+            job.process()
+            self.assertEqual([], job.getSkippedGESources())
+            self.assertNotEqual(timeOfPreProcessing, TrackInfo(self.GENOME, fullTrackName).timeOfPreProcessing)
+
+            start = lines[middle][1]
+            tv = self._getTrackView(fullTrackName, GenomeRegion(self.GENOME, 'chr21', start, start + 10), False)
+            self.assertEqual([(0, 6)], [(te.start(), te.end()) for te in tv])
+        finally:
+            self._removeAllTrackData(fullTrackName)
+
+    def testOrigFilesFingerprintedOncePerRun(self):
+        trackName = ['FingerprintedOnce']
+        fullTrackName = self.TRACK_NAME_PREFIX + trackName
+        lines = [('chr21', 10, 20, 'a'), ('chr21', 15, 30, 'b')]
+        fn = createOrigPath(self.GENOME, fullTrackName, 'test.category.bed')
+
+        origMd5 = CommonFunctions.hashlib.md5
+        md5Calls = []
+        def countingMd5(*args):
+            md5Calls.append(args)
+            return origMd5(*args)
+
+        def countFileReads(func):
+            del md5Calls[:]
+            CommonFunctions.hashlib.md5 = countingMd5
+            try:
+                func()
+            finally:
+                CommonFunctions.hashlib.md5 = origMd5
+            return len(md5Calls)
+
+        def rerun():
+            PreProcessAllTracksJob(self.GENOME, fullTrackName, username='Test').process()
+
+        try:
+            self._writeOrigFile(trackName, 'test.category.bed', lines)
+            self.assertEqual(1, countFileReads(lambda: self._preProcess(trackName)))
+
+            mtime = int(os.path.getmtime(fn)) + 10
+            os.utime(fn, (mtime, mtime))
+            self.assertEqual(1, countFileReads(rerun))
+            self.assertEqual(0, countFileReads(rerun))
+        finally:
+            self._removeAllTrackData(fullTrackName)
+
+    def testSkipLegacyPreProcessedTrack(self):
+        # Tracks preprocessed before the manifest of the original files was
+        # stored have an id based on the modification times of the files
+        trackName = ['LegacyId']
+        fullTrackName = self.TRACK_NAME_PREFIX + trackName
+        try:
+            self._writeOrigFile(trackName, 'test.category.bed', [('chr21', 10, 20, 'a')])
+            self._preProcess(trackName)
+
+            ti = TrackInfo(self.GENOME, fullTrackName)
+            origPath = createOrigPath(self.GENOME, fullTrackName)
+            ti.id = TrackInfo.constructLegacyIdFromPath(self.GENOME, origPath, ti.preProcVersion, PreProcessAllTracksJob.VERSION)
+            ti.origFileManifest = None
+            ti.store()
+
+            job = PreProcessAllTracksJob(self.GENOME, fullTrackName, username='Test')
+            job.process()
+            self.assertEqual(set(['unchanged since last preprocessing']), \
+                             set(reason for tn, skippedFn, allowOverlaps, reason in job.getSkippedGESources()))
+        finally:
+            self._removeAllTrackData(fullTrackName)
+
+    def testPreProcessIncrementallyDifferentFormat(self):
+        oldLines = [('chr21', 10, 20), ('chr21', 100, 120)]
+        newLines = [('chr21', 25, 50, 'a', 5, '+'), ('chrM', 5, 10, 'b', 3, '-')]
+        trackName = ['IncrementalDifferentFormat']
+        try:
+            self._writeOrigFile(trackName, 'old.bed', oldLines)
+            self._preProcess(trackName)
+
+            self._writeOrigFile(trackName, 'new.bed', newLines)
+            job = PreProcessAllTracksJob(self.GENOME, self.TRACK_NAME_PREFIX + trackName, username='Test', incremental=True)
+            self.assertFalse(job._shouldPreProcessIncrementally(self.TRACK_NAME_PREFIX + trackName))
+
+            # The full rebuild does not allow files of different formats
+            self.assertRaises(AssertionError, job.process)
+        finally:
+            self._removeAllTrackData(self.TRACK_NAME_PREFIX + trackName)
+
     #def testPreProcessPoisitionIter(self):
     #    self._preProcess(['PositionIterGESource'], \
     #    noOverlapsFileCount=4, \
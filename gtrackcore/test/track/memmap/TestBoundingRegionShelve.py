@@ -4,14 +4,16 @@ import shutil
 
 from gtrackcore.input.core.GenomeElementSource import BoundingRegionTuple
 from gtrackcore.track.core.GenomeRegion import GenomeRegion
-from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve, BoundingRegionInfo
+import gtrackcore.third_party.safeshelve as safeshelve
+
+from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve, BoundingRegionInfo, BrInfoHolder
 from gtrackcore.util.CommonFunctions import createDirPath
 from gtrackcore.util.CustomExceptions import InvalidFormatError, OutsideBoundingRegionError
 
 class TestBoundingRegionShelve(unittest.TestCase):
     def setUp(self):
         self._path = createDirPath(['testBoundingRegionShelve'], 'TestGenome', allowOverlaps=False)
-        self._fn = self._path + os.sep + 'boundingRegions.shelve'
+        self._fn = self._path + os.sep + 'boundingRegions.index'
         
     def _setUpShelve(self):
         self._brShelve = BoundingRegionShelve('TestGenome',['testBoundingRegionShelve'], allowOverlaps=False)
@@ -207,6 +209,41 @@ class TestBoundingRegionShelve(unittest.TestCase):
         self.assertEquals(0,
                           self._brShelve.getTotalElementCountForChr('chr1'))
         
+    def _storeLegacyShelve(self):
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+        
+        chr21BrInfos = (BoundingRegionInfo(0, 1000000, 0, 30, 0, 470), \
+                        BoundingRegionInfo(2000000, 2500000, 0, 30, 0, 470))
+        brShelve = safeshelve.open(self._path + os.sep + 'boundingRegions.shelve')
+        brShelve['chr21'] = BrInfoHolder(tuple(x.start for x in chr21BrInfos), chr21BrInfos)
+        brShelve['chrM'] = {1000: BoundingRegionInfo(1000, 2000, 30, 35, 470, 471)}
+        brShelve.close()
+    
+    def _assertLegacyBoundingInfo(self):
+        self.assertEquals(BoundingRegionInfo(2000000, 2500000, 0, 30, 0, 470),
+                          self._brShelve.getBoundingRegionInfo(GenomeRegion('TestGenome', 'chr21', 2050000, 2052000)))
+        self.assertEquals(BoundingRegionInfo(1000, 2000, 30, 35, 470, 471),
+                          self._brShelve.getBoundingRegionInfo(GenomeRegion('TestGenome', 'chrM', 1000, 2000)))
+        self.assertEquals(30, self._brShelve.getTotalElementCountForChr('chr21'))
+    
+    def testGetBoundingInfoLegacyShelve(self):
+        self._storeLegacyShelve()
+        self._setUpShelve()
+        
+        self.assertTrue(self._brShelve.fileExists())
+        self.assertFalse(os.path.exists(self._fn))
+        self._assertLegacyBoundingInfo()
+    
+    def testMigrateLegacyShelve(self):
+        self._storeLegacyShelve()
+        self._setUpShelve()
+        self._brShelve.migrateLegacyShelve()
+        
+        self.assertTrue(os.path.exists(self._fn))
+        self._setUpShelve()
+        self._assertLegacyBoundingInfo()
+    
     def runTest(self):
         pass
     
@@ -0,0 +1,74 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy
+
+import gtrackcore.track.memmap.PackedSequenceArray
+from gtrackcore.track.memmap.PackedSequenceArray import PackedSequenceArray, packSequenceFile, \
+                                                    getPackedSequenceShape, isPackedSequenceFileName
+
+class TestPackedSequenceArray(unittest.TestCase):
+    def setUp(self):
+        self._prevChunkSize = gtrackcore.track.memmap.PackedSequenceArray.PACK_CHUNK_SIZE
+        gtrackcore.track.memmap.PackedSequenceArray.PACK_CHUNK_SIZE = 8
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        gtrackcore.track.memmap.PackedSequenceArray.PACK_CHUNK_SIZE = self._prevChunkSize
+        shutil.rmtree(self._dir)
+
+    def _pack(self, seq):
+        fn = os.sep.join([self._dir, 'val.S1'])
+        numpy.fromstring(seq, dtype='S1').tofile(fn)
+        packedFn = packSequenceFile(fn)
+
+        self.assertFalse(os.path.exists(fn))
+        self.assertTrue(isPackedSequenceFileName(packedFn))
+        self.assertEqual((len(seq),), getPackedSequenceShape(packedFn))
+        return PackedSequenceArray.open(packedFn)
+
+    def testRoundTrip(self):
+        seq = 'ACGTacgtNNNNNNNNnnnnACGTRYacgtggggCCCC\x00\x00TTa'
+        packed = self._pack(seq)
+
+        self.assertEqual(len(seq), len(packed))
+        self.assertEqual(numpy.dtype('S1'), packed.dtype)
+        self.assertEqual(seq, packed.asNumpyArray().tostring())
+
+        for i in range(len(seq)):
+            for j in range(i, len(seq) + 2):
+                self.assertEqual(seq[i:j], packed[i:j].asNumpyArray().tostring())
+
+        self.assertEqual(seq[10:20][3:5], packed[10:20][3:5].asNumpyArray().tostring())
+        self.assertEqual(seq[-3], packed[-3])
+        self.assertEqual(list(seq[5:9]), list(packed[5:9]))
+
+    def testSliceIsLazy(self):
+        packed = self._pack('ACGTN' * 10)
+        sliced = packed[3:17]
+        self.assertEqual(14, len(sliced))
+        self.assertEqual((14,), sliced.shape)
+        self.assertTrue(sliced._cachedNumpyArray is None)
+
+    def testEmpty(self):
+        packed = self._pack('')
+        self.assertEqual(0, len(packed))
+        self.assertEqual('', packed.asNumpyArray().tostring())
+
+    def testOnlyIfSmaller(self):
+        fn = os.sep.join([self._dir, 'val.S1'])
+        numpy.fromstring('AaNn' * 10, dtype='S1').tofile(fn)
+        self.assertEqual(None, packSequenceFile(fn, onlyIfSmaller=True))
+        self.assertEqual(['val.S1'], os.listdir(self._dir))
+
+        self.assertTrue(packSequenceFile(fn, onlyIfSmaller=False) is not None)
+        self.assertFalse(os.path.exists(fn))
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestPackedSequenceArray().debug()
+    unittest.main()
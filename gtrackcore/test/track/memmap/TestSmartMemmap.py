@@ -10,6 +10,7 @@ from gtrackcore.track.memmap.SmartMemmap import SmartMemmap
 
 import gtrackcore.track.memmap.SmartMemmap
 gtrackcore.track.memmap.SmartMemmap.MEMMAP_BIN_SIZE = 100
+gtrackcore.track.memmap.SmartMemmap.MEMMAP_MAX_CACHED_BINS = 2
 
 class TestSmartMemmap(unittest.TestCase):
     def setUp(self):
@@ -48,6 +49,42 @@ class TestSmartMemmap(unittest.TestCase):
         self.assertEqual(m[111], sm[111])
         self.assertEqual(m[189], sm[189])
     
+    def testSliceEndingAtBinBoundary(self):
+        m = self._m
+        sm = self._sm
+        
+        AssertList(m[100:190], sm[100:190], self.assertEqual)
+        AssertList(m[50:100], sm[50:100], self.assertEqual)
+        AssertList(m[50:200], sm[50:200], self.assertEqual)
+        
+    def testCachedBins(self):
+        m = self._m
+        sm = self._sm
+        
+        for i in range(3):
+            self.assertEqual(m[10], sm[10])
+            self.assertEqual(m[110], sm[110])
+        self.assertEqual(2, sm.getNumCachedBins())
+        
+        AssertList(m[80:120], sm[80:120], self.assertEqual)
+        self.assertEqual(2, sm.getNumCachedBins())
+        
+    def testMultiDimElements(self):
+        fn = os.tmpnam()
+        try:
+            m = memmap(fn, dtype='int32', mode='w+', shape=(190, 2))
+            m[:] = array(range(380)).reshape(190, 2)
+            m.flush()
+            
+            sm = SmartMemmap(fn, elementDim=2, dtype='int32', dtypeDim=1, mode='r')
+            assertRowEqual = lambda x, y: self.assertEqual(list(x), list(y))
+            AssertList(m[10:20], sm[10:20], assertRowEqual)
+            AssertList(m[90:110], sm[90:110], assertRowEqual)
+            AssertList(m[110:120], sm[110:120], assertRowEqual)
+            AssertList(m[150], sm[150], self.assertEqual)
+        finally:
+            removeFile(fn)
+    
     def runTest(self):
         pass
     
@@ -0,0 +1,81 @@
+import unittest
+import os
+
+from numpy import array, memmap
+
+from gtrackcore.test.common.FileUtils import removeFile
+from gtrackcore.test.common.Asserts import AssertList
+from gtrackcore.track.memmap.SmartMemmapPool import SmartMemmapPool
+
+import gtrackcore.track.memmap.SmartMemmapPool
+
+class TestSmartMemmapPool(unittest.TestCase):
+    def setUp(self):
+        self._prevMaxFiles = gtrackcore.track.memmap.SmartMemmapPool.MEMMAP_POOL_MAX_FILES
+        gtrackcore.track.memmap.SmartMemmapPool.MEMMAP_POOL_MAX_FILES = 2
+        SmartMemmapPool.clear()
+
+        self._fnList = [os.tmpnam() for i in range(3)]
+        for fn in self._fnList:
+            self._writeFile(fn, 10)
+
+    def tearDown(self):
+        gtrackcore.track.memmap.SmartMemmapPool.MEMMAP_POOL_MAX_FILES = self._prevMaxFiles
+        SmartMemmapPool.clear()
+
+        for fn in self._fnList:
+            removeFile(fn)
+
+    def _writeFile(self, fn, size):
+        m = memmap(fn, dtype='int32', mode='w+', shape=size)
+        m[:] = array(range(size))
+        m.flush()
+        del m
+
+    def testSharedHandle(self):
+        sm1 = SmartMemmapPool.acquire(self._fnList[0], dtype='int32')
+        sm2 = SmartMemmapPool.acquire(self._fnList[0], dtype='int32')
+
+        self.assertTrue(sm1 is sm2)
+        AssertList(range(10), sm1[0:10], self.assertEqual)
+        self.assertEqual(1, SmartMemmapPool.getStats()['hits'])
+        self.assertEqual(1, SmartMemmapPool.getStats()['misses'])
+
+    def testModifiedFile(self):
+        sm1 = SmartMemmapPool.acquire(self._fnList[0], dtype='int32')
+        SmartMemmapPool.release(sm1)
+
+        self._writeFile(self._fnList[0], 20)
+        sm2 = SmartMemmapPool.acquire(self._fnList[0], dtype='int32')
+
+        self.assertFalse(sm1 is sm2)
+        self.assertEqual((20,), sm2.shape)
+        self.assertEqual(1, SmartMemmapPool.getNumOpenFiles())
+
+    def testEviction(self):
+        smList = [SmartMemmapPool.acquire(fn, dtype='int32') for fn in self._fnList]
+        self.assertEqual(3, SmartMemmapPool.getNumOpenFiles())
+
+        SmartMemmapPool.release(smList[1])
+        self.assertEqual(2, SmartMemmapPool.getNumOpenFiles())
+        self.assertEqual(1, SmartMemmapPool.getStats()['evictions'])
+
+        self.assertTrue(smList[0] is SmartMemmapPool.acquire(self._fnList[0], dtype='int32'))
+        self.assertFalse(smList[1] is SmartMemmapPool.acquire(self._fnList[1], dtype='int32'))
+
+    def testInvalidate(self):
+        for fn in self._fnList[:2]:
+            SmartMemmapPool.acquire(fn, dtype='int32')
+
+        SmartMemmapPool.invalidate(self._fnList[0])
+        self.assertEqual(1, SmartMemmapPool.getNumOpenFiles())
+
+        SmartMemmapPool.invalidate(os.path.dirname(self._fnList[1]))
+        self.assertEqual(0, SmartMemmapPool.getNumOpenFiles())
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestSmartMemmapPool().debug()
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+
+from numpy import memmap
+
+from gtrackcore.test.common.FileUtils import removeDirectoryTree
+from gtrackcore.track.memmap.CommonMemmapFunctions import createMemmapFileFn
+from gtrackcore.track.memmap.TrackLayout import TrackLayout
+from gtrackcore.util.CommonFunctions import createDirPath
+
+class TestTrackLayout(unittest.TestCase):
+    GENOME = 'TestGenome'
+    TRACK_NAME = ['TestTrackLayout']
+
+    def setUp(self):
+        TrackLayout.clearCache()
+        self._path = createDirPath(self.TRACK_NAME, self.GENOME, 'chr21', allowOverlaps=False)
+        removeDirectoryTree(self._path)
+        os.makedirs(self._path)
+
+        self._writeFile('start', None, 1, 'int32', 10)
+        self._writeFile('val', 2, 1, 'float64', 10)
+        self._setDirMtime(1000)
+
+    def tearDown(self):
+        TrackLayout.clearCache()
+        removeDirectoryTree(createDirPath(self.TRACK_NAME, self.GENOME, allowOverlaps=False))
+
+    def _writeFile(self, prefix, elementDim, dtypeDim, dtype, size):
+        fn = createMemmapFileFn(self._path, prefix, elementDim, dtypeDim, dtype)
+        shape = (size, elementDim) if elementDim is not None else (size,)
+        m = memmap(fn, dtype=dtype, mode='w+', shape=shape)
+        m.flush()
+        del m
+
+    def _setDirMtime(self, mtime):
+        os.utime(self._path, (mtime, mtime))
+
+    def _getLayout(self):
+        return TrackLayout.getLayout(self.TRACK_NAME, self.GENOME, 'chr21', False)
+
+    def testLayoutContents(self):
+        layout = self._getLayout()
+
+        self.assertEqual('chr21', layout.chr)
+        self.assertEqual(self._path, layout.dirPath)
+        self.assertEqual(None, layout.boundingRegionShelve)
+        self.assertEqual(set(['start', 'val']), set(layout.fileInfos.keys()))
+        self.assertEqual((10,), layout.fileInfos['start'].shape)
+        self.assertEqual((10, 2), layout.fileInfos['val'].shape)
+        self.assertEqual('float64', layout.fileInfos['val'].dtype)
+        self.assertEqual([], layout.extraPrefixes)
+
+    def testLayoutCaching(self):
+        layout = self._getLayout()
+        self.assertTrue(layout is self._getLayout())
+
+        self._writeFile('a', None, 1, 'S3', 10)
+        self._setDirMtime(2000)
+
+        newLayout = self._getLayout()
+        self.assertFalse(layout is newLayout)
+        self.assertEqual(['a'], newLayout.extraPrefixes)
+
+    def testLayoutCachingFileGrown(self):
+        layout = self._getLayout()
+
+        # The mtime of the directory does not change when a file grows in
+        # place, so the writer must clear the cache
+        fn = layout.fileInfos['start'].fn
+        with open(fn, 'ab') as f:
+            f.write('\0' * 4 * 5)
+        self._setDirMtime(1000)
+        self.assertTrue(layout is self._getLayout())
+
+        TrackLayout.clearCache()
+        self.assertEqual((15,), self._getLayout().fileInfos['start'].shape)
+
+    def runTest(self):
+        pass
+
+if __name__ == "__main__":
+    #TestTrackLayout().debug()
+    unittest.main()
@@ -105,6 +105,24 @@ class TestTrackViewLoader(TestCaseWithImprovedAsserts):
         self._assertTrackViewLoading_Segments(trackData, [], 300, 300)
         self._assertTrackViewLoading_Segments(trackData, [], 400, 400)
         
+    def testLoadTrackViews_Segments(self):
+        trackData = TrackData({'start' : [10, 210, 260, 410],\
+                               'end' : [20, 240, 310, 710],\
+                               'val' : list(getRandValList(4)),\
+                               'leftIndex' : [0, 1, 1, 1, 3, 3, 3, 3, 4],\
+                               'rightIndex' : [1, 1, 3, 3, 4, 4, 4, 4, 4]})
+        
+        regions = [GenomeRegion(genome='TestGenome', start=start, end=end) for start, end in \
+                   [(0, 100), (200, 300), (0, 900), (310, 410), (0, 0), (400, 400)]]
+        trackViews = self.trackViewLoader.loadTrackViews(trackData, regions, 'crop', False)
+        
+        for region, trackView in zip(regions, trackViews):
+            expTrackView = self.trackViewLoader.loadTrackView(trackData, region, 'crop', False)
+            self.assertEqual(region, trackView.genomeAnchor)
+            self.assertListsOrDicts([el.start() for el in expTrackView], [el.start() for el in trackView])
+            self.assertListsOrDicts([el.end() for el in expTrackView], [el.end() for el in trackView])
+            self.assertListsOrDicts([el.val() for el in expTrackView], [el.val() for el in trackView])
+        
     def runTest(self):
         self.testLoadTrackView_Numbers()
     
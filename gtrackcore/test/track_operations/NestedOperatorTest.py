@@ -6,11 +6,16 @@ from gtrackcore.track_operations.operations.Union import Union
 from gtrackcore.track_operations.operations.Flank import Flank
 from gtrackcore.track_operations.operations.Expand import Expand
 from gtrackcore.track_operations.operations.ValueSelect import ValueSelect
+from gtrackcore.track_operations.operations.Intersect import Intersect
+from gtrackcore.track_operations.operations.Merge import Merge
+from gtrackcore.track_operations.operations.CountElements import CountElements
 
 
 from gtrackcore.metadata import GenomeInfo
 from gtrackcore.track.core.GenomeRegion import GenomeRegion
+from gtrackcore.track_operations.Genome import Genome
 from gtrackcore.track_operations.TrackContents import TrackContents
+from gtrackcore.track_operations.TrackContents import LazyTrackContents
 from gtrackcore.test.track_operations.TestUtils import createTrackView
 
 from gtrackcore.test.track_operations.TestUtils import \
@@ -159,6 +164,89 @@ class NestedOperatorTest(unittest.TestCase):
         self._runNestedTest(u, expStarts=[5,18], expEnds=[10,30])
 
 
+    def _createTwoChrTrackContent(self, genome, chr1Segments, chr2Segments):
+        trackViews = OrderedDict()
+        for region, segments in zip(genome.regions,
+                                    [chr1Segments, chr2Segments]):
+            trackViews[region] = createTrackView(
+                region, startList=np.array([s for s, e in segments],
+                                           dtype='int32'),
+                endList=np.array([e for s, e in segments], dtype='int32'))
+        return TrackContents(genome, trackViews)
+
+    def _getSegments(self, trackContents):
+        return [(r.chr, list(tv.startsAsNumpyArray()),
+                 list(tv.endsAsNumpyArray()))
+                for r, tv in trackContents.iterTrackViews()]
+
+    def testLazyCalculation(self):
+        """
+        Test that a streamed calculation gives the same result as a full
+        calculation, also when a nested result is empty in a region.
+        :return: None
+        """
+        genome = Genome('hg19', OrderedDict([('chr1', 1000), ('chr2', 500)]))
+        track1 = self._createTwoChrTrackContent(genome, [(2, 4), (20, 30)],
+                                                [(5, 8)])
+        track2 = self._createTwoChrTrackContent(genome, [(3, 6)], [])
+        track3 = self._createTwoChrTrackContent(genome, [(25, 40)],
+                                                [(100, 200)])
+
+        for createOperation in [lambda: Union(Union(track1, track2), track3),
+                                lambda: Merge(Intersect(track1, track2))]:
+            eager = createOperation().calculate()
+            lazy = createOperation().calculate(lazy=True)
+
+            self.assertTrue(isinstance(lazy, LazyTrackContents))
+            self.assertEqual(genome.regions, lazy.regions)
+            self.assertEqual(self._getSegments(eager),
+                             self._getSegments(lazy))
+
+        self.assertEqual([('chr1', [2, 20], [6, 40]),
+                          ('chr2', [5, 100], [8, 200])],
+                         self._getSegments(
+                             Union(Union(track1, track2), track3).calculate(
+                                 lazy=True)))
+
+        counts = CountElements(Union(track1, track3)).calculate(lazy=True)
+        self.assertEqual([2, 2], counts.values())
+
+    def testParallelCalculation(self):
+        """
+        Test that calculating the regions in worker processes gives the
+        same result, in the same region order, as a calculation in this
+        process.
+        :return: None
+        """
+        genome = Genome('hg19', OrderedDict([('chr2', 500), ('chr1', 1000),
+                                             ('chr3', 200)]))
+        segments = [[(5, 8), (300, 310)], [(2, 4), (20, 30)], []]
+        trackViews = OrderedDict()
+        for region, regionSegments in zip(genome.regions, segments):
+            trackViews[region] = createTrackView(
+                region, startList=np.array([s for s, e in regionSegments],
+                                           dtype='int32'),
+                endList=np.array([e for s, e in regionSegments],
+                                 dtype='int32'))
+        track1 = TrackContents(genome, trackViews)
+        track2 = TrackContents(genome, OrderedDict(
+            (region, createTrackView(region,
+                                     startList=np.array([3], dtype='int32'),
+                                     endList=np.array([6], dtype='int32')))
+            for region in genome.regions))
+
+        eager = Union(Merge(track1), track2).calculate()
+        parallel = Union(Merge(track1), track2).calculate(workers=2)
+
+        self.assertTrue(isinstance(parallel, TrackContents))
+        self.assertEqual(self._getSegments(eager), self._getSegments(parallel))
+        self.assertEqual([('chr2', [3, 300], [8, 310]),
+                          ('chr1', [2, 20], [6, 30]),
+                          ('chr3', [3], [6])], self._getSegments(parallel))
+
+        counts = CountElements(Union(track1, track2)).calculate(workers=3)
+        self.assertEqual([2, 2, 1], counts.values())
+
 
 if __name__ == "__main__":
     unittest.main()
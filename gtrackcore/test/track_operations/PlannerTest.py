@@ -0,0 +1,109 @@
+import unittest
+import numpy as np
+from collections import OrderedDict
+
+from gtrackcore.track_operations.operations.Intersect import Intersect
+from gtrackcore.track_operations.operations.Merge import Merge
+from gtrackcore.track_operations.operations.Shift import Shift
+from gtrackcore.track_operations.operations.Expand import Expand
+from gtrackcore.track_operations.operations.Flank import Flank
+from gtrackcore.track_operations.Genome import Genome
+from gtrackcore.track_operations.Planner import Planner
+from gtrackcore.track_operations.TrackContents import TrackContents
+from gtrackcore.test.track_operations.TestUtils import createTrackView
+
+
+class PlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.genome = Genome('hg19', OrderedDict([('chr1', 1000),
+                                                  ('chr2', 500)]))
+        self.track1 = self._createTrackContents([[(2, 4), (20, 30),
+                                                  (100, 150)], [(5, 8)]])
+        self.track2 = self._createTrackContents([[(3, 6), (25, 120)],
+                                                 [(1, 50)]])
+
+    def _createTrackContents(self, segmentsPerRegion):
+        trackViews = OrderedDict()
+        for region, segments in zip(self.genome.regions, segmentsPerRegion):
+            trackViews[region] = createTrackView(
+                region, startList=np.array([s for s, e in segments],
+                                           dtype='int32'),
+                endList=np.array([e for s, e in segments], dtype='int32'))
+        return TrackContents(self.genome, trackViews)
+
+    def _getSegments(self, trackContents):
+        return [(r.chr, list(tv.startsAsNumpyArray()),
+                 list(tv.endsAsNumpyArray()))
+                for r, tv in trackContents.iterTrackViews()]
+
+    def _createSharedOperation(self):
+        return Merge(Intersect(
+            Merge(Intersect(self.track1, self.track2)),
+            Expand(Shift(Merge(Intersect(self.track1, self.track2)),
+                         shiftLength=5, useFraction=False,
+                         resultAllowOverlap=True),
+                   both=3, resultAllowOverlap=True)))
+
+    def testSharedOperations(self):
+        planned = Planner(self._createSharedOperation()).createOperation()
+        shared = planned._inputTracks[0]._inputTracks[0]
+        expand = planned._inputTracks[0]._inputTracks[1]
+        self.assertTrue(isinstance(shared, Merge))
+        self.assertTrue(shared is expand._inputTracks[0])
+        self.assertEqual([Shift], [op.__class__ for op in
+                                   expand._fusedOperations])
+
+        self.assertEqual('\n'.join([
+            "Merge()",
+            "  Intersect()",
+            "    Merge() [shared #1]",
+            "      Intersect()",
+            "        Track #0",
+            "        Track #1",
+            "    Expand(resultAllowOverlap=True, both=3) <- "
+            "Shift(resultAllowOverlap=True, shiftLength=5, "
+            "useFraction=False) [fused]",
+            "      Merge() [shared #1] (reused)"]),
+            self._createSharedOperation().explain())
+
+        expected = [('chr1', [27, 102], [30, 120]), ('chr2', [7], [8])]
+        self.assertEqual(expected, self._getSegments(
+            self._createSharedOperation().calculate()))
+        for kwargs in [{}, {'lazy': True}, {'workers': 2}]:
+            self.assertEqual(expected, self._getSegments(
+                self._createSharedOperation().calculate(plan=True,
+                                                        **kwargs)))
+
+    def testFusedTransforms(self):
+        def createOperation(resultAllowOverlap):
+            return Flank(Expand(Shift(self.track1, shiftLength=5,
+                                      useFraction=False,
+                                      resultAllowOverlap=True),
+                                both=3,
+                                resultAllowOverlap=resultAllowOverlap),
+                         both=2)
+
+        # The result of an Expand without overlap is merged, and the Expand
+        # can not be fused into the Flank.
+        for resultAllowOverlap, numFused in [(True, 2), (False, 0)]:
+            planned = Planner(
+                createOperation(resultAllowOverlap)).createOperation()
+            self.assertEqual(numFused, len(planned._fusedOperations))
+
+            self.assertEqual(
+                self._getSegments(
+                    createOperation(resultAllowOverlap).calculate()),
+                self._getSegments(
+                    createOperation(resultAllowOverlap).calculate(
+                        plan=True)))
+
+        self.assertEqual([('chr1', [2, 12, 20, 38, 100, 158],
+                           [4, 14, 22, 40, 102, 160]),
+                          ('chr2', [5, 16], [7, 18])],
+                         self._getSegments(
+                             createOperation(True).calculate(plan=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from collections import OrderedDict
+
+from gtrackcore.core.Config import Config
+from gtrackcore.metadata.TrackInfo import TrackInfo
+from gtrackcore.track_operations.operations.Union import Union
+from gtrackcore.track_operations.operations.Merge import Merge
+from gtrackcore.track_operations.operations.CountElements import CountElements
+from gtrackcore.track_operations.Genome import Genome
+from gtrackcore.track_operations.TrackContents import TrackContents
+from gtrackcore.track_operations.utils.ResultCache import ResultCache
+from gtrackcore.track_operations.utils.ResultCache import getTrackContentsKey
+from gtrackcore.test.track_operations.TestUtils import createTrackView
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+        self._prevPath = Config.OPERATION_RESULT_CACHE_PATH
+        self._prevMaxBytes = Config.OPERATION_RESULT_CACHE_MAX_BYTES
+        Config.OPERATION_RESULT_CACHE_PATH = self._path
+        Config.OPERATION_RESULT_CACHE_MAX_BYTES = 10 ** 8
+
+        self.genome = Genome('hg19', OrderedDict([('chr1', 1000),
+                                                  ('chr2', 500)]))
+
+    def tearDown(self):
+        Config.OPERATION_RESULT_CACHE_PATH = self._prevPath
+        Config.OPERATION_RESULT_CACHE_MAX_BYTES = self._prevMaxBytes
+        shutil.rmtree(self._path)
+
+    def _createTrackContents(self, segmentsPerRegion, trackName=None):
+        trackViews = OrderedDict()
+        for region, segments in zip(self.genome.regions, segmentsPerRegion):
+            trackViews[region] = createTrackView(
+                region, startList=np.array([s for s, e in segments],
+                                           dtype='int32'),
+                endList=np.array([e for s, e in segments], dtype='int32'))
+        return TrackContents(self.genome, trackViews, trackName=trackName)
+
+    def _getSegments(self, trackContents):
+        return [(r.chr, list(tv.startsAsNumpyArray()),
+                 list(tv.endsAsNumpyArray()))
+                for r, tv in trackContents.iterTrackViews()]
+
+    def _getEntries(self):
+        return [fn for fn in os.listdir(self._path) if not fn.startswith('.')]
+
+    def testRepeatedOperation(self):
+        track1 = self._createTrackContents([[(2, 4), (20, 30)], [(5, 8)]])
+        track2 = self._createTrackContents([[(3, 6)], []])
+
+        result = Union(track1, track2).calculate()
+        self.assertEqual(2, len(self._getEntries()))
+
+        cached = Union(track1, track2).calculate()
+        self.assertEqual(self._getSegments(result), self._getSegments(cached))
+        self.assertTrue(isinstance(cached.getTrackView(
+            self.genome.regions[0])._startList, np.memmap))
+        self.assertEqual(2, len(self._getEntries()))
+
+        # Nested operations and results that are not tracks
+        counts = CountElements(Merge(track1)).calculate()
+        self.assertEqual(counts.values(),
+                         CountElements(Merge(track1)).calculate().values())
+
+        # Changed input or options
+        track3 = self._createTrackContents([[(3, 7)], []])
+        self.assertNotEqual(Union(track1, track2).getCacheKey(),
+                            Union(track1, track3).getCacheKey())
+        self.assertNotEqual(Union(track1, track2).getCacheKey(),
+                            Union(track1, track2,
+                                  useStrands=False).getCacheKey())
+        self.assertEqual([('chr1', [2, 20], [7, 30]), ('chr2', [5], [8])],
+                         self._getSegments(Union(track1, track3).calculate()))
+
+    def testEviction(self):
+        track = self._createTrackContents([[(2, 4), (20, 30)], [(5, 8)]])
+        cache = ResultCache(maxBytes=10 ** 8)
+        for i in range(3):
+            cache.store('key%d' % i, track)
+            os.utime(os.path.join(self._path, 'key%d' % i, 'index.pickle'),
+                     (i, i))
+        self.assertEqual(['key0', 'key1', 'key2'], sorted(self._getEntries()))
+
+        # Loading a result marks it as recently used
+        self.assertEqual(self._getSegments(track),
+                         self._getSegments(cache.load('key0')))
+        entrySize = sum(os.path.getsize(os.path.join(self._path, 'key0', fn))
+                        for fn in os.listdir(os.path.join(self._path, 'key0')))
+
+        cache = ResultCache(maxBytes=2 * entrySize)
+        cache.store('key3', track)
+        self.assertEqual(['key0', 'key3'], sorted(self._getEntries()))
+        self.assertEqual(None, cache.load('key1'))
+
+    def testPreProcessedTrackKey(self):
+        trackName = ['ResultCacheTest', 'track']
+        track = self._createTrackContents([[(2, 4)], []],
+                                          trackName=trackName)
+        trackInfo = TrackInfo(self.genome.name, trackName)
+        try:
+            trackInfo.id = 'id1'
+            trackInfo.timeOfPreProcessing = 1
+            trackInfo.store()
+            key = getTrackContentsKey(track)
+
+            # The key does not depend on the contents of a preprocessed track
+            self.assertEqual(key, getTrackContentsKey(
+                self._createTrackContents([[(2, 5)], []],
+                                          trackName=trackName)))
+
+            trackInfo.timeOfPreProcessing = 2
+            trackInfo.store()
+            self.assertNotEqual(key, getTrackContentsKey(track))
+        finally:
+            trackInfo.removeEntryFromShelve()
+
+
+if __name__ == "__main__":
+    unittest.main()
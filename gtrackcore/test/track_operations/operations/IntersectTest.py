@@ -4,6 +4,9 @@ import numpy as np
 from collections import OrderedDict
 
 from gtrackcore.track_operations.operations.Intersect import Intersect
+from gtrackcore.track_operations.raw_operations.Intersect import intersect
+from gtrackcore.track_operations.exeptions.Operations import \
+    InvalidArgumentError
 from gtrackcore.metadata import GenomeInfo
 from gtrackcore.track.core.GenomeRegion import GenomeRegion
 from gtrackcore.track_operations.TrackContents import TrackContents
@@ -27,8 +30,8 @@ class IntersectTest(unittest.TestCase):
                  t1Weights=None, t2Weights=None, expStarts=None, expEnds=None,
                  expValues=None, expStrands=None, expIds=None, expEdges=None,
                  expWeights=None, expNoResult=False, customChrLength=None,
-                 resultAllowOverlap=True,
-                 debug=False, expTrackFormatType=None):
+                 resultAllowOverlap=True, useStrands=False, minOverlap=None,
+                 treatMissingAsNegative=False, debug=False, expTrackFormatType=None):
 
         t1 = createSimpleTestTrackContent(startList=t1Starts, endList=t1Ends,
                                           valList=t1Vals, strandList=t1Strands,
@@ -43,6 +46,8 @@ class IntersectTest(unittest.TestCase):
                                           customChrLength=customChrLength)
 
         i = Intersect(t1, t2, resultAllowOverlap=resultAllowOverlap,
+                      useStrands=useStrands, minOverlap=minOverlap,
+                      treatMissingAsNegative=treatMissingAsNegative,
                       debug=debug)
 
         result = i.calculate()
@@ -274,6 +279,87 @@ class IntersectTest(unittest.TestCase):
                       t2Ends=[8],  expStarts=[3, 6], expEnds=[4,8],
                       expTrackFormatType="Segments")
 
+    def testMinOverlap(self):
+        """
+        Only segments in A covered by at least minOverlap are kept
+        :return:
+        """
+        self._runTest(t1Starts=[2,10,30], t1Ends=[6,20,40],
+                      t2Starts=[3,12,18,38], t2Ends=[8,15,25,50],
+                      minOverlap=0.5, expStarts=[3,12,18], expEnds=[6,15,20],
+                      expTrackFormatType="Segments")
+
+    def testOverlappingSegments(self):
+        """
+        Overlapping segments in A
+        :return:
+        """
+        self._runTest(t1Starts=[2,4], t1Ends=[10,6], t2Starts=[5],
+                      t2Ends=[8], expStarts=[5,6], expEnds=[6,8],
+                      expTrackFormatType="Segments")
+
+    # **** Strands ****
+
+    def testStrands(self):
+        """
+        Only segments on the same strand are intersected. Strands are
+        stored as int8, 1 = '+', 0 = '-' and -1 = '.'
+        :return:
+        """
+        self._runTest(t1Starts=[10,100,300], t1Ends=[50,200,400],
+                      t1Strands=np.array([1,1,0], dtype='int8'),
+                      t2Starts=[20,150,350], t2Ends=[30,160,360],
+                      t2Strands=np.array([1,0,1], dtype='int8'),
+                      useStrands=True, expStarts=[20], expEnds=[30],
+                      expStrands=np.array([1], dtype='int8'),
+                      expTrackFormatType="Segments")
+
+    def testStrandsIgnored(self):
+        """
+        Strands are ignored without useStrands
+        :return:
+        """
+        self._runTest(t1Starts=[10,100,300], t1Ends=[50,200,400],
+                      t1Strands=np.array([1,1,0], dtype='int8'),
+                      t2Starts=[20,150,350], t2Ends=[30,160,360],
+                      t2Strands=np.array([1,0,1], dtype='int8'),
+                      useStrands=False, expStarts=[20,150,350],
+                      expEnds=[30,160,360],
+                      expStrands=np.array([1,1,0], dtype='int8'),
+                      expTrackFormatType="Segments")
+
+    def testStrandsMissing(self):
+        """
+        Missing strands are positive, or negative with
+        treatMissingAsNegative
+        :return:
+        """
+        self._runTest(t1Starts=[10,100], t1Ends=[50,200],
+                      t1Strands=np.array([-1,-1], dtype='int8'),
+                      t2Starts=[20,150], t2Ends=[30,160],
+                      t2Strands=np.array([1,0], dtype='int8'),
+                      useStrands=True, expStarts=[20], expEnds=[30],
+                      expStrands=np.array([-1], dtype='int8'),
+                      expTrackFormatType="Segments")
+        self._runTest(t1Starts=[10,100], t1Ends=[50,200],
+                      t1Strands=np.array([-1,-1], dtype='int8'),
+                      t2Starts=[20,150], t2Ends=[30,160],
+                      t2Strands=np.array([1,0], dtype='int8'),
+                      useStrands=True, treatMissingAsNegative=True,
+                      expStarts=[150], expEnds=[160],
+                      expStrands=np.array([-1], dtype='int8'),
+                      expTrackFormatType="Segments")
+
+    def testInvalidMinOverlap(self):
+        """
+        minOverlap must be between 0 and 1
+        :return:
+        """
+        for minOverlap in [-0.1, 1.5]:
+            self.assertRaises(InvalidArgumentError, intersect,
+                              np.array([2]), np.array([6]), np.array([3]),
+                              np.array([8]), minOverlap=minOverlap)
+
     # **** Values/Links ****
 
     def testValues(self):
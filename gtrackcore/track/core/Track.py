@@ -1,3 +1,5 @@
+from itertools import groupby, izip
+
 from gtrackcore.metadata.TrackInfo import TrackInfo
 from gtrackcore.track.hierarchy.ExternalTrackManager import ExternalTrackManager
 from gtrackcore.track.format.AllFormatConverters import getFormatConverters, getFormatConverterByName
@@ -30,6 +32,13 @@ class Track(object):
         trackData = self._trackSource.getTrackData(self.trackName, region.genome, region.chr, allowOverlaps)
         return self._trackViewLoader.loadTrackView(trackData, region, borderHandling, allowOverlaps, self.trackName)
     
+    def _getRawTrackViews(self, regions, borderHandling, allowOverlaps):
+        for (genome, chr), chrRegions in groupby(regions, key=lambda region: (region.genome, region.chr)):
+            chrRegions = list(chrRegions)
+            trackData = self._trackSource.getTrackData(self.trackName, genome, chr, allowOverlaps)
+            for trackView in self._trackViewLoader.loadTrackViews(trackData, chrRegions, borderHandling, allowOverlaps, self.trackName):
+                yield trackView
+    
     def getTrackView(self, region):
         allowOverlaps = self._trackFormatReq.allowOverlaps()
         borderHandling = self._trackFormatReq.borderHandling()
@@ -37,7 +46,25 @@ class Track(object):
         assert(borderHandling is not None) 
         
         origTrackView = self._getRawTrackView(region, borderHandling, allowOverlaps)
+        return self._convertTrackView(origTrackView)
+    
+    def getTrackViews(self, regions):
+        """
+        Returns a generator of (region, TrackView) pairs for a list of regions.
+        The regions are sorted by genome, chromosome and position, and the
+        pairs are yielded lazily in this order. Track data and bounding region
+        lookups are shared between regions of the same chromosome.
+        """
+        allowOverlaps = self._trackFormatReq.allowOverlaps()
+        borderHandling = self._trackFormatReq.borderHandling()
+        assert(allowOverlaps is not None) 
+        assert(borderHandling is not None) 
         
+        sortedRegions = sorted(regions)
+        for region, origTrackView in izip(sortedRegions, self._getRawTrackViews(sortedRegions, borderHandling, allowOverlaps)):
+            yield region, self._convertTrackView(origTrackView)
+    
+    def _convertTrackView(self, origTrackView):
         if self.formatConverters is None:
             self.formatConverters = getFormatConverters(origTrackView.trackFormat, self._trackFormatReq)
         
@@ -105,6 +132,10 @@ class VirtualMinimalTrack(Track):
     def __new__(cls):
         return object.__new__(cls)
 
+    def _getRawTrackViews(self, regions, borderHandling, allowOverlaps):
+        for region in regions:
+            yield self._getRawTrackView(region, borderHandling, allowOverlaps)
+
     def _getRawTrackView(self, region, borderHandling, allowOverlaps):
         assert len(region) == 1
         
@@ -8,6 +8,7 @@ from copy import copy
 from gtrackcore.core.LogSetup import logMessageOnce
 from gtrackcore.track.core.GenomeRegion import GenomeRegion
 from gtrackcore.track.core.VirtualPointEnd import VirtualPointEnd
+from gtrackcore.track.core.VirtualNumpyArray import VirtualNumpyArray
 from gtrackcore.track.format.TrackFormat import TrackFormat
 from gtrackcore.util.CommonFunctions import getClassName
 from gtrackcore.util.CustomExceptions import ShouldNotOccurError
@@ -381,12 +382,27 @@ class TrackView(object):
             return None
 
         numpyArray = self._removeBlindPassengersFromNumpyArray(numpyArray)
+        if isinstance(numpyArray, VirtualNumpyArray):
+            numpyArray = numpyArray.asNumpyArray()
 
         if numpyArrayModMethod is not None:
             return numpyArrayModMethod(numpyArray)
         else:
             return numpyArray
 
+    def getTrackElement(self, index):
+        '''
+        Returns a new track element for the element at the given index of the
+        lists, independent of the element used for iteration.
+        '''
+        trackElement = TrackElement.__new__(TrackElement)
+        trackElement.__dict__.update(self._trackElement.__dict__)
+        trackElement._index = index
+        return trackElement
+
+    def elementIndexesAsNumpyArray(self):
+        return self._removeBlindPassengersFromNumpyArray(numpy.arange(self._numListElements))
+
     def startsAsNumpyArray(self):
         return self._commonAsNumpyArray(self._startList, self._startListModMethod, 'starts')
 
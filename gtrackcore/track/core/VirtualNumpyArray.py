@@ -6,6 +6,11 @@ class VirtualNumpyArray(object):
     def cacheNumpyArray(self):
         self._cachedNumpyArray = self._asNumpyArray()
 
+    def asNumpyArray(self):
+        if self._cachedNumpyArray is None:
+            self.cacheNumpyArray()
+        return self._cachedNumpyArray
+
     def __getattr__(self, name):
         if self._cachedNumpyArray is None:
             self.cacheNumpyArray()
@@ -1,7 +1,8 @@
 import os
+import sys
+import numpy
 
 from collections import namedtuple, OrderedDict
-from bisect import bisect_right
 
 import gtrackcore.third_party.safeshelve as safeshelve
 
@@ -16,10 +17,13 @@ BoundingRegionInfo = namedtuple('BoundingRegionInfo', \
                                 ['start', 'end', 'startIdx', 'endIdx', 'startBinIdx', 'endBinIdx'])
 BrInfoHolder = namedtuple('BrInfoHolder', ['brStarts', 'brInfos'])
 
+BR_INDEX_FILE_NAME = 'boundingRegions.index'
 BR_SHELVE_FILE_NAME = 'boundingRegions.shelve'
 
+BR_INDEX_DTYPE = numpy.dtype([(field, 'int64') for field in BoundingRegionInfo._fields])
+
 def isBoundingRegionFileName(fn):
-    return fn == BR_SHELVE_FILE_NAME
+    return fn == BR_INDEX_FILE_NAME or fn.startswith(BR_SHELVE_FILE_NAME)
     
 class BoundingRegionShelve(object):
     def __init__(self, genome, trackName, allowOverlaps):
@@ -28,16 +32,24 @@ class BoundingRegionShelve(object):
         self._genome = genome
         self._trackName = trackName
         
-        self._fn = createDirPath(trackName, genome, allowOverlaps=allowOverlaps) + os.sep + BR_SHELVE_FILE_NAME
-        self._contents = {} #None
-        self._updatedChrs = set([])
+        path = createDirPath(trackName, genome, allowOverlaps=allowOverlaps)
+        self._fn = path + os.sep + BR_INDEX_FILE_NAME
+        self._legacyShelveFn = path + os.sep + BR_SHELVE_FILE_NAME
+        
+        self._brIndex = None
+        self._chrRows = None
+        self._chrStarts = {}
         
         from gtrackcore.input.userbins.UserBinSource import MinimalBinSource
         minimalBinList = MinimalBinSource(genome)
         self._minimalRegion = minimalBinList[0] if minimalBinList is not None else None
         
     def fileExists(self):
-        return os.path.exists(self._fn)
+        return os.path.exists(self._fn) or self.legacyShelveExists()
+    
+    def legacyShelveExists(self):
+        #Depending on the dbm module, shelve files may be stored with a suffix
+        return any(os.path.exists(self._legacyShelveFn + suffix) for suffix in ['', '.db', '.dir'])
 
     def storeBoundingRegions(self, boundingRegionTuples, genomeElementChrList, sparse):
         assert sparse in [False, True]
@@ -108,56 +120,107 @@ class BoundingRegionShelve(object):
         if len(genomeElementChrs - set(tempContents.keys())) > 0:
             raise InvalidFormatError('Error: some chromosomes (sequences) contains data, but has no bounding regions: %s' % ', '.join(genomeElementChrs - set(tempContents.keys())))
         
+        self._writeIndex(tempContents)
+    
+    def _writeIndex(self, brInfosPerChr):
+        chrs = brInfosPerChr.keys()
+        chrRows = numpy.zeros(len(chrs), dtype=[('chr', 'S%s' % max([1] + [len(chr) for chr in chrs])), \
+                                                ('startRow', 'int64'), ('endRow', 'int64')])
+        brIndex = numpy.zeros(sum(len(brInfos) for brInfos in brInfosPerChr.values()), dtype=BR_INDEX_DTYPE)
+        
+        row = 0
+        for i, chr in enumerate(chrs):
+            brInfos = brInfosPerChr[chr].values()
+            chrRows[i] = (chr, row, row + len(brInfos))
+            for brInfo in brInfos:
+                brIndex[row] = tuple(brInfo)
+                row += 1
+        
+        #The index file contains two arrays in npy format: the rows of each
+        #chromosome, followed by the bounding region infos of all chromosomes
         ensurePathExists(self._fn)
+        tempFn = os.path.dirname(self._fn) + os.sep + '.' + os.path.basename(self._fn) + '.tmp'
+        with open(tempFn, 'wb') as tempFile:
+            numpy.save(tempFile, chrRows)
+            numpy.save(tempFile, brIndex)
+        os.rename(tempFn, self._fn)
         
-        for chr in tempContents:
-            brInfoDict = tempContents[chr]
-            tempContents[chr] = BrInfoHolder(tuple(brInfoDict.keys()), tuple(brInfoDict.values()))
+        self._brIndex = None
+        self._chrStarts = {}
+    
+    def _readLegacyShelve(self):
+        brShelve = safeshelve.open(self._legacyShelveFn, 'r')
+        try:
+            brInfosPerChr = OrderedDict()
+            for chr in brShelve.keys():
+                brInfoHolder = brShelve[chr]
+                
+                #Old preprocessed boundingRegion.shelve files store dicts with start as key
+                if isinstance(brInfoHolder, dict):
+                    brInfos = [brInfoHolder[brStart] for brStart in sorted(brInfoHolder.keys())]
+                else:
+                    brInfos = brInfoHolder.brInfos
+                
+                brInfosPerChr[chr] = OrderedDict((brInfo.start, brInfo) for brInfo in brInfos)
+        finally:
+            brShelve.close()
         
-        brShelve = safeshelve.open(self._fn)
-        brShelve.update(tempContents)
-        brShelve.close()
+        return brInfosPerChr
+    
+    def migrateLegacyShelve(self):
+        self._writeIndex(self._readLegacyShelve())
+    
+    def _loadIndexIfNecessary(self):
+        if self._brIndex is not None:
+            return
         
-        while not self.fileExists():
-            from gtrackcore.application.LogSetup import logMessage
-            logMessage("Bounding region shelve file '%s' has yet to be created" % self._fn)
-            import time
-            time.sleep(0.2)
+        if os.path.exists(self._fn):
+            chrRows, brIndex = self._readIndex()
+        elif self.legacyShelveExists():
+            brInfosPerChr = self._readLegacyShelve()
+            chrRows, brIndex = [], []
+            for chr, brInfos in brInfosPerChr.iteritems():
+                chrRows.append((chr, len(brIndex), len(brIndex) + len(brInfos)))
+                brIndex += [tuple(brInfo) for brInfo in brInfos.values()]
+            brIndex = numpy.array(brIndex, dtype=BR_INDEX_DTYPE)
+        else:
+            chrRows, brIndex = [], numpy.zeros(0, dtype=BR_INDEX_DTYPE)
+        
+        self._chrRows = dict((str(chr), (int(startRow), int(endRow))) for chr, startRow, endRow in chrRows)
+        self._brIndex = brIndex
     
-    def _updateContentsIfNecessary(self, chr):
-        #if self._contents is None:
-        #    self._contents = {}
-        #    if self.fileExists():
-        #        self._contents.update(safeshelve.open(self._fn, 'r'))
-        if not chr in self._updatedChrs:
-            if self.fileExists():
-                brListForChr = safeshelve.open(self._fn, 'r').get(chr)
-                if brListForChr is not None:
-                    self._contents[chr] = brListForChr
-            self._updatedChrs.add(chr)
+    def _readIndex(self):
+        with open(self._fn, 'rb') as indexFile:
+            chrRows = numpy.lib.format.read_array(indexFile)
+            numpy.lib.format.read_magic(indexFile)
+            shape, fortranOrder, dtype = numpy.lib.format.read_array_header_1_0(indexFile)
+            offset = indexFile.tell()
+        
+        if shape[0] > 0:
+            brIndex = numpy.memmap(self._fn, dtype=dtype, mode='r', offset=offset, shape=shape)
+        else:
+            brIndex = numpy.zeros(0, dtype=BR_INDEX_DTYPE)
+        return chrRows, brIndex
+    
+    def _getBrRowsForChr(self, chr):
+        self._loadIndexIfNecessary()
+        return self._chrRows.get(chr)
+    
+    def _getBrInfo(self, row):
+        return BoundingRegionInfo(*[int(x) for x in self._brIndex[row]])
     
     def getBoundingRegionInfo(self, region):
-        self._updateContentsIfNecessary(region.chr)
+        brRows = self._getBrRowsForChr(region.chr)
         
-        if region.chr in self._contents:
-            brInfoHolder = self._contents[region.chr]
+        if brRows is not None:
+            startRow, endRow = brRows
+            if region.chr not in self._chrStarts:
+                self._chrStarts[region.chr] = self._brIndex['start'][startRow:endRow]
             
-            #Temporary, to store old preprocessed boundingRegion.shelve files
-            isDict = isinstance(brInfoHolder, dict)
-            if isDict:
-                brStarts = brInfoHolder.keys()
-            else:
-                brStarts = brInfoHolder.brStarts
-                
-            #idx = self._contents[region.chr].keys().bisect_right(region.start)
-            idx = bisect_right(brStarts, region.start)
+            idx = self._chrStarts[region.chr].searchsorted(region.start, side='right')
             
             if idx > 0:
-                if isDict:
-                    brInfo = brInfoHolder[brStarts[idx-1]]
-                else:
-                    brInfo = brInfoHolder.brInfos[idx-1]
-                
+                brInfo = self._getBrInfo(startRow + idx - 1)
                 if region.start < brInfo.end and region.end <= brInfo.end:
                     return brInfo
                     
@@ -173,17 +236,23 @@ class BoundingRegionShelve(object):
         return BoundingRegionInfo(region.start, region.end, 0, 0, 0, 0)
         
         
+    def getBoundingRegionInfosPerChr(self):
+        '''
+        Returns the bounding region infos of all chromosomes in the index, in
+        the order of the index.
+        '''
+        self._loadIndexIfNecessary()
+        brInfosPerChr = OrderedDict()
+        for chr, (startRow, endRow) in sorted(self._chrRows.iteritems(), key=lambda item: item[1]):
+            brInfosPerChr[chr] = [self._getBrInfo(row) for row in xrange(startRow, endRow)]
+        return brInfosPerChr
+        
     def getTotalElementCountForChr(self, chr):
-        self._updateContentsIfNecessary(chr)
+        brRows = self._getBrRowsForChr(chr)
         
-        if chr in self._contents:
-            #Temporary
-            brInfoHolder = self._contents[chr]
-            if isinstance(brInfoHolder, dict):
-                brInfosForChr = brInfoHolder.values()
-            else:
-                brInfosForChr = brInfoHolder.brInfos
-            return brInfosForChr[-1].endIdx - brInfosForChr[0].startIdx
+        if brRows is not None:
+            startRow, endRow = brRows
+            return int(self._brIndex[endRow-1]['endIdx'] - self._brIndex[startRow]['startIdx'])
         else:
             return 0
             
@@ -191,16 +260,11 @@ class BoundingRegionShelve(object):
         return sum(self.getTotalElementCountForChr(chr) for chr in GenomeInfo.getExtendedChrList(self._genome))
             
     def getAllBoundingRegionsForChr(self, chr):
-        self._updateContentsIfNecessary(chr)
+        brRows = self._getBrRowsForChr(chr)
         
-        if chr in self._contents:
-            #Temporary
-            brInfoHolder = self._contents[chr]
-            if isinstance(brInfoHolder, dict):
-                brInfosForChr = brInfoHolder.values()
-            else:
-                brInfosForChr = brInfoHolder.brInfos
-            for brInfo in brInfosForChr:
+        if brRows is not None:
+            for row in xrange(*brRows):
+                brInfo = self._getBrInfo(row)
                 yield GenomeRegion(self._genome, chr, brInfo.start, brInfo.end)
                 
     def getAllBoundingRegions(self):
@@ -211,4 +275,22 @@ class BoundingRegionShelve(object):
         
         for chr in GenomeInfo.getExtendedChrList(self._genome):
             for reg in self.getAllBoundingRegionsForChr(chr):
-                yield reg
\ No newline at end of file
+                yield reg
+                
+if __name__ == "__main__":
+    if not len(sys.argv) == 4:
+        print 'Syntax: python BoundingRegionShelve.py genome trackName:subType allowOverlaps'
+        print 'Converts a bounding region shelve from an earlier version of gtrackcore into a bounding region index file.'
+        sys.exit(0)
+        
+    genome = sys.argv[1]
+    trackName = sys.argv[2].split(':')
+    allowOverlaps = eval(sys.argv[3])
+    assert allowOverlaps in [False, True]
+    
+    brShelve = BoundingRegionShelve(genome, trackName, allowOverlaps)
+    if not brShelve.legacyShelveExists():
+        print 'No bounding region shelve found for track: ' + sys.argv[2]
+        sys.exit(1)
+    
+    brShelve.migrateLegacyShelve()
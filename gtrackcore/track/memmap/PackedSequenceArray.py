@@ -0,0 +1,175 @@
+import os
+import numpy
+
+from gtrackcore.track.core.VirtualNumpyArray import VirtualNumpyArray
+
+PACKED_SEQUENCE_SUFFIX = '2bit'
+PACKED_SEQUENCE_RUNS_SUFFIX = '2bit.runs.npz'
+PACK_CHUNK_SIZE = 4 * 1024 * 1024
+
+_BASES = numpy.fromstring('ACGT', dtype='uint8')
+_OTHER_CODE = 4
+_BASE_CODES = numpy.zeros(256, dtype='uint8') + _OTHER_CODE
+_BASE_CODES[_BASES] = numpy.arange(4)
+
+def isPackedSequenceFileName(fn):
+    return fn.endswith('.' + PACKED_SEQUENCE_SUFFIX)
+
+def isPackedSequenceRunsFileName(fn):
+    return fn.endswith('.' + PACKED_SEQUENCE_RUNS_SUFFIX)
+
+def getPackedSequenceShape(fn):
+    return (int(numpy.load(fn + '.runs.npz')['length']),)
+
+def _findRuns(mask, vals):
+    # Returns the starts and ends of the runs of equal values where mask is True
+    if len(mask) == 0:
+        return numpy.zeros(0, dtype='int64'), numpy.zeros(0, dtype='int64')
+
+    newRun = numpy.ones(len(mask), dtype='bool')
+    newRun[1:] = (mask[1:] != mask[:-1]) | (vals[1:] != vals[:-1])
+    runStarts = numpy.flatnonzero(newRun)
+    runEnds = numpy.append(runStarts[1:], len(mask))
+    inMask = mask[runStarts]
+    return runStarts[inMask], runEnds[inMask]
+
+def _concatRuns(runArrays, dtype='int64'):
+    return numpy.concatenate(runArrays) if len(runArrays) > 0 else numpy.zeros(0, dtype=dtype)
+
+def _mergeAdjacentRuns(starts, ends, vals):
+    # Runs are found per chunk, so runs crossing chunk borders are split
+    isContinued = numpy.zeros(len(starts), dtype='bool')
+    isContinued[1:] = (starts[1:] == ends[:-1]) & (vals[1:] == vals[:-1])
+    isLast = numpy.append(~isContinued[1:], True) if len(starts) > 0 else isContinued
+    return starts[~isContinued], ends[isLast], vals[~isContinued]
+
+def _getRunMask(starts, ends, length):
+    # Runs are sorted and non-overlapping
+    delta = numpy.bincount(starts, minlength=length+1) - numpy.bincount(ends, minlength=length+1)
+    return numpy.cumsum(delta[:length]) > 0
+
+def packSequenceFile(fn, onlyIfSmaller=False):
+    '''
+    Replaces a memmap file of sequence characters (S1) with a file of two
+    bits per base, for the bases ACGT. Other characters are stored in a side
+    file as runs of equal characters, together with the runs of lower case
+    characters. If onlyIfSmaller is True, the original file is kept, and None
+    is returned, if the packed files would not be smaller than the original.
+    '''
+    seq = numpy.memmap(fn, dtype='uint8', mode='r') if os.path.getsize(fn) > 0 else numpy.zeros(0, dtype='uint8')
+    packedFn = fn.rsplit('.', 1)[0] + '.' + PACKED_SEQUENCE_SUFFIX
+
+    lowerStarts, lowerEnds = [], []
+    otherStarts, otherEnds, otherChars = [], [], []
+    with open(packedFn, 'wb') as packedFile:
+        for chunkStart in xrange(0, len(seq), PACK_CHUNK_SIZE):
+            chunk = numpy.array(seq[chunkStart:chunkStart + PACK_CHUNK_SIZE])
+
+            isLower = (chunk >= ord('a')) & (chunk <= ord('z'))
+            chunk[isLower] -= ord('a') - ord('A')
+
+            codes = _BASE_CODES[chunk]
+            isOther = codes == _OTHER_CODE
+            codes[isOther] = 0
+            if len(codes) % 4 != 0:
+                codes = numpy.append(codes, numpy.zeros(4 - len(codes) % 4, dtype='uint8'))
+
+            packed = (codes[0::4] << 6) | (codes[1::4] << 4) | (codes[2::4] << 2) | codes[3::4]
+            packed.tofile(packedFile)
+
+            starts, ends = _findRuns(isLower, isLower)
+            lowerStarts.append(starts + chunkStart)
+            lowerEnds.append(ends + chunkStart)
+
+            starts, ends = _findRuns(isOther, chunk)
+            otherStarts.append(starts + chunkStart)
+            otherEnds.append(ends + chunkStart)
+            otherChars.append(chunk[starts])
+
+    lowerStarts, lowerEnds = _concatRuns(lowerStarts), _concatRuns(lowerEnds)
+    lowerStarts, lowerEnds = _mergeAdjacentRuns(lowerStarts, lowerEnds, numpy.ones(len(lowerStarts), dtype='bool'))[:2]
+    otherStarts, otherEnds, otherChars = \
+        _mergeAdjacentRuns(_concatRuns(otherStarts), _concatRuns(otherEnds), _concatRuns(otherChars, 'uint8'))
+
+    runs = dict(lowerStarts=lowerStarts, lowerEnds=lowerEnds, \
+                otherStarts=otherStarts, otherEnds=otherEnds, otherChars=otherChars)
+    if onlyIfSmaller and (len(seq) + 3) / 4 + sum(arr.nbytes for arr in runs.values()) >= len(seq):
+        del seq
+        os.unlink(packedFn)
+        return None
+
+    numpy.savez(packedFn + '.runs.npz', length=len(seq), **runs)
+
+    del seq
+    os.unlink(fn)
+    return packedFn
+
+class PackedSequenceArray(VirtualNumpyArray):
+    # Read-only sequence array (S1) stored by packSequenceFile(). Slicing
+    # returns a new view without decoding, so that the bases are decoded
+    # lazily, and only for the region that is finally used as an array.
+
+    @classmethod
+    def open(cls, fn):
+        runs = dict(numpy.load(fn + '.runs.npz'))
+        length = int(runs.pop('length'))
+        packed = numpy.memmap(fn, dtype='uint8', mode='r') if length > 0 else numpy.zeros(0, dtype='uint8')
+        return cls(packed, runs, 0, length)
+
+    def __init__(self, packed, runs, start, end):
+        VirtualNumpyArray.__init__(self)
+        self._packed = packed
+        self._runs = runs
+        self._start = start
+        self._end = end
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getslice__(self, i, j):
+        i = min(max(i, 0), len(self))
+        j = min(max(j, i), len(self))
+        return PackedSequenceArray(self._packed, self._runs, self._start + i, self._start + j)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in [None, 1]:
+            start, stop, step = key.indices(len(self))
+            return self.__getslice__(start, stop)
+        return self.asNumpyArray()[key]
+
+    def _getRunsInRegion(self, startsKey, endsKey):
+        starts, ends = self._runs[startsKey], self._runs[endsKey]
+        first = numpy.searchsorted(ends, self._start, side='right')
+        last = numpy.searchsorted(starts, self._end, side='left')
+        return first, last, \
+            numpy.maximum(starts[first:last], self._start) - self._start, \
+            numpy.minimum(ends[first:last], self._end) - self._start
+
+    def _asNumpyArray(self):
+        length = len(self)
+        offset = self._start % 4
+        packed = numpy.asarray(self._packed[self._start / 4:(self._end + 3) / 4])
+
+        codes = numpy.empty((len(packed), 4), dtype='uint8')
+        for i, shift in enumerate([6, 4, 2, 0]):
+            codes[:, i] = (packed >> shift) & 3
+        seq = _BASES[codes.ravel()[offset:offset + length]]
+
+        first, last, starts, ends = self._getRunsInRegion('otherStarts', 'otherEnds')
+        if last > first:
+            seq[_getRunMask(starts, ends, length)] = numpy.repeat(self._runs['otherChars'][first:last], ends - starts)
+
+        first, last, starts, ends = self._getRunsInRegion('lowerStarts', 'lowerEnds')
+        if last > first:
+            seq[_getRunMask(starts, ends, length)] += ord('a') - ord('A')
+
+        return seq.view('S1')
+
+    def getShape(self):
+        return (len(self),)
+
+    def getDType(self):
+        return numpy.dtype('S1')
+
+    shape = property( getShape )
+    dtype = property( getDType )
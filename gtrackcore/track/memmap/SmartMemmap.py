@@ -1,6 +1,7 @@
 import numpy
 import os
 
+from collections import OrderedDict
 from numpy import memmap
 from functools import partial, update_wrapper
 
@@ -8,6 +9,8 @@ from gtrackcore.core.Config import Config
 from gtrackcore.track.memmap.CommonMemmapFunctions import calcShape
 
 MEMMAP_BIN_SIZE = Config.MEMMAP_BIN_SIZE
+MEMMAP_MAX_CACHED_BINS = Config.MEMMAP_MAX_CACHED_BINS
+MEMMAP_MAX_CACHED_BYTES = Config.MEMMAP_MAX_CACHED_BYTES
 
 class SmartMemmap(object):
     def __init__(self, fn, elementDim=None, dtype='int32', dtypeDim=1, mode='r'):
@@ -16,11 +19,12 @@ class SmartMemmap(object):
         self._mode = mode
         self._dTypeSize = numpy.dtype(dtype).itemsize
         self._origShape = calcShape(self._fn, elementDim, dtypeDim, dtype)
-        self._cachedMemmapBinNum = None
-        self._cachedMemmap = None
+        self._rowSize = self._dTypeSize * int(numpy.prod(self._origShape[1:]))
+        self._cachedMemmaps = OrderedDict()
+        self._cachedBytes = 0
 
     def _crossesBoundary(self, i, j):
-        return self._calcBinNum(i) != self._calcBinNum(j)
+        return j > i and self._calcBinNum(i) != self._calcBinNum(j-1)
     
     def _createMemmap(self, i, j):
         if j > self._origShape[0]:
@@ -31,23 +35,47 @@ class SmartMemmap(object):
         else:
             shape = tuple([j-i] + self._origShape[1:])
         
-        return memmap(self._fn, self._dtype, self._mode, offset = i*self._dTypeSize, shape = shape)
+        return memmap(self._fn, self._dtype, self._mode, offset = i*self._rowSize, shape = shape)
     
     def _calcBinNum(self, i):
         return i / MEMMAP_BIN_SIZE
     
     def _getLocalBinCoords(self, i, j):
-        return i % MEMMAP_BIN_SIZE, j % MEMMAP_BIN_SIZE
+        binStart = self._calcBinNum(i) * MEMMAP_BIN_SIZE
+        return i - binStart, j - binStart
+
+    def _getBinMemmap(self, binNum):
+        if binNum in self._cachedMemmaps:
+            binMemmap = self._cachedMemmaps.pop(binNum)
+        else:
+            binMemmap = self._createMemmap(binNum * MEMMAP_BIN_SIZE, (binNum+1) * MEMMAP_BIN_SIZE)
+            self._cachedBytes += binMemmap.nbytes
+            self._evictBinMemmaps()
+
+        self._cachedMemmaps[binNum] = binMemmap
+        return binMemmap
+
+    def _evictBinMemmaps(self):
+        while self._cachedMemmaps and \
+                (len(self._cachedMemmaps) >= MEMMAP_MAX_CACHED_BINS or \
+                 self._cachedBytes > MEMMAP_MAX_CACHED_BYTES):
+            evictedMemmap = self._cachedMemmaps.popitem(last=False)[1]
+            self._cachedBytes -= evictedMemmap.nbytes
+
+    def _getStitchedSlice(self, i, j):
+        firstBinNum = self._calcBinNum(i)
+        localI, localJ = self._getLocalBinCoords(i, j)
+        firstPart = self._getBinMemmap(firstBinNum)[localI:]
+        secondPart = self._getBinMemmap(firstBinNum + 1)[:localJ - MEMMAP_BIN_SIZE]
+        return numpy.concatenate([firstPart, secondPart])
 
-    def _getBinMemmap(self, binNum):        
-        if self._cachedMemmapBinNum != binNum:
-            self._cachedMemmap = self._createMemmap(binNum * MEMMAP_BIN_SIZE, (binNum+1) * MEMMAP_BIN_SIZE)
-            self._cachedMemmapBinNum = binNum
-            
-        return self._cachedMemmap
-    
     def __getslice__(self, i, j):
         if self._crossesBoundary(i, j):
+            # Short slices over a bin boundary are stitched together from
+            # two cached windows. Longer slices would need a copy larger
+            # than a bin, so they are served by a dedicated memmap instead.
+            if 0 < j - i <= MEMMAP_BIN_SIZE and j <= self._origShape[0]:
+                return self._getStitchedSlice(i, j)
             return self._createMemmap(i, j)[:]
         
         binNum = self._calcBinNum(i)
@@ -69,6 +97,9 @@ class SmartMemmap(object):
     def getFilename(self):
         return self._fn
     
+    def getNumCachedBins(self):
+        return len(self._cachedMemmaps)
+    
     shape = property( getShape )
     dtype = property( getDType )
     filename = property( getFilename )
@@ -0,0 +1,96 @@
+import os
+
+from collections import OrderedDict
+
+from gtrackcore.core.Config import Config
+from gtrackcore.track.memmap.SmartMemmap import SmartMemmap
+
+MEMMAP_POOL_MAX_FILES = Config.MEMMAP_POOL_MAX_FILES
+
+class SmartMemmapPool(object):
+    # Process-wide, reference counted pool of read-only SmartMemmaps. Keys
+    # include file mtime and size, so rewritten files get new entries. Only
+    # unreferenced entries are evicted, least recently used first.
+
+    _entries = OrderedDict()
+    _keyById = {}
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+
+    @classmethod
+    def acquire(cls, fn, elementDim=None, dtype='int32', dtypeDim=1):
+        stat = os.stat(fn)
+        key = (fn, elementDim, dtype, dtypeDim, stat.st_mtime, stat.st_size)
+
+        if key in cls._entries:
+            cls._hits += 1
+            entry = cls._entries.pop(key)
+        else:
+            cls._misses += 1
+            cls._removeUnreferencedEntries(lambda entryKey: entryKey[0] == fn)
+            entry = [SmartMemmap(fn, elementDim=elementDim, dtype=dtype, dtypeDim=dtypeDim, mode='r'), 0]
+            cls._keyById[id(entry[0])] = key
+
+        entry[1] += 1
+        cls._entries[key] = entry
+        cls._evictIfNecessary()
+        return entry[0]
+
+    @classmethod
+    def release(cls, smartMemmap):
+        key = cls._keyById.get(id(smartMemmap))
+        if key is None or key not in cls._entries:
+            return
+
+        entry = cls._entries[key]
+        if entry[1] > 0:
+            entry[1] -= 1
+        cls._evictIfNecessary()
+
+    @classmethod
+    def invalidate(cls, path):
+        # Removes all entries for files at or below path, referenced or not
+        path = os.path.normpath(path)
+        for key in [key for key in cls._entries if \
+                    os.path.normpath(key[0]) == path or key[0].startswith(path + os.sep)]:
+            cls._removeEntry(key)
+
+    @classmethod
+    def clear(cls):
+        cls._entries.clear()
+        cls._keyById.clear()
+        cls._hits = cls._misses = cls._evictions = 0
+
+    @classmethod
+    def getNumOpenFiles(cls):
+        return len(cls._entries)
+
+    @classmethod
+    def getStats(cls):
+        return OrderedDict([('openFiles', len(cls._entries)), \
+                            ('hits', cls._hits), \
+                            ('misses', cls._misses), \
+                            ('evictions', cls._evictions)])
+
+    @classmethod
+    def _evictIfNecessary(cls):
+        numToEvict = len(cls._entries) - MEMMAP_POOL_MAX_FILES
+        if numToEvict > 0:
+            cls._evictions += cls._removeUnreferencedEntries(lambda entryKey: True, numToEvict)
+
+    @classmethod
+    def _removeUnreferencedEntries(cls, keyFilter, maxNum=None):
+        keysToRemove = [key for key, entry in cls._entries.iteritems() \
+                        if entry[1] == 0 and keyFilter(key)]
+        if maxNum is not None:
+            keysToRemove = keysToRemove[:maxNum]
+
+        for key in keysToRemove:
+            cls._removeEntry(key)
+        return len(keysToRemove)
+
+    @classmethod
+    def _removeEntry(cls, key):
+        entry = cls._entries.pop(key)
+        del cls._keyById[id(entry[0])]
@@ -0,0 +1,87 @@
+import os
+
+from collections import namedtuple, OrderedDict
+
+from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve, isBoundingRegionFileName
+from gtrackcore.track.memmap.CommonMemmapFunctions import parseMemmapFileFn, calcShape
+from gtrackcore.track.memmap.PackedSequenceArray import isPackedSequenceFileName, \
+                                                       isPackedSequenceRunsFileName, getPackedSequenceShape
+from gtrackcore.util.CommonConstants import RESERVED_PREFIXES
+from gtrackcore.util.CommonFunctions import createDirPath
+
+MemmapFileInfo = namedtuple('MemmapFileInfo', ['fn', 'elementDim', 'dtypeDim', 'dtype', 'shape'])
+
+class TrackLayout(object):
+    # The contents of a preprocessed track directory, i.e. the memmap files
+    # per prefix and the bounding region shelve. Layouts are cached per
+    # process and rebuilt only when the mtime of the directory changes.
+    # Code that rewrites the memmap files in place must call clearCache().
+
+    _layoutCache = {}
+
+    @classmethod
+    def getLayout(cls, trackName, genome, chr, allowOverlaps, forceChrFolders=False):
+        key = (tuple(trackName), genome, chr, allowOverlaps, forceChrFolders)
+        layout = cls._layoutCache.get(key)
+        if layout is None or not layout.isValid():
+            layout = cls(trackName, genome, chr, allowOverlaps, forceChrFolders)
+            cls._layoutCache[key] = layout
+        return layout
+
+    @classmethod
+    def clearCache(cls):
+        cls._layoutCache.clear()
+
+    def __init__(self, trackName, genome, chr, allowOverlaps, forceChrFolders=False):
+        self._trackDirPath = createDirPath(trackName, genome, allowOverlaps=allowOverlaps)
+        self._trackDirMtime = self._getMtime(self._trackDirPath)
+
+        brShelve = BoundingRegionShelve(genome, trackName, allowOverlaps)
+        if not forceChrFolders and brShelve.fileExists():
+            chr = None
+
+        self.chr = chr
+        self.dirPath = createDirPath(trackName, genome, chr, allowOverlaps)
+        self._dirMtime = self._getMtime(self.dirPath)
+
+        self.boundingRegionShelve = None
+        self.fileInfos = OrderedDict()
+
+        for fn in os.listdir(self.dirPath):
+            fullFn = self.dirPath + os.sep + fn
+
+            if fn[0] == '.' or os.path.isdir(fullFn):
+                continue
+
+            if isBoundingRegionFileName(fn):
+                self.boundingRegionShelve = brShelve
+                continue
+
+            if isPackedSequenceRunsFileName(fn):
+                continue
+
+            if isPackedSequenceFileName(fn):
+                prefix = fn.split('.')[0]
+                assert prefix not in self.fileInfos
+                self.fileInfos[prefix] = MemmapFileInfo(fullFn, None, 1, 'S1', getPackedSequenceShape(fullFn))
+                continue
+
+            prefix, elementDim, dtypeDim, dtype = parseMemmapFileFn(fn)
+
+            assert prefix not in self.fileInfos
+            self.fileInfos[prefix] = MemmapFileInfo(fullFn, elementDim, dtypeDim, dtype, \
+                                                    tuple(calcShape(fullFn, elementDim, dtypeDim, dtype)))
+
+        # Iterated as a dict, to keep the order used when TrackData was iterated
+        self.extraPrefixes = [prefix for prefix in dict(self.fileInfos) if prefix not in \
+                              RESERVED_PREFIXES.keys() + ['leftIndex', 'rightIndex']]
+
+    def _getMtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def isValid(self):
+        return self._getMtime(self._trackDirPath) == self._trackDirMtime and \
+            self._getMtime(self.dirPath) == self._dirMtime
@@ -1,9 +1,7 @@
-import os
-
-from gtrackcore.track.memmap.CommonMemmapFunctions import parseMemmapFileFn
+from gtrackcore.track.memmap.PackedSequenceArray import PackedSequenceArray, isPackedSequenceFileName
 from gtrackcore.track.memmap.SmartMemmap import SmartMemmap
-from gtrackcore.track.memmap.BoundingRegionShelve import BoundingRegionShelve, isBoundingRegionFileName
-from gtrackcore.util.CommonFunctions import createDirPath
+from gtrackcore.track.memmap.SmartMemmapPool import SmartMemmapPool
+from gtrackcore.track.memmap.TrackLayout import TrackLayout
 
 class TrackData(dict):
     def __init__(self, other=None):
@@ -13,46 +11,44 @@ class TrackData(dict):
             dict.__init__(self)
         
         self.boundingRegionShelve = None
+        self.layout = None
 
 class TrackSource:
     def __init__(self):
         self._chrInUse = None
         self._fileDict = {}
     
+    def __del__(self):
+        self.close()
+    
+    def close(self):
+        for fileObj in self._fileDict.values():
+            if isinstance(fileObj, SmartMemmap):
+                SmartMemmapPool.release(fileObj)
+        self._fileDict = {}
+    
     def getTrackData(self, trackName, genome, chr, allowOverlaps, forceChrFolders=False):
-        trackData = TrackData()
+        layout = TrackLayout.getLayout(trackName, genome, chr, allowOverlaps, forceChrFolders)
         
-        brShelve = BoundingRegionShelve(genome, trackName, allowOverlaps)        
-        if not forceChrFolders and brShelve.fileExists():
-            chr = None
+        trackData = TrackData()
+        trackData.layout = layout
+        trackData.boundingRegionShelve = layout.boundingRegionShelve
         
-        dir = createDirPath(trackName, genome, chr, allowOverlaps)
-
-        for fn in os.listdir(dir):
-            fullFn = dir + os.sep + fn
-            
-            if fn[0] == '.' or os.path.isdir(fullFn):
-                continue
-                
-            if isBoundingRegionFileName(fn):
-                if fullFn not in self._fileDict:
-                    self._fileDict[fullFn] = brShelve
-                trackData.boundingRegionShelve = self._fileDict[fullFn]
-                continue
-            
-            prefix, elementDim, dtypeDim, dtype = parseMemmapFileFn(fn)
-            
-            assert prefix not in trackData
-            trackData[prefix] = self._getFile(chr, dir, fullFn, elementDim, dtype, dtypeDim)
+        for prefix, fileInfo in layout.fileInfos.iteritems():
+            trackData[prefix] = self._getFile(layout.chr, layout.dirPath, fileInfo.fn, \
+                                              fileInfo.elementDim, fileInfo.dtype, fileInfo.dtypeDim)
         
         return trackData
     
     def _getFile(self, chr, dir, fullFn, elementDim, dtype, dtypeDim):
         if chr is not None and chr != self._chrInUse:
-            self._fileDict = {}
+            self.close()
             self._chrInUse = chr
             
         if fullFn not in self._fileDict:
-            self._fileDict[fullFn] = SmartMemmap(fullFn, elementDim=elementDim, dtype=dtype, dtypeDim=dtypeDim, mode='r')
+            if isPackedSequenceFileName(fullFn):
+                self._fileDict[fullFn] = PackedSequenceArray.open(fullFn)
+            else:
+                self._fileDict[fullFn] = SmartMemmapPool.acquire(fullFn, elementDim=elementDim, dtype=dtype, dtypeDim=dtypeDim)
         
         return self._fileDict[fullFn]        
@@ -1,3 +1,5 @@
+import numpy
+
 from collections import OrderedDict
 
 from gtrackcore.track.core.TrackView import TrackView
@@ -29,6 +31,40 @@ class TrackViewLoader:
                 
         return array[bin] if bin is not None else array
 
+    @staticmethod
+    def _getExtraArrayNames(trackData):
+        if trackData.layout is not None:
+            return trackData.layout.extraPrefixes
+        else:
+            return [arrayName for arrayName in trackData if arrayName not in \
+                    RESERVED_PREFIXES.keys() + ['leftIndex', 'rightIndex']]
+    
+    @staticmethod
+    def _getArraysAndTrackFormat(trackData, brInfo, extraArrayNames):
+        reservedArrays = [TrackViewLoader._getArray(trackData, arrayName, brInfo) for arrayName in RESERVED_PREFIXES]
+        extraArrays = [TrackViewLoader._getArray(trackData, arrayName, brInfo) for arrayName in extraArrayNames]
+        trackFormat = TrackFormat( *(reservedArrays + [OrderedDict(zip(extraArrayNames, extraArrays))]) )
+        return reservedArrays, extraArrays, trackFormat
+    
+    @staticmethod
+    def _checkIndexArrays(trackData):
+        if trackData.get('leftIndex') is None or trackData.get('rightIndex') is None:
+            raise IOError('Preprocessed track not found. TrackData: ' + ', '.join(trackData.keys()))
+    
+    @staticmethod
+    def _createTrackView(region, trackFormat, reservedArrays, extraArrayNames, extraArrays, \
+                         leftIndex, rightIndex, borderHandling, allowOverlaps):
+        slicedReservedArrays = [(array[leftIndex:rightIndex] if array is not None else None) for array in reservedArrays]
+        slicedExtraArrays = [(array[leftIndex:rightIndex] if array is not None else None) for array in extraArrays]
+        
+        argList = [region] + slicedReservedArrays + [borderHandling, allowOverlaps] + [OrderedDict(zip(extraArrayNames, slicedExtraArrays))]
+        tv = TrackView( *(argList) )
+        
+        if not trackFormat.reprIsDense():
+            tv.sliceElementsAccordingToGenomeAnchor()
+            #tv._doScatteredSlicing()
+        return tv
+
     @staticmethod
     def loadTrackView(trackData, region, borderHandling, allowOverlaps, trackName=[]):
         """
@@ -39,12 +75,9 @@ class TrackViewLoader:
         brShelve = trackData.boundingRegionShelve
         brInfo = brShelve.getBoundingRegionInfo(region) if brShelve is not None else None
         
-        extraArrayNames = [arrayName for arrayName in trackData if arrayName not in \
-                           RESERVED_PREFIXES.keys() + ['leftIndex', 'rightIndex']]
-        
-        reservedArrays = [TrackViewLoader._getArray(trackData, arrayName, brInfo) for arrayName in RESERVED_PREFIXES]
-        extraArrays = [TrackViewLoader._getArray(trackData, arrayName, brInfo) for arrayName in extraArrayNames]
-        trackFormat = TrackFormat( *(reservedArrays + [OrderedDict(zip(extraArrayNames, extraArrays))]) )
+        extraArrayNames = TrackViewLoader._getExtraArrayNames(trackData)
+        reservedArrays, extraArrays, trackFormat = \
+            TrackViewLoader._getArraysAndTrackFormat(trackData, brInfo, extraArrayNames)
         
         if trackFormat.reprIsDense():
             if brInfo is None:
@@ -59,19 +92,60 @@ class TrackViewLoader:
             #leftBin = region.start/COMP_BIN_SIZE
             #rightBin = (region.end-1)/COMP_BIN_SIZE
             
-            if trackData.get('leftIndex') is None or trackData.get('rightIndex') is None:
-                raise IOError('Preprocessed track not found. TrackData: ' + ', '.join(trackData.keys()))
+            TrackViewLoader._checkIndexArrays(trackData)
             
             leftIndex = TrackViewLoader._getArray(trackData, 'leftIndex', brInfo, leftBin)
             rightIndex = TrackViewLoader._getArray(trackData, 'rightIndex', brInfo, rightBin)
         
-        slicedReservedArrays = [(array[leftIndex:rightIndex] if array is not None else None) for array in reservedArrays]
-        slicedExtraArrays = [(array[leftIndex:rightIndex] if array is not None else None) for array in extraArrays]
+        return TrackViewLoader._createTrackView(region, trackFormat, reservedArrays, extraArrayNames, extraArrays, \
+                                                leftIndex, rightIndex, borderHandling, allowOverlaps)
+    
+    @staticmethod
+    def _getIndexesForRegions(trackData, arrayName, brInfo, bins):
+        if brInfo is None:
+            return [TrackViewLoader._getArray(trackData, arrayName, brInfo, int(bin)) for bin in bins]
         
-        argList = [region] + slicedReservedArrays + [borderHandling, allowOverlaps] + [OrderedDict(zip(extraArrayNames, slicedExtraArrays))]
-        tv = TrackView( *(argList) )
+        if brInfo.startBinIdx == brInfo.endBinIdx:
+            return numpy.zeros(len(bins), dtype='int64')
+        return numpy.asarray(trackData[arrayName][brInfo.startBinIdx:brInfo.endBinIdx])[bins]
+    
+    @staticmethod
+    def loadTrackViews(trackData, regions, borderHandling, allowOverlaps, trackName=[]):
+        """
+        Generator version of loadTrackView for a list of regions in the same
+        chromosome. The arrays are sliced once per bounding region, and the
+        leftIndex/rightIndex bins of all regions within a bounding region are
+        looked up in one operation. Track views are yielded in region order.
+        """
+        brShelve = trackData.boundingRegionShelve
+        brInfos = [brShelve.getBoundingRegionInfo(region) if brShelve is not None else None \
+                   for region in regions]
+        extraArrayNames = TrackViewLoader._getExtraArrayNames(trackData)
         
-        if not trackFormat.reprIsDense():
-            tv.sliceElementsAccordingToGenomeAnchor()
-            #tv._doScatteredSlicing()
-        return tv
+        i = 0
+        while i < len(regions):
+            j = i + 1
+            while j < len(regions) and brInfos[j] == brInfos[i]:
+                j += 1
+            
+            brInfo = brInfos[i]
+            brRegions = regions[i:j]
+            reservedArrays, extraArrays, trackFormat = \
+                TrackViewLoader._getArraysAndTrackFormat(trackData, brInfo, extraArrayNames)
+            
+            if trackFormat.reprIsDense():
+                brStart = brInfo.start if brInfo is not None else 0
+                leftIndexes = [region.start - brStart for region in brRegions]
+                rightIndexes = [region.end - brStart for region in brRegions]
+            else:
+                TrackViewLoader._checkIndexArrays(trackData)
+                
+                leftBins = numpy.array([region.start for region in brRegions]) / CompBinManager.getCompBinSize()
+                rightBins = numpy.array([region.end-1 for region in brRegions]) / CompBinManager.getCompBinSize()
+                leftIndexes = TrackViewLoader._getIndexesForRegions(trackData, 'leftIndex', brInfo, leftBins)
+                rightIndexes = TrackViewLoader._getIndexesForRegions(trackData, 'rightIndex', brInfo, rightBins)
+            
+            for region, leftIndex, rightIndex in zip(brRegions, leftIndexes, rightIndexes):
+                yield TrackViewLoader._createTrackView(region, trackFormat, reservedArrays, extraArrayNames, extraArrays, \
+                                                       int(leftIndex), int(rightIndex), borderHandling, allowOverlaps)
+            i = j
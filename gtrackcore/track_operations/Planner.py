@@ -0,0 +1,167 @@
+from collections import OrderedDict
+
+from gtrackcore.track_operations.operations.Operator import Operator
+
+
+class PlanNode(object):
+    """
+    An operation in the plan. Identical operations in the operator tree,
+    i.e. of the same class, with the same options and the same inputs, are
+    one node.
+    """
+
+    def __init__(self, key, operation, inputs):
+        self.key = key
+        self.operation = operation
+        # Input nodes, or TrackContents for input tracks
+        self.inputs = inputs
+        self.numConsumers = 0
+        # Operations fused into this one, in the order they are applied
+        self.fused = []
+
+
+class Planner(object):
+    """
+    Plans the calculation of a nested operation.
+
+    The operator tree is turned into a DAG, where identical nested
+    operations are calculated once and the result is shared by all the
+    operations using it.
+
+    Chains of coordinate transforms (Shift, Expand, Flank) are fused, so
+    that the last operation of the chain applies all of the transforms to
+    each region in one pass, without creating the intermediate tracks.
+    Operations are only fused into the next when nothing else uses their
+    result, and when their result is not merged afterwards
+    (resultAllowOverlap).
+
+    >>> Planner(operation).explain()
+    >>> Planner(operation).calculate()
+    """
+
+    def __init__(self, operation):
+        self._nodes = OrderedDict()
+        self._trackNums = OrderedDict()
+        self._root = self._addNode(operation)
+        for node in self._nodes.itervalues():
+            for input in node.inputs:
+                if isinstance(input, PlanNode):
+                    input.numConsumers += 1
+        self._fuse()
+
+    def _getTrackNum(self, track):
+        return self._trackNums.setdefault(id(track), len(self._trackNums))
+
+    def _addNode(self, operation):
+        inputs = [self._addNode(track) if isinstance(track, Operator)
+                  else track for track in operation._inputTracks]
+
+        key = (operation.__class__,
+               repr(sorted(operation._kwargs.items())),
+               tuple(input.key if isinstance(input, PlanNode)
+                     else self._getTrackNum(input) for input in inputs))
+
+        if key not in self._nodes:
+            self._nodes[key] = PlanNode(key, operation, inputs)
+        return self._nodes[key]
+
+    def _fuse(self):
+        for node in reversed(self._nodes.values()):
+            if not node.operation._isCoordinateTransform or \
+                    node.numConsumers == 0 and node is not self._root:
+                continue
+
+            while True:
+                input = node.inputs[0]
+                if not isinstance(input, PlanNode) or \
+                        not input.operation._isCoordinateTransform or \
+                        not input.operation._keepsElements() or \
+                        input.numConsumers != 1:
+                    break
+
+                node.fused = input.fused + [input.operation] + node.fused
+                node.inputs = input.inputs
+                # The input node is no longer used
+                input.numConsumers = 0
+
+    def createOperation(self):
+        """
+        Create the planned operation, where identical nested operations are
+        the same object and fused operations are set.
+        :return: Operator
+        """
+        return self._createOperation(self._root, {})
+
+    def _createOperation(self, node, created):
+        if node.key not in created:
+            inputs = [self._createOperation(input, created)
+                      if isinstance(input, PlanNode) else input
+                      for input in node.inputs]
+
+            operation = node.operation.__class__(*inputs,
+                                                 **node.operation._kwargs)
+            # The fused operations are given the same input, so that they
+            # can be created. Only their transforms are used.
+            operation._fusedOperations = \
+                [fused.__class__(*inputs, **fused._kwargs)
+                 for fused in node.fused]
+            created[node.key] = operation
+        return created[node.key]
+
+    def calculate(self, lazy=False, workers=1):
+        """
+        Calculate the planned operation.
+        :param lazy: Boolean. See Operator.calculate
+        :param workers: Number of worker processes. See Operator.calculate
+        :return: The result of the operation
+        """
+        return self.createOperation().calculate(lazy=lazy, workers=workers)
+
+    def explain(self):
+        """
+        Describe the plan as a tree. Each operation is shown with its
+        options that differ from the default, and the operations fused into
+        it. Shared operations are numbered, and shown in full the first time
+        only.
+
+        :return: String
+        """
+        lines = []
+        shared = [node for node in self._nodes.itervalues()
+                  if node.numConsumers > 1]
+        self._explainNode(self._root, 0, lines,
+                          dict((node.key, i + 1) for i, node in
+                               enumerate(shared)), set())
+        return '\n'.join(lines)
+
+    def _explainNode(self, node, depth, lines, sharedNums, shown):
+        indent = '  ' * depth
+        if not isinstance(node, PlanNode):
+            trackName = node.trackName
+            lines.append(indent + 'Track {}'.format(
+                ':'.join(trackName) if trackName is not None
+                else '#{}'.format(self._getTrackNum(node))))
+            return
+
+        line = ' <- '.join(self._describeOperation(operation) for operation
+                           in [node.operation] + list(reversed(node.fused)))
+        if node.key in sharedNums:
+            line += ' [shared #{}]'.format(sharedNums[node.key])
+            if node.key in shown:
+                lines.append(indent + line + ' (reused)')
+                return
+            shown.add(node.key)
+        if node.fused:
+            line += ' [fused]'
+        lines.append(indent + line)
+
+        for input in node.inputs:
+            self._explainNode(input, depth + 1, lines, sharedNums, shown)
+
+    @staticmethod
+    def _describeOperation(operation):
+        options = ['{}={}'.format(k, operation._kwargs[k]) for k, info in
+                   operation.getKwArgumentInfoDict().iteritems()
+                   if operation._kwargs[k] != info.defaultValue]
+        return '{}({})'.format(operation.__class__.__name__,
+                               ', '.join(options))
@@ -10,11 +10,15 @@ from gtrackcore.track.format.TrackFormat import TrackFormat
 
 class TrackContents(object):
 
-    def __init__(self, genome, trackViews):
+    def __init__(self, genome, trackViews, trackName=None):
 #        assert len(trackViews) > 0
         assert isinstance(genome, Genome)
         self._genome = genome
 
+        # The name of the GTrackCore track the contents are read from, if
+        # any. Used to identify the track in the operation result cache.
+        self._trackName = trackName
+
         # TODO: Check that the regions in genome matches the ones in the
         # orderedDict
 
@@ -87,6 +91,10 @@ class TrackContents(object):
     def genome(self):
         return self._genome
 
+    @property
+    def trackName(self):
+        return self._trackName
+
     @genome.setter
     def genome(self, genome):
         self._genome = genome
@@ -98,6 +106,13 @@ class TrackContents(object):
     def getTrackView(self, region):
         return self._trackViews[region]
 
+    def iterTrackViews(self):
+        """
+        Iterate through the (region, trackView) pairs of the track.
+        :return: Iterator of (region, trackView) tuples
+        """
+        return self._trackViews.iteritems()
+
     def firstTrackView(self):
 
         if len(self._trackViews) <= 0:
@@ -110,3 +125,62 @@ class TrackContents(object):
         except IndexError:
             print("Index error!")
         return self._trackViews[self._trackViews.keys()[0]]
+
+
+class LazyTrackContents(TrackContents):
+    """
+    TrackContents where the trackView of a region is computed when it is
+    requested, and not kept. Used as the result of streaming operations.
+
+    Iterating through iterTrackViews() computes one region at a time. The
+    trackViews property computes all regions and returns them as an
+    OrderedDict, as for TrackContents.
+    """
+
+    def __init__(self, genome, regions, trackFormat, calculateRegion):
+        assert isinstance(genome, Genome)
+        self._genome = genome
+        self._trackName = None
+        self._regions = list(regions)
+        self._trackFormat = trackFormat
+        self._calculateRegion = calculateRegion
+
+    def getTrackViews(self):
+        return self.trackViews
+
+    def isEmpty(self):
+        return next(self.iterTrackViews(), None) is None
+
+    @property
+    def trackViews(self):
+        return OrderedDict(self.iterTrackViews())
+
+    @property
+    def allowOverlaps(self):
+        return self.firstTrackView().allowOverlaps
+
+    @property
+    def regions(self):
+        """
+        All regions of the track, including the regions where the result
+        is empty.
+        """
+        return self._regions
+
+    def getTrackView(self, region):
+        tv = self._calculateRegion(region)
+        if tv is None:
+            raise KeyError(region)
+        return tv
+
+    def iterTrackViews(self):
+        for region in self._regions:
+            tv = self._calculateRegion(region)
+            if tv is not None:
+                yield region, tv
+
+    def firstTrackView(self):
+        first = next(self.iterTrackViews(), None)
+        if first is None:
+            raise TrackContentsEmptyError()
+        return first[1]
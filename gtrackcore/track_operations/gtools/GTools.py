@@ -73,9 +73,14 @@ class GTools(object):
             logging.debug("Running operation: {0}".format(operation))
 
             oper = self._importedOperations[operation]
+
+            # The number of jobs is not an option of the operation
+            workers = self._args.jobs
+            del self._args.jobs
+
             # check args?
             a = oper.factory(self._args)
-            res = a.calculate()
+            res = a.calculate(workers=workers)
 
             if a.resultIsTrack:
                 pass
@@ -152,6 +157,9 @@ class GTools(object):
         parser = argparse.ArgumentParser(prog='GTools')
         parser.add_argument('-d', '--debug', action='store_true',
                             help='Run in debug mode')
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='Number of processes used to calculate the '
+                                 'regions of an operation in parallel')
         subparsers = parser.add_subparsers(help='Supported commands')
 
         list = subparsers.add_parser('list', help='List tracks in '
@@ -23,20 +23,28 @@ class Expand(Operator):
     _numTracks = 1
     _resultIsTrack = True
     _trackRequirements = [TrackFormatReq(dense=False)]
+    _isCoordinateTransform = True
 
     def _calculate(self, region, tv):
 
-        # Remove RawOperationsContent
-        starts = tv.startsAsNumpyArray()
-        ends = tv.endsAsNumpyArray()
-        strands = None
+        starts, ends, strands, index = self._getFusedInput(region, tv)
+        starts, ends, strands, expandIndex = \
+            self._transformCoordinates(region, starts, ends, strands)
 
-        if self._useStrands:
-            strands = tv.strandsAsNumpyArray()
-            if strands is None or strands.size == 0:
-                # Track has no strand information, ignoring strands.
-                strands = None
-                self._useStrand = False
+        if len(starts) != 0:
+            return createRawResultTrackView(index[expandIndex], region, tv,
+                                            self._resultAllowOverlap,
+                                            newStarts=starts, newEnds=ends,
+                                            trackFormat=self._resultTrackFormat)
+        else:
+            return None
+
+    def _transformCoordinates(self, region, starts, ends, strands):
+        useStrands = self._useStrands
+        if not useStrands or strands is None or strands.size == 0:
+            # Track has no strand information, ignoring strands.
+            strands = None
+            useStrands = False
 
         # Get genome size.
         regionSize = len(region)
@@ -44,22 +52,16 @@ class Expand(Operator):
         ret = expand(regionSize, starts=starts, ends=ends, strands=strands,
                      downstream=self._downstream, upstream=self._upstream,
                      both=self._both, useFraction=self._useFraction,
-                     useStrands=self._useStrands,
+                     useStrands=useStrands,
                      treatMissingAsNegative=self._treatMissingAsNegative,
                      debug=self._debug)
 
-        # Returns start, ends, strands, index
-        if ret is not None and len(ret[0]) != 0:
-            assert len(ret) == 3
-            starts = ret[0]
-            ends = ret[1]
-            index = ret[2]
-            return createRawResultTrackView(index, region, tv,
-                                            self._resultAllowOverlap,
-                                            newStarts=starts, newEnds=ends,
-                                            trackFormat=self._resultTrackFormat)
-        else:
-            return None
+        # Returns start, ends, index
+        assert len(ret) == 3
+        return ret[0], ret[1], None, ret[2]
+
+    def _keepsElements(self):
+        return self._resultAllowOverlap
 
     def _postCalculation(self):
         if not self._resultAllowOverlap:
@@ -24,41 +24,19 @@ class Flank(Operator):
     _numTracks = 1
     _resultIsTrack = True
     _trackRequirements = [TrackFormatReq(dense=False)]
+    _isCoordinateTransform = True
 
     def _calculate(self, region, tv):
-        # Remove RawOperationsContent
         logging.debug("Start call! region:{0}".format(region))
-        starts = tv.startsAsNumpyArray()
-        ends = tv.endsAsNumpyArray()
-        strands = tv.strandsAsNumpyArray()
+        starts, ends, strands, index = self._getFusedInput(region, tv)
+        starts, ends, strands, index = \
+            self._transformCoordinates(region, starts, ends, strands)
 
-        if self._useStrands:
-            if strands is None or strands.size == 0:
-                # Track has no strand information, ignoring strands.
-                self._useStrands = False
-
-        # Get region size.
-        regionSize = len(region)
-
-        print("useStrands: {}".format(self._useStrands))
-
-        ret = flank(starts, ends, regionSize, strands=strands,
-                    downstream=self._downstream, upstream=self._upstream,
-                    both=self._both, useStrands=self._useStrands,
-                    useFraction=self._useFraction,
-                    treatMissingAsNegative=self._treatMissingAsNegative,
-                    debug=self._debug)
-
-        if ret is not None and len(ret[0]) != 0:
-            assert len(ret) == 3
+        if starts is not None and len(starts) != 0:
             # We do not care about info from the base track..
             # the new track will only contain starts, ends and (strands if
             # present.
 
-            starts = ret[0]
-            ends = ret[1]
-            strands = ret[2]
-
             if self._debug:
                 print("------------------")
                 print("res _calculate")
@@ -74,6 +52,28 @@ class Flank(Operator):
         else:
             return None
 
+    def _transformCoordinates(self, region, starts, ends, strands):
+        if self._useStrands:
+            if strands is None or strands.size == 0:
+                # Track has no strand information, ignoring strands.
+                self._useStrands = False
+
+        # Get region size.
+        regionSize = len(region)
+
+        print("useStrands: {}".format(self._useStrands))
+
+        ret = flank(starts, ends, regionSize, strands=strands,
+                    downstream=self._downstream, upstream=self._upstream,
+                    both=self._both, useStrands=self._useStrands,
+                    useFraction=self._useFraction,
+                    treatMissingAsNegative=self._treatMissingAsNegative,
+                    debug=self._debug)
+
+        # The flanks are new elements
+        assert len(ret) == 3
+        return ret[0], ret[1], ret[2], None
+
     def _postCalculation(self):
         if not self._resultAllowOverlap:
             track = self._result
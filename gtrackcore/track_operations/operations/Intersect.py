@@ -16,10 +16,13 @@ class Intersect(Operator):
     """
     Find the intersect between two track.
 
+    With useStrands, only segments on the same strand are intersected.
+    With minOverlap, only the intersect with the segments of track 1 that
+    are covered by at least that fraction are kept.
+
     Possible extension:
     Select with links
         - Follow all links in the intersect and add these segments as well.
-    Follow strand
     """
 
     _trackHelpList = ['Track 1 in the intersect', 'Track 2 in the intersect']
@@ -35,7 +38,13 @@ class Intersect(Operator):
 
         t2Starts = tv2.startsAsNumpyArray()
         t2Ends = tv2.endsAsNumpyArray()
-        ret = intersect(t1Starts, t1Ends, t2Starts, t2Ends, debug=self._debug)
+
+        ret = intersect(t1Starts, t1Ends, t2Starts, t2Ends,
+                        t1Strands=tv1.strandsAsNumpyArray(),
+                        t2Strands=tv2.strandsAsNumpyArray(),
+                        useStrands=self._useStrands,
+                        treatMissingAsNegative=self._treatMissingAsNegative,
+                        minOverlap=self._minOverlap, debug=self._debug)
 
         if ret is not None and len(ret[0]) != 0:
             assert len(ret) == 4
@@ -96,4 +105,8 @@ class Intersect(Operator):
              KwArgumentInfo('treatMissingAsNegative', 'n',
                             'Treat any missing strand as if they are '
                             'negative. The default is to treat them as positive',
-                            bool, False))])
+                            bool, False)),
+            ('minOverlap',
+             KwArgumentInfo('minOverlap', 'm',
+                            'Minimum fraction of a segment in track 1 that '
+                            'must be covered by track 2', float, None))])
@@ -2,24 +2,52 @@
 import abc
 import glob
 import time
+import hashlib
+import numpy as np
+
+from multiprocessing import Pool
 
 from collections import OrderedDict
 from collections import namedtuple
 from os.path import dirname, basename, isfile
 
 from gtrackcore.track_operations.TrackContents import TrackContents
+from gtrackcore.track_operations.TrackContents import LazyTrackContents
 from gtrackcore.track_operations.Genome import Genome
 from gtrackcore.track_operations.utils.TrackHandling import \
     createTrackContentFromFile
+from gtrackcore.track_operations.utils.TrackHandling import \
+    createEmptyTrackView
+from gtrackcore.track_operations.utils.TrackHandling import \
+    getTrackViewLists
+from gtrackcore.track_operations.utils.TrackHandling import \
+    createTrackViewFromLists
+from gtrackcore.track_operations.utils.ResultCache import ResultCache
+from gtrackcore.track_operations.utils.ResultCache import \
+    getTrackContentsKey
 
 from gtrackcore.track.core.TrackView import TrackView
 from gtrackcore.track.format.TrackFormat import TrackFormat
 from gtrackcore.track.format.TrackFormat import TrackFormatReq
+from gtrackcore.util.CustomExceptions import AbstractClassError
 
 
 class InvalidArgumentError(Exception):
     pass
 
+# The operation being calculated in parallel. Set before the worker
+# processes are forked, so that the workers inherit it, including the
+# memmaps of the tracks, instead of having it pickled.
+_parallelOperator = None
+
+def _calculateRegionInWorker(indexAndRegion):
+    index, region = indexAndRegion
+    result = _parallelOperator.calculateRegion(region)
+    if isinstance(result, TrackView):
+        # TrackViews can not be pickled. The lists are sent instead.
+        return index, True, getTrackViewLists(result)
+    return index, False, result
+
 class Operator(object):
     __metaclass__ = abc.ABCMeta
 
@@ -29,9 +57,21 @@ class Operator(object):
     _resultIsTrack = False
     _nestedOperator = False
     _result = None
+    # Set to False for operations restricted to a single region, which are
+    # part of a larger calculation.
+    _useResultCache = True
+    # Operations that change the coordinates of each element on its own
+    # implement _transformCoordinates. The Planner may fuse a chain of
+    # these into the last operation of the chain, which then applies the
+    # _fusedOperations to its input before its own transform.
+    _isCoordinateTransform = False
+    _fusedOperations = ()
 
     def __init__(self, *args, **kwargs):
         self._tracks = args
+        # The arguments as given, used when restricting the operation to
+        # a single region. _preCalculation may replace self._tracks.
+        self._inputTracks = args
 
         # Load the default kwargs and set any given ones.
         self._kwargs = self._parseKwargs(**kwargs)
@@ -197,18 +237,86 @@ class Operator(object):
         """
         return self.calculate()
 
-    def calculate(self):
+    def calculate(self, lazy=False, workers=1, plan=False):
         """
         Run operation. Iterates through all regions in a track.
 
+        If lazy is True, the operation is streamed region by region. For
+        each region, the nested operations compute the trackView of that
+        region only, which is consumed by the outer operation and then
+        released. If the result is a track, a LazyTrackContents is returned,
+        which computes each region when it is requested. Operations that
+        need the whole track, e.g. RemoveDeadLinks with useGlobal, are
+        computed in full as when lazy is False.
+
+        If workers is larger than one, the regions are calculated in
+        parallel by a pool of worker processes, starting with the largest
+        regions. Operations that need the whole track are calculated in this
+        process.
+
+        If Config.OPERATION_RESULT_CACHE_MAX_BYTES is larger than zero, the
+        result is stored in the result cache, and read from the cache when
+        the operation is repeated on the same tracks.
+
+        If plan is True, the nested operations are first planned by the
+        Planner, which calculates identical nested operations once and
+        fuses chains of coordinate transforms. See explain().
+
+        :param lazy: Boolean. Stream the calculation region by region.
+        :param workers: Number of worker processes.
+        :param plan: Boolean. Plan the nested operations before calculating.
         :return: The result of the operation as a track or as a ordered dict
         of the result per region.
         """
 
+        if plan:
+            from gtrackcore.track_operations.Planner import Planner
+            result = Planner(self).calculate(lazy=lazy, workers=workers)
+            if not lazy:
+                self._result = result
+            return result
+
+        if lazy and self.isRegionLocal():
+            if self.resultIsTrack:
+                return LazyTrackContents(self._resultGenome,
+                                         self.getResultRegion(),
+                                         self.trackFormat,
+                                         self.calculateRegion)
+            else:
+                self._result = OrderedDict(self.iterResults())
+                return self._result
+
         if self._result is not None:
             # If we have a result we return it
             return self._result
 
+        if self._useResultCache and ResultCache.isEnabled():
+            cache = ResultCache()
+            key = self.getCacheKey()
+            self._result = cache.load(key)
+            if self._result is None:
+                self._calculateResult(workers)
+                cache.store(key, self._result)
+        else:
+            self._calculateResult(workers)
+
+        return self._result
+
+    def _calculateResult(self, workers):
+        """
+        Calculate the result of the operation and set self._result.
+        :param workers: Number of worker processes.
+        :return: None
+        """
+        if workers > 1 and len(self.getResultRegion()) > 1 and \
+                self.isRegionLocal():
+            result = self._calculateInParallel(workers)
+            if self.resultIsTrack:
+                self._result = TrackContents(self._resultGenome, result)
+            else:
+                self._result = result
+            return
+
         self._result = OrderedDict()
 
         # Compute any nested operations.
@@ -224,8 +332,11 @@ class Operator(object):
 
         result = OrderedDict()
         for region in self.getResultRegion():
-            trackViewPerArg = [track.getTrackView(region) for track in
-                               computedTracks]
+            trackViewPerArg = [self._getTrackViewOfRegion(computedTrack,
+                                                          region,
+                                                          track.trackFormat)
+                               for track, computedTrack in
+                               zip(self._tracks, computedTracks)]
             tv = self._calculate(region, *trackViewPerArg)
 
             if tv is not None:
@@ -239,7 +350,208 @@ class Operator(object):
             self._result = result
 
         self._postCalculation()
-        return self._result
+
+    def getCacheKey(self):
+        """
+        Create the key of the result of the operation in the result cache,
+        from the operation, its options, the result TrackFormat and the
+        keys of the input tracks.
+
+        :return: String. Hex digest of the key.
+        """
+        md5 = hashlib.md5()
+        md5.update(repr((self.__class__.__name__,
+                         sorted(self._kwargs.items()),
+                         str(self.trackFormat))))
+        for operation in self._fusedOperations:
+            md5.update(repr((operation.__class__.__name__,
+                             sorted(operation._kwargs.items()))))
+        for track in self._inputTracks:
+            if isinstance(track, Operator):
+                md5.update(track.getCacheKey())
+            else:
+                md5.update(getTrackContentsKey(track))
+        return md5.hexdigest()
+
+    def calculateRegion(self, region):
+        """
+        Compute the result of a single region. The operation is repeated
+        with the input tracks and any nested operations restricted to the
+        region, so that no other regions are computed.
+
+        :param region: GenomeRegion
+        :return: The result of the region, or None if empty.
+        """
+        result = self._restrictToRegion(region).calculate()
+        if self.resultIsTrack:
+            return result.trackViews.get(region)
+        else:
+            return result.get(region)
+
+    def _calculateInParallel(self, workers):
+        """
+        Calculate the regions in a pool of worker processes. The largest
+        regions are started first, and the results are returned in the
+        order of the regions.
+
+        :param workers: Number of worker processes.
+        :return: OrderedDict of the results of the regions with a result.
+        """
+        global _parallelOperator
+
+        regions = self.getResultRegion()
+        jobs = sorted(enumerate(regions), key=lambda x: len(x[1]),
+                      reverse=True)
+
+        _parallelOperator = self
+        pool = Pool(min(workers, len(regions)))
+        try:
+            results = {}
+            for i, isTrackView, res in pool.imap_unordered(
+                    _calculateRegionInWorker, jobs, chunksize=1):
+                results[i] = createTrackViewFromLists(regions[i], res) \
+                    if isTrackView else res
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _parallelOperator = None
+
+        return OrderedDict((region, results[i]) for i, region in
+                           enumerate(regions) if results[i] is not None)
+
+    def iterResults(self):
+        """
+        Compute the results one region at a time.
+
+        :return: Iterator of (region, result) tuples for the regions with a
+        result.
+        """
+        for region in self.getResultRegion():
+            result = self.calculateRegion(region)
+            if result is not None:
+                yield region, result
+
+    def isRegionLocal(self):
+        """
+        Check if the result of a region only depends on the input of the
+        same region, for this operation and all nested operations.
+        Overload if the operation uses information from other regions.
+
+        :return: True if the operation can be streamed region by region.
+        """
+        return all(track.isRegionLocal() for track in self._inputTracks
+                   if isinstance(track, Operator))
+
+    def _restrictToRegion(self, region, restricted=None):
+        """
+        Create a copy of the operation where the input tracks only contain
+        the given region.
+        :param region: GenomeRegion
+        :param restricted: Dict of the copies already made, by the id of the
+        original. Operations and tracks used more than once are copied once.
+        :return: Operator
+        """
+        if restricted is None:
+            restricted = {}
+        if id(self) in restricted:
+            return restricted[id(self)]
+
+        tracks = []
+        for track in self._inputTracks:
+            if id(track) not in restricted:
+                if isinstance(track, Operator):
+                    track._restrictToRegion(region, restricted)
+                else:
+                    tv = self._getTrackViewOfRegion(track, region,
+                                                    track.trackFormat)
+                    restricted[id(track)] = TrackContents(
+                        track.genome, OrderedDict([(region, tv)]))
+            tracks.append(restricted[id(track)])
+
+        operation = self.__class__(*tracks, **self._kwargs)
+        operation._useResultCache = False
+        operation._fusedOperations = \
+            [fused._restrictToRegion(region, restricted)
+             for fused in self._fusedOperations]
+        restricted[id(self)] = operation
+        return operation
+
+    @staticmethod
+    def _getTrackViewOfRegion(track, region, trackFormat):
+        """
+        Regions where a track has no elements may be missing from the
+        TrackContents. An empty trackView is used for these.
+        :param track: TrackContents
+        :param region: GenomeRegion
+        :param trackFormat: TrackFormat of the track
+        :return: TrackView
+        """
+        try:
+            return track.getTrackView(region)
+        except KeyError:
+            if trackFormat is None or trackFormat.isDense():
+                raise
+            return createEmptyTrackView(region, trackFormat)
+
+    def _getFusedInput(self, region, tv):
+        """
+        Get the starts, ends and strands of a trackView, after the
+        transforms of the fused operations, if any.
+
+        :param region: GenomeRegion
+        :param tv: Input TrackView
+        :return: Tuple of starts, ends, strands and the index of each element
+        in the input TrackView.
+        """
+        starts = tv.startsAsNumpyArray()
+        ends = tv.endsAsNumpyArray()
+        strands = tv.strandsAsNumpyArray()
+        index = np.arange(len(starts), dtype='int32')
+
+        for operation in self._fusedOperations:
+            starts, ends, newStrands, transformIndex = \
+                operation._transformCoordinates(region, starts, ends, strands)
+            index = index[transformIndex]
+            if strands is not None:
+                strands = strands[transformIndex]
+
+        return starts, ends, strands, index
+
+    def _transformCoordinates(self, region, starts, ends, strands):
+        """
+        Overload in operations with _isCoordinateTransform set.
+
+        :param region: GenomeRegion
+        :param starts: Numpy array. Starts of the elements
+        :param ends: Numpy array. Ends of the elements
+        :param strands: Numpy array or None. Strands of the elements
+        :return: Tuple of the new starts, ends and strands, and the index
+        of the element each new element is created from. The strands and
+        index are None if they are not given by the transform.
+        """
+        raise AbstractClassError
+
+    def _keepsElements(self):
+        """
+        Overload in operations with _isCoordinateTransform set. True if the
+        index returned by _transformCoordinates refers to the input elements,
+        and the result is not changed by _postCalculation. The Planner only
+        fuses these operations into the following ones.
+        :return: Boolean
+        """
+        return False
+
+    def explain(self):
+        """
+        Describe how the operation is calculated when planned, see
+        calculate().
+        :return: String. The planned operations as a tree.
+        """
+        from gtrackcore.track_operations.Planner import Planner
+        return Planner(self).explain()
 
     def _preCalculation(self):
         pass
@@ -68,6 +68,10 @@ class RemoveDeadLinks(Operator):
         if self._useGlobal:
             self._setGlobalIds(self._tracks[0])
 
+    def isRegionLocal(self):
+        # The global ids span all regions
+        return not self._useGlobal and Operator.isRegionLocal(self)
+
     def _setResultTrackFormat(self):
         """
         Create the correct TrackFormat for the output track.
@@ -19,15 +19,26 @@ class Shift(Operator):
     _numTracks = 1
     _resultIsTrack = True
     _trackRequirements = [TrackFormatReq(dense=False)]
+    _isCoordinateTransform = True
 
     def _calculate(self, region, tv):
 
-        starts = tv.startsAsNumpyArray()
-        ends = tv.endsAsNumpyArray()
+        starts, ends, strands, index = self._getFusedInput(region, tv)
+        starts, ends, strands, shiftIndex = \
+            self._transformCoordinates(region, starts, ends, strands)
 
-        if self._useStrands:
-            strands = tv.strandsAsNumpyArray()
+        if len(starts) != 0:
+            # The strands are taken from the base track by the index
+            tv = createRawResultTrackView(index[shiftIndex], region, tv,
+                                          self._resultAllowOverlap,
+                                          newStarts=starts, newEnds=ends,
+                                          trackFormat=self._resultTrackFormat)
+            return tv
         else:
+            return None
+
+    def _transformCoordinates(self, region, starts, ends, strands):
+        if not self._useStrands:
             strands = None
 
         regionSize = len(region)
@@ -38,22 +49,11 @@ class Shift(Operator):
                     useStrands=self._useStrands,
                     treatMissingAsNegative=self._treatMissingAsNegative)
 
-        if ret is not None and len(ret[0]) != 0:
-            assert len(ret) == 4
-
-            starts = ret[0]
-            ends = ret[1]
-            index = ret[2]
-            strands = ret[3]
+        assert len(ret) == 4
+        return ret[0], ret[1], None, ret[2]
 
-            tv = createRawResultTrackView(index, region, tv,
-                                          self._resultAllowOverlap,
-                                          newStarts=starts, newEnds=ends,
-                                          newStrands=strands,
-                                          trackFormat=self._resultTrackFormat)
-            return tv
-        else:
-            return None
+    def _keepsElements(self):
+        return self._resultAllowOverlap
 
     def _postCalculation(self):
         if not self._resultAllowOverlap and not self._result.isEmpty():
@@ -1,18 +1,45 @@
 import numpy as np
 
+from gtrackcore.util.CommonConstants import BINARY_MISSING_VAL
+from gtrackcore.track_operations.exeptions.Operations import \
+    InvalidArgumentError
+
+# Event codes, in the order the events are sorted at the same position
+B_END = 0
+A_END = 1
+A_START = 2
+B_START = 3
+
+# The change in coverage of track A and B at each event code
+COVER_DELTAS = np.array([[0, -1, 1, 0], [-1, 0, 0, 1]], dtype=np.int8)
+
 def intersect(t1Starts=None, t1Ends=None, t2Starts=None, t2Ends=None,
-              debug=False):
+              t1Strands=None, t2Strands=None, useStrands=False,
+              treatMissingAsNegative=False, minOverlap=None, debug=False):
     """
     Find the intersect of two none dense tracks.
 
-    TODO: Add support for strands.
-    TODO: Add support for "minimum overlap"
-
-    :param t1Starts:
-    :param t1Ends:
-    :param t2Starts:
-    :param t2Ends:
-    :return:
+    The starts and ends of both tracks are sorted as one list of events,
+    which is swept once. The coverage of each track is the cumulative sum
+    of its starts and ends, and the intersect is where both tracks cover.
+    Each result segment is attributed to the segment in track A that was
+    started last, by a running maximum of the indexes of the A starts.
+
+    :param t1Starts: Numpy array. Starts of track A
+    :param t1Ends: Numpy array. Ends of track A
+    :param t2Starts: Numpy array. Starts of track B
+    :param t2Ends: Numpy array. Ends of track B
+    :param t1Strands: Numpy array. Strands of track A
+    :param t2Strands: Numpy array. Strands of track B
+    :param useStrands: Boolean. Only intersect segments on the same strand.
+    Ignored if one of the tracks is missing strands.
+    :param treatMissingAsNegative: Boolean. Treat missing strands ('.') as
+    negative. The default is to treat them as positive.
+    :param minOverlap: Float. Minimum fraction of a segment in track A that
+    must be covered by track B, between 0 and 1. The intersects of the
+    other segments are removed.
+    :return: Starts, ends, the index in track A and the encoding of the
+    track of each result segment, which is always track A (1).
     """
 
     assert t1Starts is not None
@@ -21,64 +48,146 @@ def intersect(t1Starts=None, t1Ends=None, t2Starts=None, t2Ends=None,
     assert len(t1Starts) == len(t1Ends)
     assert len(t2Starts) == len(t2Ends)
 
-    t1Index = np.arange(0, len(t1Starts), 1)
-    t2Index = np.arange(0, len(t2Starts), 1)
-    t1Encode = np.zeros(len(t1Starts), dtype=np.int) + 1
-    t2Encode = np.zeros(len(t2Starts), dtype=np.int) + 2
-
-    t1CodedStarts = t1Starts * 8 + 5
-    t1CodedEnds = t1Ends * 8 + 3
-    t2CodedStarts = t2Starts * 8 + 6
-    t2CodedEnds = t2Ends * 8 + 2
-
-    allCodedEvents = np.concatenate((t1CodedStarts, t1CodedEnds,
-                                        t2CodedStarts, t2CodedEnds))
-
-    index = np.concatenate((t1Index,t1Index,t2Index,t2Index))
-    encode = np.concatenate((t1Encode,t1Encode,t2Encode,t2Encode))
-
-    combined = np.column_stack((allCodedEvents, index, encode))
-    combined = combined[np.lexsort((combined[:, -1], combined[:, 0]))]
-    combinedIndex = np.arange(0,len(combined))
-
-    combined = np.column_stack((combined, combinedIndex))
-
-    allSortedEvents = combined[:, 0]
-    allEventCodes = (allSortedEvents % 8) - 4
-    allSortedDecodedEvents = allSortedEvents / 8
-
-    allEventLengths = allSortedDecodedEvents[1:] - allSortedDecodedEvents[:-1]
-    cumulativeCoverStatus = np.add.accumulate(allEventCodes)
-
-    allStartIndexes = np.where(cumulativeCoverStatus[:-1] >= 3)
-
-    tmpStarts = combined[allStartIndexes]
-
-    # Find segments with index from track B
-    wrongIndex = np.where(tmpStarts[:, -2] == 2)
-    elementsToUpdate = tmpStarts[wrongIndex]
-
-    while len(elementsToUpdate) > 0:
-        combinedIndex = elementsToUpdate[:,-1]
-        updatedCombinedIndex = combinedIndex - 1
-
-        newElements = combined[updatedCombinedIndex]
-
-        # Update combined index
-        tmpStarts[wrongIndex,-1] = newElements[:,-1]
-        # Update encoding
-        tmpStarts[wrongIndex,-2] = newElements[:,-2]
-        # Update index
-        tmpStarts[wrongIndex,-3] = newElements[:,-3]
+    if minOverlap is not None and not 0 <= minOverlap <= 1:
+        raise InvalidArgumentError("minOverlap must be between 0 and 1, "
+                                   "not {}".format(minOverlap))
+
+    if useStrands and t1Strands is not None and t2Strands is not None:
+        # Segments on each strand are only intersected with each other
+        t1IsNegative = _isNegative(t1Strands, treatMissingAsNegative)
+        t2IsNegative = _isNegative(t2Strands, treatMissingAsNegative)
+        results = []
+        for isNegative in [False, True]:
+            t1Index = np.nonzero(t1IsNegative == isNegative)[0]
+            t2Index = np.nonzero(t2IsNegative == isNegative)[0]
+            starts, ends, index = _sweep(t1Starts[t1Index], t1Ends[t1Index],
+                                         t2Starts[t2Index], t2Ends[t2Index])
+            results.append((starts, ends, t1Index[index]))
+
+        starts, ends, index = [np.concatenate(x) for x in zip(*results)]
+        resultOrder = np.lexsort((ends, starts))
+        starts = starts[resultOrder]
+        ends = ends[resultOrder]
+        index = index[resultOrder]
+    else:
+        starts, ends, index = _sweep(t1Starts, t1Ends, t2Starts, t2Ends)
+
+    if minOverlap is not None:
+        coverage = np.bincount(index, weights=ends - starts,
+                               minlength=max(len(t1Starts), 1))
+        lengths = np.maximum(t1Ends - t1Starts, 1)
+        isCovered = coverage >= minOverlap * lengths
+        keep = isCovered[index]
+        starts = starts[keep]
+        ends = ends[keep]
+        index = index[keep]
+
+    if debug:
+        print("starts: {}".format(starts))
+        print("ends: {}".format(ends))
+        print("index: {}".format(index))
+
+    encoding = np.ones(len(index), dtype=np.int64)
+
+    return starts, ends, index, encoding
+
+def _sweep(t1Starts, t1Ends, t2Starts, t2Ends):
+    """
+    Intersect two tracks on the same strand.
+    :return: Starts, ends and the index in track A of the result segments.
+    """
+    t1Order = None
+    if not _isSorted(t1Starts):
+        t1Order = np.argsort(t1Starts, kind='mergesort')
+        t1Starts = t1Starts[t1Order]
+        t1Ends = t1Ends[t1Order]
+
+    # Each event is sorted on a key of its position and code. The sorted
+    # starts and ends of each track are merged, and then the two tracks.
+    aKeys, aStartRanks = _mergeStartsAndEnds(
+        _getEventKeys(t1Starts, A_START), _getEventKeys(t1Ends, A_END))
+    bKeys = _mergeStartsAndEnds(_getEventKeys(t2Starts, B_START),
+                                _getEventKeys(t2Ends, B_END))[0]
+    keys, aRanks = _merge(aKeys, bKeys)
+    numEvents = len(keys)
+
+    positions = keys >> 2
+    codes = keys & 3
+    aCover = np.cumsum(COVER_DELTAS[0][codes], dtype=np.int32)
+    bCover = np.cumsum(COVER_DELTAS[1][codes], dtype=np.int32)
+
+    # A result segment starts at each event where both tracks cover, and
+    # ends at the next event.
+    resultEvents = np.nonzero((aCover[:-1] > 0) & (bCover[:-1] > 0))[0]
+
+    # The A starts are sorted, so the running maximum of their indexes is
+    # the index of the last A start.
+    lastAStarts = np.empty(numEvents, dtype=np.int64)
+    lastAStarts.fill(-1)
+    lastAStarts[aRanks[aStartRanks]] = np.arange(len(t1Starts))
+    np.maximum.accumulate(lastAStarts, out=lastAStarts)
+
+    dtype = np.result_type(t1Starts, t1Ends, t2Starts, t2Ends)
+    starts = positions[resultEvents].astype(dtype)
+    ends = positions[resultEvents + 1].astype(dtype)
+    index = lastAStarts[resultEvents]
+
+    # With overlapping segments in track A, the last started segment may
+    # have ended. The segment with the largest end of the started segments
+    # is then used.
+    hasEnded = t1Ends[index] < ends
+    if hasEnded.any():
+        maxEnds = np.maximum.accumulate(t1Ends)
+        maxEndIndex = np.maximum.accumulate(
+            np.where(t1Ends == maxEnds, np.arange(len(t1Ends)), 0))
+        index[hasEnded] = maxEndIndex[index[hasEnded]]
+    if t1Order is not None:
+        index = t1Order[index]
+
+    return starts, ends, index
+
+def _getEventKeys(positions, code):
+    return positions.astype(np.int64) * 4 + code
+
+def _mergeStartsAndEnds(startKeys, endKeys):
+    """
+    Merge the start and end events of a track. The events of tracks without
+    overlapping segments are sorted when the starts and ends are
+    interleaved, which is checked first.
+    :return: The merged keys, and the position of each start in the merged
+    keys.
+    """
+    keys = np.column_stack((startKeys, endKeys)).ravel()
+    if _isSorted(keys):
+        return keys, np.arange(0, len(keys), 2)
+    return _merge(startKeys, _sorted(endKeys))
 
-        # Update elementsToUpdate
-        wrongIndex = np.where(tmpStarts[:,-2] == 2)
-        elementsToUpdate = tmpStarts[wrongIndex]
+def _merge(keys, otherKeys):
+    """
+    Merge two sorted arrays of event keys. The two arrays never share keys,
+    as the events of each have different codes.
+    :return: The merged keys, and the position of each of the first keys in
+    the merged keys.
+    """
+    ranks = np.arange(len(keys)) + np.searchsorted(otherKeys, keys)
+    merged = np.empty(len(keys) + len(otherKeys), dtype=np.int64)
+    merged[ranks] = keys
+    isOther = np.ones(len(merged), dtype=np.bool_)
+    isOther[ranks] = False
+    merged[isOther] = otherKeys
+    return merged, ranks
 
-    starts = tmpStarts[:,0]/8
-    ends = starts + allEventLengths[allStartIndexes]
+def _isSorted(array):
+    return len(array) < 2 or bool((array[1:] >= array[:-1]).all())
 
-    trackIndex = tmpStarts[:,-2]
-    trackEncoding = tmpStarts[:,-1]
+def _sorted(array):
+    return array if _isSorted(array) else np.sort(array, kind='mergesort')
 
-    return starts, ends, trackIndex, trackEncoding
+def _isNegative(strands, treatMissingAsNegative):
+    """
+    Strands are stored as 1 ('+'), 0 ('-') and BINARY_MISSING_VAL ('.').
+    """
+    if treatMissingAsNegative:
+        return (strands == 0) | (strands == BINARY_MISSING_VAL)
+    else:
+        return strands == 0
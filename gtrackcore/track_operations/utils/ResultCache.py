@@ -0,0 +1,214 @@
+"""
+Persistent cache of the results of track operations.
+"""
+
+import os
+import shutil
+import tempfile
+import hashlib
+import cPickle
+import numpy as np
+
+from collections import OrderedDict
+
+from gtrackcore.core.Config import Config
+from gtrackcore.metadata.TrackInfo import TrackInfo
+from gtrackcore.track_operations.TrackContents import TrackContents
+from gtrackcore.track_operations.utils.TrackHandling import \
+    getTrackViewLists
+from gtrackcore.track_operations.utils.TrackHandling import \
+    createTrackViewFromLists
+
+INDEX_FN = 'index.pickle'
+
+
+def getTrackContentsKey(track):
+    """
+    Create the cache key of an input track.
+
+    Tracks read from GTrackCore are identified by the id and time of
+    preprocessing of the track, so that the key changes when the track is
+    preprocessed again. Other tracks are identified by their contents.
+
+    :param track: TrackContents
+    :return: String. Hex digest of the key.
+    """
+    md5 = hashlib.md5()
+    md5.update(repr([(r.genome, r.chr, r.start, r.end)
+                     for r in track.regions]))
+
+    if track.trackName is not None:
+        trackInfo = TrackInfo(track.genome.name, track.trackName)
+        if trackInfo.id is not None:
+            md5.update(repr(('track', track.trackName, trackInfo.id,
+                             str(trackInfo.timeOfPreProcessing),
+                             track.allowOverlaps if not track.isEmpty()
+                             else None)))
+            return md5.hexdigest()
+
+    md5.update('contents')
+    for region, tv in track.iterTrackViews():
+        lists, extraLists, allowOverlaps = getTrackViewLists(tv)
+        md5.update(repr((region.chr, region.start, region.end,
+                         allowOverlaps, extraLists.keys())))
+        for l in lists + extraLists.values():
+            _updateWithArray(md5, l)
+    return md5.hexdigest()
+
+
+def _updateWithArray(md5, array):
+    if array is None:
+        md5.update('None')
+    else:
+        md5.update(repr((array.dtype.str, array.shape)))
+        md5.update(np.ascontiguousarray(array).data)
+
+
+class ResultCache(object):
+    """
+    Cache of operation results on disk, shared between processes.
+
+    Each result is stored in a directory named by the cache key of the
+    operation. The lists of the trackViews are stored as numpy files,
+    which are mapped back as memmaps when the result is loaded. Other
+    results are pickled.
+
+    When the size of the cache exceeds maxBytes, the least recently used
+    results are removed. Results of tracks that are preprocessed again are
+    not used, as the key of the track changes, and are removed by the LRU
+    eviction.
+    """
+
+    def __init__(self, path=None, maxBytes=None):
+        self._path = path if path is not None else \
+            Config.OPERATION_RESULT_CACHE_PATH
+        self._maxBytes = maxBytes if maxBytes is not None else \
+            Config.OPERATION_RESULT_CACHE_MAX_BYTES
+
+    @staticmethod
+    def isEnabled():
+        """
+        The cache is used if Config.OPERATION_RESULT_CACHE_MAX_BYTES is
+        larger than zero.
+        """
+        return Config.OPERATION_RESULT_CACHE_MAX_BYTES > 0
+
+    def _getEntryPath(self, key):
+        return os.path.join(self._path, key)
+
+    def load(self, key):
+        """
+        Load a cached result.
+
+        :param key: Cache key of the operation
+        :return: The result, or None if not in the cache.
+        """
+        indexFn = os.path.join(self._getEntryPath(key), INDEX_FN)
+        try:
+            with open(indexFn, 'rb') as indexFile:
+                index = cPickle.load(indexFile)
+            # Marks the result as recently used
+            os.utime(indexFn, None)
+        except (IOError, OSError):
+            return None
+
+        if not index['isTrack']:
+            return index['result']
+
+        trackViews = OrderedDict()
+        for i, (region, listNums, extraKeys, allowOverlaps) in \
+                enumerate(index['trackViews']):
+            lists = [self._loadArray(key, i, j) if j in listNums else None
+                     for j in range(index['numLists'])]
+            extraLists = OrderedDict((k, self._loadArray(key, i, 'e%d' % j))
+                                     for j, k in enumerate(extraKeys))
+            trackViews[region] = createTrackViewFromLists(
+                region, (lists, extraLists, allowOverlaps))
+
+        return TrackContents(index['genome'], trackViews)
+
+    def _getArrayFn(self, key, tvNum, listNum):
+        return os.path.join(self._getEntryPath(key),
+                            '{}_{}.npy'.format(tvNum, listNum))
+
+    def _loadArray(self, key, tvNum, listNum):
+        fn = self._getArrayFn(key, tvNum, listNum)
+        try:
+            return np.load(fn, mmap_mode='r')
+        except ValueError:
+            # Arrays of Python objects can not be mapped
+            return np.load(fn)
+
+    def store(self, key, result):
+        """
+        Store a result in the cache, and remove the least recently used
+        results if the cache is too large.
+
+        :param key: Cache key of the operation
+        :param result: TrackContents or OrderedDict of results per region
+        :return: None
+        """
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+
+        # The result is written to a temporary directory which is then
+        # renamed, so that other processes never see a partial result.
+        tempPath = tempfile.mkdtemp(prefix='.tmp', dir=self._path)
+        try:
+            if isinstance(result, TrackContents):
+                index = {'isTrack': True, 'genome': result.genome,
+                         'trackViews': []}
+                for i, (region, tv) in enumerate(result.iterTrackViews()):
+                    lists, extraLists, allowOverlaps = getTrackViewLists(tv)
+                    index['numLists'] = len(lists)
+                    for j, l in enumerate(lists):
+                        if l is not None:
+                            np.save(os.path.join(
+                                tempPath, '{}_{}.npy'.format(i, j)), l)
+                    for j, l in enumerate(extraLists.values()):
+                        np.save(os.path.join(
+                            tempPath, '{}_e{}.npy'.format(i, j)), l)
+                    index['trackViews'].append(
+                        (region, [j for j, l in enumerate(lists)
+                                  if l is not None],
+                         extraLists.keys(), allowOverlaps))
+            else:
+                index = {'isTrack': False, 'result': result}
+
+            with open(os.path.join(tempPath, INDEX_FN), 'wb') as indexFile:
+                cPickle.dump(index, indexFile, cPickle.HIGHEST_PROTOCOL)
+
+            os.rename(tempPath, self._getEntryPath(key))
+        except OSError:
+            # Stored by another process
+            pass
+        finally:
+            shutil.rmtree(tempPath, ignore_errors=True)
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used results until the cache is no larger
+        than maxBytes.
+        :return: None
+        """
+        entries = []
+        for key in os.listdir(self._path):
+            if key.startswith('.'):
+                continue
+            entryPath = self._getEntryPath(key)
+            try:
+                lastUsed = os.path.getmtime(os.path.join(entryPath, INDEX_FN))
+                size = sum(os.path.getsize(os.path.join(entryPath, fn))
+                           for fn in os.listdir(entryPath))
+            except OSError:
+                continue
+            entries.append((lastUsed, size, entryPath))
+
+        totalSize = sum(size for lastUsed, size, entryPath in entries)
+        for lastUsed, size, entryPath in sorted(entries):
+            if totalSize <= self._maxBytes:
+                break
+            shutil.rmtree(entryPath, ignore_errors=True)
+            totalSize -= size
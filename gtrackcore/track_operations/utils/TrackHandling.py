@@ -6,6 +6,7 @@ import logging
 
 from collections import OrderedDict
 from cStringIO import StringIO
+from itertools import groupby
 
 from gtrackcore.core.Api import importFile
 from gtrackcore.core.Api import _trackNameExists
@@ -376,28 +377,122 @@ def createRawResultTrackView(index, region, baseTrack, allowOverlap,
                    borderHandling='crop', allowOverlaps=allowOverlap)
     return tv
 
-def extractTrackFromGTrackCore(genome, trackName):
+EMPTY_VAL_DTYPE_DICT = {'Number (integer)': 'int32',
+                        'Category': 'S2',
+                        'Case-control': 'bool8',
+                        'Character': 'S1'}
+
+def createEmptyTrackView(region, trackFormat, allowOverlap=False):
     """
-    Extract a track from GTracCore
+    Create a TrackView without elements, with the lists of the given
+    sparse TrackFormat.
 
-    :param genome:
-    :param trackName:
-    :return:
+    :param region: Genomic region of the trackView
+    :param trackFormat: TrackFormat of the trackView. Must not be dense.
+    :param allowOverlap: Boolean. Segments overlapping or not
+    :return: TrackView.
     """
-    trackName = trackName.split('.')[0]
-    track = Track(trackName.split(':'))
-    trackViewList = OrderedDict()
+    assert not trackFormat.isDense()
+
+    starts = np.array([], dtype='int32')
+    ends = np.array([], dtype='int32') if trackFormat.isInterval() else None
+    vals = np.array([], dtype=EMPTY_VAL_DTYPE_DICT.get(
+        trackFormat.getValTypeName(), 'float64')) \
+        if trackFormat.isValued() else None
+    strands = np.array([], dtype='bool8') if trackFormat.hasStrand() else None
+    ids = np.array([], dtype='S1') if trackFormat.hasId() else None
+    edges = np.zeros((0, 0), dtype='S1') if trackFormat.isLinked() else None
+    weights = np.zeros((0, 0), dtype='float64') \
+        if trackFormat.isWeighted() else None
+
+    return TrackView(region, starts, ends, vals, strands, ids, edges, weights,
+                     borderHandling='crop', allowOverlaps=allowOverlap)
+
+def getTrackViewLists(tv):
+    """
+    Get the lists of a TrackView as numpy arrays, in the form they are given
+    to the TrackView constructor. Used to store or send a TrackView, which
+    can not be pickled.
+
+    :param tv: TrackView
+    :return: Tuple of the list of the lists, the OrderedDict of extra
+    lists and allowOverlaps. Recreate the TrackView with
+    createTrackViewFromLists.
+    """
+    lists = [tv._startList, tv._endList, tv._valList, tv._strandList,
+             tv._idList, tv._edgesList, tv._weightsList]
+    extraLists = OrderedDict(tv._extraLists)
+    trackFormat = tv.trackFormat
+
+    if not trackFormat.isDense() and not trackFormat.isInterval():
+        # Points have a virtual end list
+        lists[1] = None
+    elif trackFormat.isDense() and not trackFormat.reprIsDense():
+        # Partitions are given as a list of borders. The first element of
+        # the other lists is ignored.
+        lists[0] = None
+        lists[1] = np.concatenate([tv._startList[:1] if len(tv._startList)
+                                   else [tv.genomeAnchor.start],
+                                   tv._endList])
+        for i in range(2, len(lists)):
+            if lists[i] is not None:
+                lists[i] = _prependDummyElement(lists[i])
+        for key, extraList in extraLists.items():
+            extraLists[key] = _prependDummyElement(extraList)
+
+    return ([np.array(l) if l is not None else None for l in lists],
+            OrderedDict((k, np.array(v)) for k, v in extraLists.iteritems()),
+            tv.allowOverlaps)
+
+def _prependDummyElement(l):
+    return np.concatenate([np.zeros((1,) + l.shape[1:], dtype=l.dtype), l])
+
+def createTrackViewFromLists(region, trackViewLists):
+    """
+    Create a TrackView from the lists returned by getTrackViewLists.
+
+    :param region: Genomic region of the trackView
+    :param trackViewLists: Tuple returned by getTrackViewLists
+    :return: TrackView
+    """
+    lists, extraLists, allowOverlaps = trackViewLists
+    return TrackView(region, *lists, borderHandling='crop',
+                     allowOverlaps=allowOverlaps, extraLists=extraLists)
 
-    for region in genome.regions:
+def getTrackViewsForRegions(track, regions):
+    """
+    Load the track views of a list of regions, using one batched
+    Track.getTrackViews call per chromosome.
 
+    :param track: Track object
+    :param regions: List of GenomeRegions
+    :return: OrderedDict of trackViews, in the same order as regions.
+    """
+    trackViews = {}
+
+    for chr, chrRegions in groupby(sorted(regions), key=lambda r: r.chr):
         try:
-            trackViewList[region] = track.getTrackView(region)
+            trackViews.update(track.getTrackViews(list(chrRegions)))
         except OSError:
             # There can be regions that the track does not cover..
             # This is a temp fix.. should be bare of the api
             pass
 
-    return TrackContents(genome, trackViewList)
+    return OrderedDict([(region, trackViews[region]) for region in regions
+                        if region in trackViews])
+
+def extractTrackFromGTrackCore(genome, trackName):
+    """
+    Extract a track from GTracCore
+
+    :param genome:
+    :param trackName:
+    :return:
+    """
+    trackName = trackName.split('.')[0]
+    track = Track(trackName.split(':'))
+    trackViewList = getTrackViewsForRegions(track, genome.regions)
+    return TrackContents(genome, trackViewList, trackName=track.trackName)
 
 
 def createTrackContentFromFile(genome, path, allowOverlaps):
@@ -415,30 +510,12 @@ def createTrackContentFromFile(genome, path, allowOverlaps):
     # We do not want to set this..
     track.addFormatReq(TrackFormatReq(allowOverlaps=False,
                                       borderHandling='crop'))
-    trackViewList = OrderedDict()
-
-    for region in genome.regions:
-
-        try:
-            trackViewList[region] = track.getTrackView(region)
-        except OSError:
-            # There can be regions that the track does not cover..
-            # This is a temp fix.. should be bare of the api
-            pass
-
-    return TrackContents(genome, trackViewList)
+    trackViewList = getTrackViewsForRegions(track, genome.regions)
+    return TrackContents(genome, trackViewList, trackName=track.trackName)
 
 def createTrackContentFromTrack(track, genome):
-    trackViewList = OrderedDict()
-
-    for region in genome.regions:
-        try:
-            trackViewList[region] = track.getTrackView(region)
-        except OSError:
-            # There can be regions that the track does not cover..
-            # This is a temp fix.. should be bare of the api
-            pass
-    return TrackContents(genome, trackViewList)
+    trackViewList = getTrackViewsForRegions(track, genome.regions)
+    return TrackContents(genome, trackViewList, trackName=track.trackName)
 
 
 class Capturing(list):
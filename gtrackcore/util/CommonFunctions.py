@@ -1,6 +1,7 @@
 import os
 #import sys
 import functools
+import hashlib
 import re
 import urllib
 #import contextlib
@@ -350,7 +351,30 @@ def getFileSuffix(fn):
     for suffix in getSupportedFileSuffixes():
         if '.' in suffix and fn.endswith('.' + suffix):
             return suffix
+    # Compressed files are matched on the suffix before '.gz', unless a
+    # format supports the full suffix
+    if fn.endswith('.gz') and os.path.splitext(fn[:-len('.gz')])[1] != '':
+        return getFileSuffix(fn[:-len('.gz')])
     return os.path.splitext(fn)[1].replace('.','')
+
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+def computeFileFingerprint(fn, prevFingerprint=None):
+    '''
+    Returns (size, mtime, contentHash) of a file. The hash of
+    prevFingerprint is reused without reading the file if size and mtime
+    are unchanged. Otherwise the full file is hashed, so that a file with a
+    new mtime is only treated as unchanged if its content is.
+    '''
+    stat = os.stat(fn)
+    if prevFingerprint is not None and tuple(prevFingerprint[:2]) == (stat.st_size, stat.st_mtime):
+        return tuple(prevFingerprint)
+
+    md5 = hashlib.md5(str(stat.st_size))
+    with open(fn, 'rb') as file:
+        for chunk in iter(lambda: file.read(FINGERPRINT_CHUNK_SIZE), ''):
+            md5.update(chunk)
+    return (stat.st_size, stat.st_mtime, md5.hexdigest())
 #
 #def getOrigFns(genome, trackName, suffix, fileTree='standardized'):
 #    assert fileTree in ['standardized', 'collected', 'parsing error']